@@ -0,0 +1,341 @@
+import re
+import hmac
+import uuid
+import base64
+import asyncio
+import hashlib
+import logging
+import socket
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Sequence
+import aiohttp
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Supports the formula shapes we generate: {Field} = 'value' joined by AND()
+CONDITION_RE = re.compile(r"\{([^}]+)\}\s*(=|>=|<=|>|<)\s*('(?:[^'\\]|\\.)*'|[\d.]+)")
+# and the incremental sync filter on record modification time
+MODIFIED_RE = re.compile(r"IS_AFTER\(LAST_MODIFIED_TIME\(\), DATETIME_PARSE\('([^']+)'\)\)")
+
+
+class AirtableStub:
+    """A small in-memory stand-in for the Airtable REST API.
+
+    Used by tests and for local development: point AIRTABLE_API_URL at
+    the stub's url and the app's Airtable client talks to it instead.
+    Registered webhooks get a signed ping and a change payload for every
+    write, and edit_record()/remove_record() simulate edits made in the
+    Airtable UI.
+    """
+
+    def __init__(self, page_size: int = 100):
+        self.page_size = page_size
+        self.tables: Dict[str, List[Dict]] = {}
+        self.requests: List[tuple] = []
+        self.modified: Dict[str, str] = {}
+        self.throttled = 0
+        # Set to False to answer like a token without the schema.bases:read scope
+        self.metadata_enabled = True
+        self.schemas: Dict[str, List[str]] = {}
+        self.retry_after: Optional[float] = None
+        # Registered webhooks with the payloads queued for each
+        self.webhooks: Dict[str, Dict] = {}
+        self.transaction = 0
+        self._pings: set = set()
+        self.url: Optional[str] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def add_records(self, table: str, records: List[Dict]) -> List[Dict]:
+        """Seed a table with field dicts, returning the stored records"""
+        return [self._insert(table, fields) for fields in records]
+
+    def throttle(self, count: int, retry_after: Optional[float] = None) -> None:
+        """Answer the next count requests with 429, optionally with a Retry-After hint"""
+        self.throttled = count
+        self.retry_after = retry_after
+
+    @web.middleware
+    async def _rate_limit(self, request: web.Request, handler):
+        if self.throttled > 0:
+            self.throttled -= 1
+            self.requests.append(('429', request.match_info.get('table'), dict(request.query)))
+            response = self._error(429, 'TOO_MANY_REQUESTS', 'Rate limit exceeded')
+            if self.retry_after is not None:
+                response.headers['Retry-After'] = str(self.retry_after)
+            return response
+        return await handler(request)
+
+    async def start(self, port: int = 0) -> str:
+        app = web.Application(middlewares=[self._rate_limit])
+        app.router.add_route('GET', '/v0/meta/bases/{base}/tables', self.list_tables)
+        app.router.add_route('POST', '/v0/bases/{base}/webhooks', self.create_webhook)
+        app.router.add_route('GET', '/v0/bases/{base}/webhooks/{webhook_id}/payloads', self.list_payloads)
+        app.router.add_route('POST', '/v0/bases/{base}/webhooks/{webhook_id}/refresh', self.refresh_webhook)
+        app.router.add_route('GET', '/v0/{base}/{table}', self.list_records)
+        app.router.add_route('POST', '/v0/{base}/{table}', self.create_records)
+        app.router.add_route('PATCH', '/v0/{base}/{table}', self.update_records)
+        app.router.add_route('DELETE', '/v0/{base}/{table}', self.delete_records)
+        app.router.add_route('GET', '/v0/{base}/{table}/{record_id}', self.get_record)
+        app.router.add_route('PATCH', '/v0/{base}/{table}/{record_id}', self.update_record)
+        app.router.add_route('DELETE', '/v0/{base}/{table}/{record_id}', self.delete_record)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind(('127.0.0.1', port))
+        await web.SockSite(self._runner, sock).start()
+        self.url = f"http://127.0.0.1:{sock.getsockname()[1]}"
+        return self.url
+
+    async def stop(self) -> None:
+        await self.wait_for_pings()
+        if self._runner:
+            await self._runner.cleanup()
+
+    def _insert(self, table: str, fields: Dict) -> Dict:
+        record = {
+            'id': f"rec{uuid.uuid4().hex[:14]}",
+            'createdTime': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'fields': dict(fields)
+        }
+        self.tables.setdefault(table, []).append(record)
+        self.modified[record['id']] = record['createdTime']
+        return record
+
+    def edit_record(self, table: str, record_id: str, fields: Dict) -> None:
+        """Change a record as if edited in the Airtable UI, notifying webhooks"""
+        for record in self.tables.get(table, []):
+            if record['id'] == record_id:
+                record['fields'].update(fields)
+                self.modified[record_id] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        self.emit(table, changed=[record_id], source='client')
+
+    def remove_record(self, table: str, record_id: str) -> None:
+        """Delete a record as if in the Airtable UI, notifying webhooks"""
+        self.tables[table] = [r for r in self.tables.get(table, []) if r['id'] != record_id]
+        self.emit(table, destroyed=[record_id], source='client')
+
+    def emit(self, table: str, created: Sequence[str] = (), changed: Sequence[str] = (),
+             destroyed: Sequence[str] = (), source: str = 'publicApi') -> None:
+        """Queue a change payload for every webhook and ping its notification URL"""
+        if not self.webhooks:
+            return
+        self.transaction += 1
+        records = {r['id']: r for r in self.tables.get(table, [])}
+        changes = {}
+        if created:
+            changes['createdRecordsById'] = {
+                i: {'createdTime': records[i]['createdTime'], 'cellValuesByFieldId': records[i]['fields']}
+                for i in created if i in records}
+        if changed:
+            changes['changedRecordsById'] = {
+                i: {'current': {'cellValuesByFieldId': records[i]['fields']}} for i in changed if i in records}
+        if destroyed:
+            changes['destroyedRecordIds'] = list(destroyed)
+        payload = {
+            'timestamp': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'baseTransactionNumber': self.transaction,
+            'actionMetadata': {'source': source},
+            'payloadFormat': 'v0',
+            'changedTablesById': {f"tbl{table}": changes}
+        }
+        for webhook in self.webhooks.values():
+            webhook['payloads'].append(payload)
+            task = asyncio.ensure_future(self._ping(webhook))
+            self._pings.add(task)
+            task.add_done_callback(self._pings.discard)
+
+    async def wait_for_pings(self) -> None:
+        if self._pings:
+            await asyncio.gather(*self._pings, return_exceptions=True)
+
+    async def _ping(self, webhook: Dict) -> None:
+        body = ('{"base": {"id": "%s"}, "webhook": {"id": "%s"}, "timestamp": "%s"}' % (
+            webhook['base'], webhook['id'], datetime.utcnow().isoformat())).encode()
+        digest = hmac.new(base64.b64decode(webhook['macSecretBase64']), body, hashlib.sha256).hexdigest()
+        try:
+            async with aiohttp.ClientSession() as session:
+                await session.post(webhook['notificationUrl'], data=body, headers={
+                    'Content-Type': 'application/json', 'X-Airtable-Content-MAC': f"hmac-sha256={digest}"})
+        except Exception as e:
+            logger.warning(f"Webhook ping to {webhook['notificationUrl']} failed: {e}")
+
+    def _matches(self, record: Dict, formula: str) -> bool:
+        for since in MODIFIED_RE.findall(formula):
+            if self.modified.get(record['id'], '') <= since:
+                return False
+        for field, op, raw in CONDITION_RE.findall(formula):
+            value = record['fields'].get(field)
+            if raw.startswith("'"):
+                expected = re.sub(r"\\(.)", r"\1", raw[1:-1])
+                value = '' if value is None else str(value)
+            else:
+                expected = float(raw)
+                try:
+                    value = float(value)
+                except (TypeError, ValueError):
+                    return False
+            if not {'=': value == expected, '>=': value >= expected, '<=': value <= expected,
+                    '>': value > expected, '<': value < expected}[op]:
+                return False
+        return True
+
+    def _error(self, status: int, error_type: str, message: str) -> web.Response:
+        return web.json_response({'error': {'type': error_type, 'message': message}}, status=status)
+
+    async def list_tables(self, request: web.Request) -> web.Response:
+        self.requests.append(('META', None, {}))
+        if not self.metadata_enabled:
+            return self._error(403, 'INVALID_PERMISSIONS_OR_MODEL_NOT_FOUND', 'Invalid permissions')
+        tables = []
+        for name in sorted(set(self.tables) | set(self.schemas)):
+            fields = list(self.schemas.get(name, []))
+            for record in self.tables.get(name, []):
+                fields.extend(f for f in record['fields'] if f not in fields)
+            tables.append({'id': f"tbl{name}", 'name': name, 'fields': [{'name': f, 'type': 'singleLineText'} for f in fields]})
+        return web.json_response({'tables': tables})
+
+    async def create_webhook(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        webhook_id = f"ach{uuid.uuid4().hex[:14]}"
+        self.webhooks[webhook_id] = {
+            'id': webhook_id,
+            'base': request.match_info['base'],
+            'notificationUrl': body.get('notificationUrl'),
+            'macSecretBase64': base64.b64encode(uuid.uuid4().bytes * 2).decode(),
+            'expirationTime': (datetime.utcnow() + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M:%S.000Z'),
+            'payloads': []
+        }
+        webhook = self.webhooks[webhook_id]
+        return web.json_response({k: webhook[k] for k in ('id', 'macSecretBase64', 'expirationTime')})
+
+    async def list_payloads(self, request: web.Request) -> web.Response:
+        webhook = self.webhooks.get(request.match_info['webhook_id'])
+        if not webhook:
+            return self._error(404, 'NOT_FOUND', 'Could not find webhook')
+        self.requests.append(('PAYLOADS', None, dict(request.query)))
+        cursor = int(request.query.get('cursor', 1))
+        payloads = webhook['payloads'][cursor - 1:cursor - 1 + 50]
+        return web.json_response({
+            'payloads': payloads,
+            'cursor': cursor + len(payloads),
+            'mightHaveMore': cursor - 1 + len(payloads) < len(webhook['payloads'])
+        })
+
+    async def refresh_webhook(self, request: web.Request) -> web.Response:
+        webhook = self.webhooks.get(request.match_info['webhook_id'])
+        if not webhook:
+            return self._error(404, 'NOT_FOUND', 'Could not find webhook')
+        webhook['expirationTime'] = (datetime.utcnow() + timedelta(days=7)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        return web.json_response({'expirationTime': webhook['expirationTime']})
+
+    async def list_records(self, request: web.Request) -> web.Response:
+        table = request.match_info['table']
+        self.requests.append(('GET', table, dict(request.query)))
+        records = list(self.tables.get(table, []))
+
+        formula = request.query.get('filterByFormula')
+        if formula:
+            records = [r for r in records if self._matches(r, formula)]
+
+        sort_field = request.query.get('sort[0][field]')
+        if sort_field:
+            if sort_field != 'createdTime' and not any(sort_field in r['fields'] for r in self.tables.get(table, [])):
+                return self._error(422, 'UNKNOWN_FIELD_NAME', f'Unknown field name: "{sort_field}"')
+            key = (lambda r: r['createdTime']) if sort_field == 'createdTime' else (lambda r: str(r['fields'].get(sort_field, '')))
+            records.sort(key=key, reverse=request.query.get('sort[0][direction]') == 'desc')
+
+        if 'maxRecords' in request.query:
+            records = records[:int(request.query['maxRecords'])]
+
+        fields = request.query.getall('fields[]', [])
+        # Declared fields exist even when empty on every record (and so left out of responses)
+        known = set(self.schemas.get(table, [])) | {name for r in self.tables.get(table, []) for name in r['fields']}
+        for name in fields:
+            if known and name not in known:
+                return self._error(422, 'UNKNOWN_FIELD_NAME', f'Unknown field name: "{name}"')
+        if fields:
+            records = [dict(r, fields={k: v for k, v in r['fields'].items() if k in fields}) for r in records]
+
+        page_size = min(int(request.query.get('pageSize', self.page_size)), self.page_size)
+        offset = int(request.query.get('offset', 0))
+        body = {'records': records[offset:offset + page_size]}
+        if offset + page_size < len(records):
+            body['offset'] = str(offset + page_size)
+        return web.json_response(body)
+
+    async def get_record(self, request: web.Request) -> web.Response:
+        table, record_id = request.match_info['table'], request.match_info['record_id']
+        for record in self.tables.get(table, []):
+            if record['id'] == record_id:
+                return web.json_response(record)
+        return self._error(404, 'NOT_FOUND', 'Could not find record')
+
+    async def create_records(self, request: web.Request) -> web.Response:
+        table = request.match_info['table']
+        body = await request.json()
+        self.requests.append(('POST', table, body))
+        if 'records' in body:
+            if len(body['records']) > 10:
+                return self._error(422, 'INVALID_RECORDS', 'You can create up to 10 records per request')
+            created = [self._insert(table, r['fields']) for r in body['records']]
+            self.emit(table, created=[r['id'] for r in created])
+            return web.json_response({'records': created})
+        record = self._insert(table, body['fields'])
+        self.emit(table, created=[record['id']])
+        return web.json_response(record)
+
+    async def update_record(self, request: web.Request) -> web.Response:
+        table, record_id = request.match_info['table'], request.match_info['record_id']
+        body = await request.json()
+        for record in self.tables.get(table, []):
+            if record['id'] == record_id:
+                record['fields'].update(body['fields'])
+                self.modified[record_id] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z')
+                self.emit(table, changed=[record_id])
+                return web.json_response(record)
+        return self._error(404, 'NOT_FOUND', 'Could not find record')
+
+    async def update_records(self, request: web.Request) -> web.Response:
+        table = request.match_info['table']
+        body = await request.json()
+        if len(body['records']) > 10:
+            return self._error(422, 'INVALID_RECORDS', 'At most 10 records per request')
+        self.requests.append(('PATCH', table, [r['id'] for r in body['records']]))
+        records = {r['id']: r for r in self.tables.get(table, [])}
+        updated = []
+        for change in body['records']:
+            record = records.get(change['id'])
+            if record is None:
+                return self._error(404, 'NOT_FOUND', 'Could not find record')
+            record['fields'].update(change['fields'])
+            self.modified[record['id']] = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            updated.append(record)
+        self.emit(table, changed=[r['id'] for r in updated])
+        return web.json_response({'records': updated})
+
+    async def delete_record(self, request: web.Request) -> web.Response:
+        table, record_id = request.match_info['table'], request.match_info['record_id']
+        records = self.tables.get(table, [])
+        self.tables[table] = [r for r in records if r['id'] != record_id]
+        self.emit(table, destroyed=[record_id])
+        return web.json_response({'id': record_id, 'deleted': True})
+
+    async def delete_records(self, request: web.Request) -> web.Response:
+        table = request.match_info['table']
+        ids = set(request.query.getall('records[]', []))
+        self.tables[table] = [r for r in self.tables.get(table, []) if r['id'] not in ids]
+        self.emit(table, destroyed=sorted(ids))
+        return web.json_response({'records': [{'id': i, 'deleted': True} for i in ids]})
+
+
+if __name__ == "__main__":
+    # Run a stub for local development: AIRTABLE_API_URL=http://127.0.0.1:8765
+    async def serve():
+        stub = AirtableStub()
+        url = await stub.start(8765)
+        print(f"Airtable stub listening on {url}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
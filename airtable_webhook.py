@@ -0,0 +1,24 @@
+import json
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables before the services read their settings
+load_dotenv()
+
+from services.airtable_webhooks import airtable_webhooks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage the Airtable webhook that keeps local caches current")
+    parser.add_argument('--register', metavar='URL', help="Register a webhook notifying URL (e.g. https://host/airtable-webhook)")
+    parser.add_argument('--process', action='store_true', help="Apply any payloads waiting since the saved cursor")
+    args = parser.parse_args()
+
+    if args.register:
+        state = asyncio.run(airtable_webhooks.register(args.register))
+        print(json.dumps({k: v for k, v in state.items() if k != 'mac_secret'}, indent=2))
+    elif args.process:
+        print(json.dumps(asyncio.run(airtable_webhooks.process()), indent=2))
+    else:
+        print(json.dumps({k: v for k, v in airtable_webhooks.state.items() if k != 'mac_secret'}, indent=2))
@@ -0,0 +1,23 @@
+import json
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables before the services read their settings
+load_dotenv()
+
+from services.airtable_service import AirtableService
+from services.conversation_archive import conversation_archive
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old conversation turns into the local archive")
+    parser.add_argument('--days', type=int, help="Archive turns older than this (default: CONVERSATION_ARCHIVE_DAYS)")
+    parser.add_argument('--stats', action='store_true', help="Only show what is already archived")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(conversation_archive.stats(), indent=2))
+    else:
+        result = asyncio.run(AirtableService().archive_old_conversations(args.days))
+        print(json.dumps(result, indent=2))
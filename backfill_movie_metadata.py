@@ -0,0 +1,39 @@
+import os
+import json
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables before the services read their settings
+load_dotenv()
+
+from services.handlers.movie_handler import FAVORITE_FIELDS, WATCHED_FIELDS
+from services.movie_metadata import backfill_movie_metadata
+from services.storage import get_storage
+
+
+async def backfill(batch_size=50):
+    """Store TMDB id, genre ids, year and director on movies saved without them"""
+    storage = get_storage()
+    tables = {
+        'movies_watched': storage.table('movies_watched', os.getenv('AIRTABLE_MOVIES_WATCHED', 'Movies Watched'),
+                                        indexed=['Title', 'Name'], fields=WATCHED_FIELDS),
+        'movie_favorites': storage.table('movie_favorites', os.getenv('AIRTABLE_MOVIE_FAVORITES', 'Movie Favorites'),
+                                         indexed=['TMDB_ID', 'Title'], fields=FAVORITE_FIELDS)
+    }
+    results = {}
+    for kind, table in tables.items():
+        print(f"Backfilling {table.table_name}...")
+        results[kind] = await backfill_movie_metadata(table, batch_size=batch_size)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Add TMDB metadata to movies saved before it was stored")
+    parser.add_argument('--batch-size', type=int, default=50, help="Titles looked up and written per batch")
+    args = parser.parse_args()
+
+    if not os.getenv('TMDB_API_KEY'):
+        print("Error: Missing TMDB_API_KEY in .env file")
+    else:
+        print(json.dumps(asyncio.run(backfill(args.batch_size)), indent=2))
@@ -0,0 +1,47 @@
+import json
+import time
+import argparse
+from services.movie_intent import movie_intent_parser
+
+CORPUS = 'movie_intent_corpus.json'
+
+
+def load_corpus(path=CORPUS):
+    with open(path) as f:
+        return json.load(f)['examples']
+
+
+def mismatches(examples):
+    """Examples whose parsed intent differs from the label, with what was parsed"""
+    wrong = []
+    for example in examples:
+        intent = movie_intent_parser.parse(example['message'].lower())
+        if any(intent.get(key) != value for key, value in example['expected'].items()):
+            wrong.append((example, intent))
+    return wrong
+
+
+def benchmark(messages, repeat=200):
+    """Parse every message repeat times; returns timings per message"""
+    messages = [m.lower() for m in messages]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for message in messages:
+            movie_intent_parser.parse(message)
+    elapsed = time.perf_counter() - started
+    parses = repeat * len(messages)
+    return {'messages': len(messages), 'parses': parses, 'seconds': round(elapsed, 4),
+            'microseconds_per_message': round(elapsed / parses * 1e6, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Check and time the movie intent parser against the labelled corpus")
+    parser.add_argument('--repeat', type=int, default=200, help="Passes over the corpus to time")
+    args = parser.parse_args()
+
+    examples = load_corpus()
+    wrong = mismatches(examples)
+    for example, intent in wrong:
+        print(f"MISMATCH {example['message']!r}: expected {example['expected']}, got {intent}")
+    print(f"Accuracy: {len(examples) - len(wrong)}/{len(examples)}")
+    print(json.dumps(benchmark([e['message'] for e in examples], args.repeat), indent=2))
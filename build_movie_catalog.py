@@ -0,0 +1,58 @@
+import os
+import json
+import asyncio
+import argparse
+import tempfile
+import aiohttp
+from dotenv import load_dotenv
+
+# Load environment variables before the services read their settings
+load_dotenv()
+
+from services.movie_catalog import export_url, movie_catalog
+from services.tmdb_client import TMDBClient
+
+
+async def download_export(path):
+    """Fetch yesterday's TMDB id export to a local file"""
+    url = export_url()
+    print(f"Downloading {url}...")
+    async with aiohttp.ClientSession() as session:
+        async with session.get(url) as response:
+            response.raise_for_status()
+            with open(path, 'wb') as f:
+                async for chunk in response.content.iter_chunked(1 << 16):
+                    f.write(chunk)
+
+
+async def build(export=None, min_popularity=0.0, enrich=0):
+    """Load the id export into the local catalog and enrich the most popular movies"""
+    if export or export is None:
+        path = export
+        if not path:
+            path = os.path.join(tempfile.mkdtemp(), 'movie_ids.json.gz')
+            await download_export(path)
+        print(f"Importing {path}...")
+        movie_catalog.import_export_file(path, min_popularity)
+    if enrich:
+        print(f"Fetching details for up to {enrich} movies...")
+        await movie_catalog.enrich(TMDBClient(), limit=enrich)
+    return movie_catalog.stats()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the local TMDB movie catalog used to resolve titles")
+    parser.add_argument('--export', help="Path to a downloaded movie_ids_MM_DD_YYYY.json.gz (default: download it)")
+    parser.add_argument('--min-popularity', type=float, default=0.0, help="Skip export entries less popular than this")
+    parser.add_argument('--enrich', type=int, default=0, help="Fetch details (genres, year) for this many popular movies")
+    parser.add_argument('--skip-import', action='store_true', help="Only enrich what is already in the catalog")
+    parser.add_argument('--stats', action='store_true', help="Show catalog statistics and exit")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(movie_catalog.stats(), indent=2))
+    elif args.enrich and not os.getenv('TMDB_API_KEY'):
+        print("Error: Missing TMDB_API_KEY in .env file")
+    else:
+        export = '' if args.skip_import else args.export
+        print(json.dumps(asyncio.run(build(export, args.min_popularity, args.enrich)), indent=2))
@@ -35,6 +35,24 @@ account_sid = os.getenv('TWILIO_ACCOUNT_SID')
 auth_token = os.getenv('TWILIO_AUTH_TOKEN')
 validator = RequestValidator(auth_token) if auth_token else None
 
+def conversation_log_stats():
+    """Start this worker's conversation log (replaying spooled rows) and report its lag"""
+    from services.airtable_service import AirtableService
+    return AirtableService().conversation_log_stats()
+
+def tmdb_cache_stats():
+    from services.tmdb_client import tmdb_cache
+    return tmdb_cache.stats()
+
+def recommendation_queue_stats():
+    from services.recommendation_queue import recommendation_queue
+    return recommendation_queue.stats()
+
+try:
+    conversation_log_stats()
+except Exception as e:
+    logger.error(f"Error replaying conversation log: {e}")
+
 def validate_twilio_request():
     if request.headers.get('X-Twilio-Signature') is None:
         # If no Twilio signature, assume it's a local test
@@ -119,13 +137,23 @@ async def test_webhook():
         # Test Airtable directly
         from services.airtable_service import AirtableService
         airtable = AirtableService()
-        result = airtable.store_conversation(from_number, message, "Test response")
+        result = await airtable.store_conversation(from_number, message, "Test response")
         
         return {"status": "success", "airtable_result": result}
     except Exception as e:
         logger.exception("Test webhook error:")
         return {"status": "error", "message": str(e)}, 500
 
+@app.route("/airtable-webhook", methods=['POST'])
+def airtable_webhook():
+    """Airtable change notification: verify it, then apply the changes in the background"""
+    from services.airtable_webhooks import airtable_webhooks
+    if not airtable_webhooks.verify(request.get_data(), request.headers.get('X-Airtable-Content-MAC', '')):
+        logger.error("Invalid Airtable webhook signature")
+        abort(403)
+    airtable_webhooks.notify()
+    return {"status": "accepted"}, 200
+
 @app.route("/test", methods=['GET'])
 def test():
     logger.info("Test endpoint hit")
@@ -133,7 +161,10 @@ def test():
         "status": "ok",
         "message": "Server is running",
         "twilio_configured": bool(account_sid and auth_token),
-        "environment": os.getenv('ENVIRONMENT', 'development')
+        "environment": os.getenv('ENVIRONMENT', 'development'),
+        "conversation_log": conversation_log_stats(),
+        "tmdb_cache": tmdb_cache_stats(),
+        "recommendation_queue": recommendation_queue_stats()
     }
 
 @app.route("/test-post", methods=['POST'])
@@ -187,7 +218,7 @@ async def handle_sms_request(request):
         logger.info("Attempting to store conversation in Airtable")
         from services.airtable_service import AirtableService
         airtable = AirtableService()
-        airtable_result = airtable.store_conversation(from_number, incoming_msg, response_text)
+        airtable_result = await airtable.store_conversation(from_number, incoming_msg, response_text, result.get('intent', ''))
         logger.info(f"Airtable Storage Result: {airtable_result}")
         
         resp.message(response_text)
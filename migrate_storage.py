@@ -0,0 +1,49 @@
+import os
+import asyncio
+import argparse
+from dotenv import load_dotenv
+from services.airtable_client import AirtableClient
+from services.storage import SQLStorage
+
+# Load environment variables
+load_dotenv()
+
+# Logical table -> (env var, default Airtable table name)
+TABLES = {
+    'conversations': ('AIRTABLE_CONVERSATION_TABLE', 'Conversations'),
+    'shifts': ('AIRTABLE_SHIFTS_TABLE', 'Shifts'),
+    'movies_watched': ('AIRTABLE_MOVIES_WATCHED', 'Movies Watched'),
+    'movie_favorites': ('AIRTABLE_MOVIE_FAVORITES', 'Movie Favorites')
+}
+
+
+async def migrate(database_url=None, tables=None, client=None):
+    """Bulk-copy Airtable tables into the SQL store; safe to re-run"""
+    client = client or AirtableClient()
+    storage = SQLStorage(database_url, mirror=False)
+    copied = {}
+    for kind in tables or TABLES:
+        env_var, default = TABLES[kind]
+        table_name = os.getenv(env_var, default)
+        print(f"Copying {table_name} -> {kind}...")
+        table = storage.table(kind, table_name)
+        read = copied[kind] = 0
+        # Copy a page at a time so large tables never sit in memory whole
+        async for page in client.table(table_name).pages(page_size=100):
+            read += len(page)
+            copied[kind] += table.upsert_airtable(page)
+        print(f"  {read} records read, {copied[kind]} new")
+    return copied
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Copy Airtable data into the SQL storage backend")
+    parser.add_argument('--database-url', help="SQLAlchemy URL (default: DATABASE_URL or local SQLite)")
+    parser.add_argument('--tables', nargs='+', choices=list(TABLES), help="Tables to copy (default: all)")
+    args = parser.parse_args()
+
+    if not os.getenv('AIRTABLE_API_KEY') or not os.getenv('AIRTABLE_BASE_ID'):
+        print("Error: Missing Airtable credentials in .env file")
+    else:
+        asyncio.run(migrate(args.database_url, args.tables))
+        print("Done. Set STORAGE_BACKEND=sql to use the SQL store.")
@@ -0,0 +1,37 @@
+import os
+import json
+import asyncio
+import argparse
+from dotenv import load_dotenv
+
+# Load environment variables before the services read their settings
+load_dotenv()
+
+from services.handlers.movie_handler import MovieHandler
+from services.recommendation_queue import QUEUE_SIZE, recommendation_queue
+
+
+async def refresh(user_ids):
+    """Rebuild each user's precomputed recommendation list"""
+    results = {}
+    for user_id in user_ids:
+        handler = MovieHandler()
+        handler.user_id = user_id
+        await handler._check_favorites_table()
+        results[user_id] = await recommendation_queue.rebuild(
+            user_id, lambda: handler._compute_recommendations(QUEUE_SIZE, user_id))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild precomputed movie recommendations (run from cron)")
+    parser.add_argument('--user', action='append', help="Rebuild this user's list (default: every list that is due)")
+    parser.add_argument('--stats', action='store_true', help="Only show the state of the lists")
+    args = parser.parse_args()
+
+    if args.stats:
+        print(json.dumps(recommendation_queue.stats(), indent=2))
+    elif not os.getenv('TMDB_API_KEY'):
+        print("Error: Missing TMDB_API_KEY in .env file")
+    else:
+        print(json.dumps(asyncio.run(refresh(args.user or recommendation_queue.users_due())), indent=2))
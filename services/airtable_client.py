@@ -0,0 +1,269 @@
+import os
+import asyncio
+import logging
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Union
+from urllib.parse import quote
+import aiohttp
+from services.rate_limiter import SharedRateLimiter
+
+logger = logging.getLogger(__name__)
+
+# Airtable accepts at most 10 records per create/update/delete request
+BATCH_SIZE = 10
+
+# Airtable allows 5 requests per second per base and asks clients that get
+# a 429 to wait 30 seconds before trying again
+RATE_LIMIT = float(os.getenv('AIRTABLE_RATE_LIMIT', '5'))
+THROTTLE_SECONDS = 30.0
+MAX_RETRIES = int(os.getenv('AIRTABLE_MAX_RETRIES', '2'))
+
+SortSpec = Sequence[Union[str, tuple]]
+
+
+class AirtableError(Exception):
+    """An error response from the Airtable REST API"""
+
+    def __init__(self, status: int, error_type: str, message: str):
+        self.status = status
+        self.error_type = error_type
+        super().__init__(f"{status} {error_type}: {message}")
+
+
+class _IOLoop:
+    """A background event loop that owns the pooled aiohttp session.
+
+    Flask runs each async view in a fresh event loop, so a session created
+    inside a request would die with it. Running all Airtable I/O on one
+    long-lived loop per worker lets connections be pooled across requests
+    while callers simply await the result from their own loop.
+    """
+
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._lock = threading.Lock()
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None or self._loop.is_closed():
+                self._loop = asyncio.new_event_loop()
+                thread = threading.Thread(target=self._loop.run_forever, name='airtable-io', daemon=True)
+                thread.start()
+            return self._loop
+
+    def session(self) -> aiohttp.ClientSession:
+        """The shared session; only call from coroutines running on this loop"""
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=int(os.getenv('AIRTABLE_POOL_SIZE', '10')), keepalive_timeout=60)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=30))
+        return self._session
+
+    async def run(self, coro):
+        """Run a coroutine on the I/O loop and await it from the caller's loop"""
+        future = asyncio.run_coroutine_threadsafe(coro, self.loop)
+        return await asyncio.wrap_future(future)
+
+    def run_sync(self, coro):
+        """Run a coroutine on the I/O loop from synchronous code"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def submit(self, coro) -> 'asyncio.Future':
+        """Schedule a coroutine on the I/O loop without waiting for it"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+
+io_loop = _IOLoop()
+
+# One schedule per base, shared by all workers on the host
+airtable_limiter = SharedRateLimiter('airtable_rate', RATE_LIMIT)
+
+
+class AirtableClient:
+    """Async Airtable REST client sharing one pooled session per worker"""
+
+    def __init__(self, api_key: Optional[str] = None, base_id: Optional[str] = None,
+                 api_url: Optional[str] = None, limiter: Optional[SharedRateLimiter] = None):
+        self.api_key = api_key or os.getenv('AIRTABLE_API_KEY')
+        self.base_id = base_id or os.getenv('AIRTABLE_BASE_ID')
+        self.api_url = (api_url or os.getenv('AIRTABLE_API_URL', 'https://api.airtable.com')).rstrip('/')
+        self.limiter = limiter or airtable_limiter
+
+    def table(self, table_name: str) -> 'AirtableTable':
+        return AirtableTable(self, table_name)
+
+    async def request(self, method: str, path: str, params: Optional[Any] = None,
+                      json: Optional[Dict] = None) -> Dict:
+        """Make an API request on the shared I/O loop"""
+        return await io_loop.run(self._request(method, path, params, json))
+
+    async def _request(self, method: str, path: str, params: Optional[Any], json: Optional[Dict]) -> Dict:
+        url = f"{self.api_url}/v0/{path}"
+        headers = {'Authorization': f"Bearer {self.api_key}"}
+        for attempt in range(MAX_RETRIES + 1):
+            await self.limiter.acquire(self.base_id)
+            async with io_loop.session().request(method, url, params=params, json=json, headers=headers) as response:
+                if response.status == 429 and attempt < MAX_RETRIES:
+                    delay = self._retry_delay(response)
+                    logger.warning(f"Airtable rate limited, holding requests for {delay:.1f}s")
+                    await asyncio.to_thread(self.limiter.block, self.base_id, delay)
+                    continue
+                if response.status >= 400:
+                    try:
+                        error = (await response.json()).get('error', {})
+                    except Exception:
+                        error = await response.text()
+                    if isinstance(error, dict):
+                        raise AirtableError(response.status, error.get('type', 'ERROR'), error.get('message', ''))
+                    raise AirtableError(response.status, 'ERROR', str(error))
+                return await response.json()
+
+    def _retry_delay(self, response: aiohttp.ClientResponse) -> float:
+        """Seconds to wait after a 429, from Retry-After when the server sends it"""
+        try:
+            return max(float(response.headers.get('Retry-After', THROTTLE_SECONDS)), 0.0)
+        except ValueError:
+            return THROTTLE_SECONDS
+
+
+class AirtableTable:
+    """Record operations on one table of the base"""
+
+    def __init__(self, client: AirtableClient, table_name: str):
+        self.client = client
+        self.table_name = table_name
+        # In-flight reads on the I/O loop, keyed by their query parameters
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+
+    @property
+    def path(self) -> str:
+        return f"{self.client.base_id}/{quote(self.table_name, safe='')}"
+
+    def _list_params(self, formula: Optional[str], fields: Optional[List[str]], sort: Optional[SortSpec],
+                     max_records: Optional[int], page_size: Optional[int], view: Optional[str]) -> List[tuple]:
+        params = []
+        if formula:
+            params.append(('filterByFormula', formula))
+        for field in fields or []:
+            params.append(('fields[]', field))
+        for i, spec in enumerate(sort or []):
+            if isinstance(spec, tuple):
+                field, direction = spec
+            else:
+                field, direction = (spec[1:], 'desc') if spec.startswith('-') else (spec, 'asc')
+            params.append((f"sort[{i}][field]", field))
+            params.append((f"sort[{i}][direction]", direction))
+        if max_records:
+            params.append(('maxRecords', str(max_records)))
+        if page_size:
+            params.append(('pageSize', str(page_size)))
+        if view:
+            params.append(('view', view))
+        return params
+
+    async def all(self, formula: Optional[str] = None, fields: Optional[List[str]] = None,
+                  sort: Optional[SortSpec] = None, max_records: Optional[int] = None,
+                  page_size: Optional[int] = None, view: Optional[str] = None) -> List[Dict]:
+        """List records, following pagination offsets until exhausted.
+
+        Identical concurrent reads share one fetch, so a burst of users
+        asking the same question costs a single set of requests.
+        """
+        params = self._list_params(formula, fields, sort, max_records, page_size, view)
+        records = await io_loop.run(self._shared_fetch(tuple(params), max_records))
+        return list(records)
+
+    async def _shared_fetch(self, params: tuple, max_records: Optional[int]) -> List[Dict]:
+        """Join an in-flight fetch with the same parameters or start one (I/O loop only)"""
+        future = self._inflight.get(params)
+        if future is None:
+            future = asyncio.ensure_future(self._fetch_all(list(params), max_records))
+            self._inflight[params] = future
+            future.add_done_callback(lambda _: self._inflight.pop(params, None))
+        return await asyncio.shield(future)
+
+    async def _fetch_all(self, params: List[tuple], max_records: Optional[int]) -> List[Dict]:
+        records = []
+        offset = None
+        while True:
+            page_params = params + ([('offset', offset)] if offset else [])
+            data = await self.client._request('GET', self.path, page_params, None)
+            records.extend(data.get('records', []))
+            offset = data.get('offset')
+            if not offset or (max_records and len(records) >= max_records):
+                return records[:max_records] if max_records else records
+
+    async def pages(self, formula: Optional[str] = None, fields: Optional[List[str]] = None,
+                    sort: Optional[SortSpec] = None, max_records: Optional[int] = None,
+                    page_size: Optional[int] = None, view: Optional[str] = None) -> AsyncIterator[List[Dict]]:
+        """Yield one page of records at a time.
+
+        The next page is only requested once the caller asks for it, so
+        memory stays at one page and breaking out of the loop early skips
+        the remaining requests.
+        """
+        params = self._list_params(formula, fields, sort, max_records, page_size, view)
+        offset = None
+        seen = 0
+        while True:
+            page_params = params + ([('offset', offset)] if offset else [])
+            data = await self.client.request('GET', self.path, page_params)
+            records = data.get('records', [])
+            if max_records:
+                records = records[:max_records - seen]
+            seen += len(records)
+            if records:
+                yield records
+            offset = data.get('offset')
+            if not offset or (max_records and seen >= max_records):
+                return
+
+    async def iterate(self, **options) -> AsyncIterator[Dict]:
+        """Yield records one by one, fetching pages lazily (see pages())"""
+        async for page in self.pages(**options):
+            for record in page:
+                yield record
+
+    async def first(self, **options) -> Optional[Dict]:
+        records = await self.all(max_records=1, **options)
+        return records[0] if records else None
+
+    async def get(self, record_id: str) -> Dict:
+        return await self.client.request('GET', f"{self.path}/{record_id}")
+
+    async def create(self, fields: Dict[str, Any], typecast: bool = False) -> Dict:
+        return await self.client.request('POST', self.path, json={'fields': fields, 'typecast': typecast})
+
+    async def batch_create(self, records: List[Dict[str, Any]], typecast: bool = False) -> List[Dict]:
+        """Create records in chunks of up to 10 per request"""
+        created = []
+        for i in range(0, len(records), BATCH_SIZE):
+            chunk = [{'fields': fields} for fields in records[i:i + BATCH_SIZE]]
+            data = await self.client.request('POST', self.path, json={'records': chunk, 'typecast': typecast})
+            created.extend(data.get('records', []))
+        return created
+
+    async def update(self, record_id: str, fields: Dict[str, Any], typecast: bool = False) -> Dict:
+        return await self.client.request('PATCH', f"{self.path}/{record_id}", json={'fields': fields, 'typecast': typecast})
+
+    async def batch_update(self, records: List[Dict[str, Any]], typecast: bool = False) -> List[Dict]:
+        """Update records ({'id', 'fields'}) in chunks of up to 10 per request"""
+        updated = []
+        for i in range(0, len(records), BATCH_SIZE):
+            chunk = [{'id': r['id'], 'fields': r['fields']} for r in records[i:i + BATCH_SIZE]]
+            data = await self.client.request('PATCH', self.path, json={'records': chunk, 'typecast': typecast})
+            updated.extend(data.get('records', []))
+        return updated
+
+    async def delete(self, record_id: str) -> Dict:
+        return await self.client.request('DELETE', f"{self.path}/{record_id}")
+
+    async def batch_delete(self, record_ids: List[str]) -> List[Dict]:
+        """Delete records in chunks of up to 10 per request"""
+        deleted = []
+        for i in range(0, len(record_ids), BATCH_SIZE):
+            params = [('records[]', record_id) for record_id in record_ids[i:i + BATCH_SIZE]]
+            data = await self.client.request('DELETE', self.path, params=params)
+            deleted.extend(data.get('records', []))
+        return deleted
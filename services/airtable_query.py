@@ -0,0 +1,105 @@
+from typing import Any, AsyncIterator, Dict, List, Optional
+from services.airtable_client import AirtableTable
+
+# Largest page Airtable will return
+MAX_PAGE_SIZE = 100
+
+
+def escape(value: Any) -> str:
+    """Render a Python value as a formula literal, quoting strings safely"""
+    if isinstance(value, bool):
+        return 'TRUE()' if value else 'FALSE()'
+    if isinstance(value, (int, float)):
+        return str(value)
+    text = str(value).replace('\\', '\\\\').replace("'", "\\'")
+    return f"'{text}'"
+
+
+def field(name: str) -> str:
+    """Reference a field by name in a formula"""
+    return '{' + name.replace('}', '\\}') + '}'
+
+
+def compare(name: str, value: Any, op: str = '=') -> str:
+    if op not in ('=', '!=', '>', '>=', '<', '<='):
+        raise ValueError(f"Unsupported operator: {op}")
+    return f"{field(name)} {op} {escape(value)}"
+
+
+def all_of(*conditions: str) -> str:
+    conditions = [c for c in conditions if c]
+    if len(conditions) == 1:
+        return conditions[0]
+    return f"AND({', '.join(conditions)})"
+
+
+def modified_after(timestamp: str) -> str:
+    """Match records modified after an ISO timestamp"""
+    return f"IS_AFTER(LAST_MODIFIED_TIME(), DATETIME_PARSE({escape(timestamp)}))"
+
+
+class Query:
+    """Builds a list request with projection, filters, sort and limits.
+
+    Each call site declares the fields it needs so pages stay small, and
+    values are escaped rather than pasted into formulas, so names with
+    apostrophes work. For example:
+
+        await Query(table).where('From', user_id).select('Body').order_by('-Created').limit(5).all()
+    """
+
+    def __init__(self, table: AirtableTable):
+        self.table = table
+        self._conditions: List[str] = []
+        self._fields: Optional[List[str]] = None
+        self._sort: List[str] = []
+        self._limit: Optional[int] = None
+        self._page_size: Optional[int] = MAX_PAGE_SIZE
+
+    def where(self, name: str, value: Any, op: str = '=') -> 'Query':
+        self._conditions.append(compare(name, value, op))
+        return self
+
+    def where_formula(self, formula: str) -> 'Query':
+        """Add a prebuilt condition, e.g. from modified_after()"""
+        self._conditions.append(formula)
+        return self
+
+    def select(self, *fields: str) -> 'Query':
+        self._fields = list(fields) or None
+        return self
+
+    def order_by(self, *specs: str) -> 'Query':
+        """Sort by fields; prefix a field with '-' for descending"""
+        self._sort.extend(specs)
+        return self
+
+    def limit(self, max_records: int) -> 'Query':
+        self._limit = max_records
+        self._page_size = min(max_records, MAX_PAGE_SIZE)
+        return self
+
+    @property
+    def formula(self) -> Optional[str]:
+        return all_of(*self._conditions) if self._conditions else None
+
+    def options(self) -> Dict[str, Any]:
+        return {
+            'formula': self.formula,
+            'fields': self._fields,
+            'sort': self._sort or None,
+            'max_records': self._limit,
+            'page_size': self._page_size
+        }
+
+    async def all(self) -> List[Dict]:
+        return await self.table.all(**self.options())
+
+    async def pages(self) -> AsyncIterator[List[Dict]]:
+        """Stream the results a page at a time (see AirtableTable.pages)"""
+        async for page in self.table.pages(**self.options()):
+            yield page
+
+    async def first(self) -> Optional[Dict]:
+        records = await self.limit(1).all()
+        return records[0] if records else None
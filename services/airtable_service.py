@@ -2,8 +2,12 @@
 import os
 import logging
 from datetime import datetime
-from airtable import Airtable
-from typing import Dict, List, Optional
+from typing import AsyncIterator, Dict, List, Optional
+from services.conversation_archive import archive_cutoff, archive_old_turns, conversation_archive
+from services.conversation_journal import conversation_journal
+from services.relevance_index import relevance_index
+from services.user_profile import profile_store
+from services.storage import get_storage
 
 logger = logging.getLogger(__name__)
 
@@ -11,7 +15,17 @@ class AirtableService:
     def __init__(self):
         self.base_id = os.getenv('AIRTABLE_BASE_ID')
         self.api_key = os.getenv('AIRTABLE_API_KEY')
-        self.table_name = 'Conversations'
+        self.table_name = os.getenv('AIRTABLE_CONVERSATION_TABLE', 'Conversations')
+        self.context_fields = ['From', 'Body', 'Response', 'Intent']
+        # Seconds a logged turn may wait before a partial batch is flushed
+        self.flush_seconds = float(os.getenv('CONVERSATION_FLUSH_SECONDS', '5'))
+        
+        storage = get_storage()
+        if storage.backend != 'airtable':
+            # Conversations live in the relational store; Airtable is at most a mirror
+            self.airtable = storage.table('conversations', self.table_name, indexed=['From'])
+            logger.info(f"Conversation storage: {storage.backend}")
+            return
         
         logger.info(f"Base ID format check: {'app' in str(self.base_id) if self.base_id else 'missing'}")
         logger.info(f"API Key format check: {'pat' in str(self.api_key).lower() if self.api_key else 'missing'}")
@@ -29,62 +43,146 @@ class AirtableService:
                 self.airtable = None
                 return
             try:
-                self.airtable = Airtable(self.base_id, self.table_name, self.api_key)
-                logger.info("Airtable connection successful")
+                # Reads are served from the local replica, indexed by sender
+                self.airtable = storage.table('conversations', self.table_name, indexed=['From'], fields=self.context_fields)
+                logger.info("Airtable client configured")
             except Exception as e:
                 logger.error(f"Airtable connection failed: {str(e)}")
                 self.airtable = None
 
-    def store_conversation(self, user_id: str, message: str, response: str) -> Dict:
-        """Store a conversation entry in Airtable"""
+    async def store_conversation(self, user_id: str, message: str, response: str, intent: str = '') -> Dict:
+        """Record a conversation turn locally and queue it for a batched Airtable write"""
+        try:
+            # Keep the preference aggregate and user profile current without relearning
+            from services.preference_learning import PreferenceLearning
+            learner = PreferenceLearning(airtable=self)
+            learner.record_turn(user_id, message, intent)
+            profile_store.record_turn(user_id, message, response, learner.get_preferences(user_id))
+        except Exception as e:
+            logger.error(f"Error updating preference aggregate: {e}")
+
+        fields = {
+            'From': user_id,        # Mobile number
+            'Body': message,        # Long Text
+            'Response': response,   # Long Text
+            'Intent': intent       # Single line text
+        }
+
+        self._record_locally(user_id, {'createdTime': datetime.utcnow().isoformat() + 'Z', 'fields': fields})
         if not self.airtable:
             logger.info("Airtable storage disabled - skipping")
             return {"status": "storage_disabled"}
         try:
-            fields = {
-                'From': user_id,        # Mobile number
-                'Body': message,        # Long Text
-                'Response': response,   # Long Text
-                'Intent': ''           # Single line text
-            }
-            return self.airtable.insert(fields)
+            self.airtable.append(fields, self.flush_seconds)
+            return {"status": "queued"}
         except Exception as e:
-            logger.error(f"Error storing conversation in Airtable: {e}")
+            logger.error(f"Error queueing conversation for Airtable: {e}")
             return {"error": str(e)}
 
-    def get_user_history(self, user_id: str, limit: int = 5) -> List[Dict]:
-        """Retrieve conversation history for a user"""
-        formula = f"{{From}} = '{user_id}'"
-        return self.airtable.get_all(formula=formula, max_records=limit)
+    def conversation_log_stats(self) -> Dict:
+        """Queue depth and flush lag for conversation rows not yet written remotely"""
+        if not self.airtable:
+            return {"status": "storage_disabled"}
+        return self.airtable.pending_writes()
+
+    async def archive_old_conversations(self, days: Optional[int] = None) -> Dict:
+        """Move turns older than the archive horizon out of the live table"""
+        if not self.airtable:
+            return {"status": "storage_disabled"}
+        try:
+            moved = await archive_old_turns(self.airtable, days)
+            return {"status": "archived", "moved": moved, "archive": conversation_archive.stats()}
+        except Exception as e:
+            logger.error(f"Error archiving conversations: {e}")
+            return {"status": "error", "error": str(e)}
+
+    def _record_locally(self, user_id: str, record: Dict) -> None:
+        """Journal a new turn, then keep the relevance index in step"""
+        try:
+            conversation_journal.append(user_id, record)
+        except Exception as e:
+            logger.error(f"Error appending to conversation journal: {e}")
+        relevance_index.add(user_id, record)
+
+    def invalidate_user_history(self, user_id: str) -> None:
+        """Drop caches derived from a user's history after it changed in storage"""
+        conversation_journal.reset(user_id)
+        # Without an index the next context lookup re-reads the history
+        relevance_index.drop(user_id)
+        profile_store.update(user_id, {'recent_turns': [], 'preferences_rebuilt_at': None})
+
+    async def get_user_history(self, user_id: str, limit: int = 5) -> List[Dict]:
+        """Retrieve a user's conversation history, newest first"""
+        if conversation_journal.is_seeded(user_id):
+            return conversation_journal.tail(user_id, limit)
+        return await self.airtable.select(where={'From': user_id}, order_by='createdTime', descending=True, limit=limit)
 
     async def get_recent_conversations(self, user_id: str, limit: int = 5) -> List[Dict]:
-        """Get recent conversations for a user"""
+        """Get a user's latest conversations, newest first"""
         if not self.airtable:
             return []
         try:
-            return self.get_user_history(user_id, limit)
+            return await self.get_user_history(user_id, limit)
         except Exception as e:
             logger.error(f"Error getting recent conversations: {e}")
             return []
 
-    async def get_conversations_by_intent(self, user_id: str, intent: str) -> List[Dict]:
-        """Get conversations filtered by intent"""
+    async def get_conversations_by_intent(self, user_id: str, intent: str, limit: int = 5) -> List[Dict]:
+        """Get a user's latest conversations with an intent, newest first, in one query"""
         if not self.airtable:
             return []
         try:
-            formula = f"AND({{From}} = '{user_id}', {{Intent}} = '{intent}')"
-            return self.airtable.get_all(formula=formula, max_records=5)
+            return await self.airtable.select(where={'From': user_id, 'Intent': intent}, order_by='createdTime',
+                                              descending=True, limit=limit)
         except Exception as e:
             logger.error(f"Error getting intent conversations: {e}")
             return []
 
-    async def get_all_user_conversations(self, user_id: str) -> List[Dict]:
-        """Get all conversations for a user"""
+    async def stream_archived_conversations(self, user_id: str) -> AsyncIterator[Dict]:
+        """Yield a user's turns that were moved to the local archive, oldest first"""
+        for record in conversation_archive.read_user(user_id):
+            yield record
+
+    async def stream_user_conversations(self, user_id: str, batch_size: int = 100,
+                                        include_archive: bool = False) -> AsyncIterator[Dict]:
+        """Yield a user's live conversations oldest first.
+
+        Archived turns are only included (ahead of the live ones) when
+        include_archive is set, e.g. for summaries over the whole history.
+        Seeded users are read from the local journal, anyone else from
+        storage a batch at a time.
+        """
+        if conversation_journal.is_seeded(user_id):
+            cutoff = None if include_archive else archive_cutoff()
+            for record in conversation_journal.scan(user_id):
+                if cutoff is None or record.get('createdTime', '') >= cutoff:
+                    yield record
+            return
+        async for record in self._stream_stored_conversations(user_id, batch_size, include_archive):
+            yield record
+
+    async def _stream_stored_conversations(self, user_id: str, batch_size: int = 100,
+                                           include_archive: bool = False) -> AsyncIterator[Dict]:
+        if include_archive:
+            async for record in self.stream_archived_conversations(user_id):
+                yield record
         if not self.airtable:
-            return []
+            return
+        async for record in self.airtable.stream(where={'From': user_id}, order_by='createdTime', batch_size=batch_size):
+            yield record
+
+    async def seed_journal(self, user_id: str) -> None:
+        """Copy a user's stored history into the local journal, once"""
+        if conversation_journal.is_seeded(user_id):
+            return
+        with conversation_journal.seeder(user_id) as write:
+            async for record in self._stream_stored_conversations(user_id, include_archive=True):
+                write(record)
+
+    async def get_all_user_conversations(self, user_id: str) -> List[Dict]:
+        """Get all conversations for a user (prefer stream_user_conversations for scans)"""
         try:
-            formula = f"{{From}} = '{user_id}'"
-            return self.airtable.get_all(formula=formula)
+            return [record async for record in self.stream_user_conversations(user_id)]
         except Exception as e:
             logger.error(f"Error getting all conversations: {e}")
             return []
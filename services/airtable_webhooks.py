@@ -0,0 +1,188 @@
+import os
+import hmac
+import base64
+import hashlib
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set
+from services.airtable_client import AirtableClient, io_loop
+from services.conversation_archive import conversation_archive
+from services.local_store import JsonRecordStore
+from services.recommendation_queue import recommendation_queue
+from services.replica import replica
+from services.schema_registry import schema_registry
+from services.user_profile import profile_store
+from services.watched_index import invalidate_watched
+
+logger = logging.getLogger(__name__)
+
+# Airtable webhooks expire after 7 days unless refreshed
+REFRESH_BEFORE = timedelta(days=1)
+
+
+def _movie_tables() -> List[str]:
+    """The movie handler's watched and favourites table names"""
+    return [os.getenv('AIRTABLE_MOVIES_WATCHED', 'Movies Watched'),
+            os.getenv('AIRTABLE_MOVIE_FAVORITES', 'Movie Favorites')]
+
+
+class AirtableWebhooks:
+    """Keeps the local caches in step with changes notified by Airtable.
+
+    Airtable POSTs a small signed ping to our endpoint whenever a base
+    changes; we then read the change payloads from its cursor and apply
+    them: changed tables are re-synced into the replica (immediately for
+    replicas this worker has open, otherwise on every worker's next read),
+    deleted records are dropped, schema changes reset the cached field
+    names, edits to a user's conversations reset the caches derived
+    from their history. Movie table changes made outside the app reset the
+    watched index, recommendation queues and genre histograms built from
+    those tables. Polling stays on as a fallback.
+    """
+
+    def __init__(self, client: Optional[AirtableClient] = None):
+        self._client = client
+        self.store = JsonRecordStore('webhooks')
+        self._running = False
+        self._pending = False
+
+    @property
+    def client(self) -> AirtableClient:
+        return self._client or AirtableClient()
+
+    @property
+    def state(self) -> Dict:
+        return self.store.get(self.client.base_id)
+
+    def _path(self, *parts: str) -> str:
+        return '/'.join(['bases', self.client.base_id, 'webhooks', *parts])
+
+    async def register(self, notification_url: str) -> Dict:
+        """Create a webhook for record and field changes in the base"""
+        data = await self.client.request('POST', self._path(), json={
+            'notificationUrl': notification_url,
+            'specification': {'options': {'filters': {'dataTypes': ['tableData', 'tableFields']}}}
+        })
+        state = {
+            'id': data['id'],
+            'mac_secret': data['macSecretBase64'],
+            'expires': data.get('expirationTime'),
+            'cursor': 1,
+            'notification_url': notification_url
+        }
+        self.store.save(self.client.base_id, state)
+        logger.info(f"Registered Airtable webhook {data['id']} -> {notification_url}")
+        return state
+
+    def verify(self, body: bytes, signature: str) -> bool:
+        """Check the X-Airtable-Content-MAC header against the webhook's secret"""
+        secret = os.getenv('AIRTABLE_WEBHOOK_SECRET') or self.state.get('mac_secret')
+        if not secret:
+            logger.warning("No Airtable webhook secret configured - rejecting notification")
+            return False
+        digest = hmac.new(base64.b64decode(secret), body, hashlib.sha256).hexdigest()
+        return hmac.compare_digest(f"hmac-sha256={digest}", signature or '')
+
+    def notify(self):
+        """Handle a ping: process new payloads on the I/O loop without blocking the request"""
+        future = io_loop.submit(self.process())
+        future.add_done_callback(lambda f: f.exception() and logger.error(
+            f"Error processing Airtable webhook payloads: {f.exception()}"))
+        return future
+
+    async def process(self) -> Dict:
+        """Read and apply every payload since the saved cursor (I/O loop only)"""
+        if self._running:
+            # A ping arrived mid-run; go round again once this run finishes
+            self._pending = True
+            return {'status': 'queued'}
+        self._running = True
+        applied = 0
+        try:
+            while True:
+                self._pending = False
+                applied += await self._drain()
+                if not self._pending:
+                    break
+            await self._refresh_if_expiring()
+        finally:
+            self._running = False
+        return {'status': 'ok', 'applied': applied}
+
+    async def _drain(self) -> int:
+        state = self.state
+        if not state.get('id'):
+            logger.warning("Airtable webhook ping received but no webhook is registered")
+            return 0
+        applied = 0
+        while True:
+            data = await self.client.request('GET', self._path(state['id'], 'payloads'),
+                                             params={'cursor': str(state['cursor'])})
+            for payload in data.get('payloads', []):
+                await self.apply(payload)
+                applied += 1
+            state['cursor'] = data.get('cursor', state['cursor'])
+            self.store.save(self.client.base_id, state)
+            if not data.get('mightHaveMore'):
+                return applied
+
+    async def apply(self, payload: Dict) -> Dict:
+        """Apply one change payload to the replica and per-user caches"""
+        from services.airtable_service import AirtableService
+        conversations = AirtableService()
+        names = await schema_registry.table_names_by_id(self.client.table(conversations.table_name))
+        users: Set[str] = set()
+        tables: List[Optional[str]] = []
+        movie_tables: Set[Optional[str]] = set()
+
+        for table_id, changes in payload.get('changedTablesById', {}).items():
+            # Without the metadata scope we can't tell which table it was
+            name = names.get(table_id)
+            tables.append(name)
+            fields_changed = changes.get('createdFieldsById') or changes.get('changedFieldsById') or changes.get('destroyedFieldIds')
+            if name and fields_changed:
+                schema_registry.invalidate(self.client.table(name))
+
+            # Our own appends arrive as created records; only edits and deletes
+            # make a user's cached history wrong
+            edited = list(changes.get('changedRecordsById', {})) + list(changes.get('destroyedRecordIds', []))
+            if name in (None, conversations.table_name) and edited:
+                # Turns we archived were deleted by us and are still in the user's history
+                archived = conversation_archive.archived(changes.get('destroyedRecordIds', []))
+                changed = [record_id for record_id in edited if record_id not in archived]
+                users.update(r['fields'].get('From') for r in replica.records(name, changed) if r['fields'].get('From'))
+
+            # The app's own movie writes are already in the watched index, queues and
+            # genre histograms; changes made in Airtable itself reset all three
+            external = payload.get('actionMetadata', {}).get('source') != 'publicApi'
+            if name in (None, *_movie_tables()) and external and (edited or changes.get('createdRecordsById')):
+                movie_tables.add(name)
+
+            if changes.get('destroyedRecordIds'):
+                replica.remove_records(name, changes['destroyedRecordIds'])
+            replica.mark_stale(name)
+            for table in replica.loaded(name) if name else []:
+                await table.sync()
+
+        for user_id in users:
+            conversations.invalidate_user_history(user_id)
+        if movie_tables:
+            profile_store.drop_genre_counts()
+            recommendation_queue.clear()
+            for name in movie_tables:
+                invalidate_watched(name)
+        return {'tables': tables, 'users': sorted(users)}
+
+    async def _refresh_if_expiring(self) -> None:
+        state = self.state
+        if not state.get('expires'):
+            return
+        expires = datetime.fromisoformat(state['expires'].replace('Z', '+00:00')).replace(tzinfo=None)
+        if expires - datetime.utcnow() < REFRESH_BEFORE:
+            data = await self.client.request('POST', self._path(state['id'], 'refresh'))
+            state['expires'] = data.get('expirationTime')
+            self.store.save(self.client.base_id, state)
+            logger.info(f"Refreshed Airtable webhook {state['id']} until {state['expires']}")
+
+
+airtable_webhooks = AirtableWebhooks()
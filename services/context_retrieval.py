@@ -1,51 +1,104 @@
-
 from typing import List, Dict, Optional
+from collections import deque
+from contextlib import ExitStack
 from datetime import datetime, timedelta
 import logging
 from services.airtable_service import AirtableService
+from services.conversation_archive import archive_cutoff
 from services.preference_learning import PreferenceLearning
+from services.relevance_index import relevance_index
+from services.user_profile import profile_store
 
 logger = logging.getLogger(__name__)
 
+
+class _IncompleteScan(Exception):
+    """The history stream ended with an error part way through"""
+
+
 class ContextRetrieval:
     def __init__(self):
         self.airtable = AirtableService()
+        self.preference_learner = PreferenceLearning(airtable=self.airtable)
         
-    async def get_context(self, user_id: str, current_intent: str) -> Dict:
+    async def get_context(self, user_id: str, current_intent: str, message: str = '') -> Dict:
         """Get relevant context for the current conversation"""
         try:
-            # Get recent conversations
-            recent = await self._get_recent_history(user_id)
+            # One keyed read of the denormalised profile covers everything but relevance
+            profile = profile_store.get(user_id)
             
-            # Get intent-specific history
-            intent_history = await self._get_intent_history(user_id, current_intent)
+            if not relevance_index.has_user(user_id) or self.preference_learner.rebuild_due(profile.get('preferences_rebuilt_at')):
+                profile = await self._refresh_from_history(user_id)
             
-            # Get user preferences
-            preferences = await self._get_user_preferences(user_id)
+            relevant = self._get_relevant_history(user_id, message or current_intent)
+            next_shift = profile.get('next_shift')
+            if next_shift and next_shift.get('date', '') < datetime.now().date().isoformat():
+                next_shift = None
             
             return {
-                'recent_context': recent,
-                'intent_context': intent_history,
-                'user_preferences': preferences
+                'recent_context': profile.get('recent_turns', [])[:2],
+                'relevant_context': relevant,
+                'user_preferences': profile.get('preferences', {}),
+                'user_profile': {
+                    'usual_stations': profile_store.usual_stations(profile),
+                    'locations': profile.get('locations', []),
+                    'favourite_genres': profile.get('favourite_genres', []),
+                    'next_shift': next_shift
+                }
             }
         except Exception as e:
             logger.error(f"Error retrieving context: {e}")
             return {}
             
-    async def _get_recent_history(self, user_id: str, limit: int = 5) -> List[Dict]:
-        """Get recent conversation history"""
-        return await self.airtable.get_recent_conversations(user_id, limit)
+    async def _refresh_from_history(self, user_id: str) -> Dict:
+        """Backfill the index and rebuild preferences from one pass over the journaled history"""
+        profile = profile_store.get(user_id)
+        backfill = not relevance_index.has_user(user_id)
+        rebuild = self.preference_learner.rebuild_due(profile.get('preferences_rebuilt_at'))
+        latest = deque(maxlen=5)
+        scan = {'turns': 0, 'complete': False}
+        cutoff = archive_cutoff()
         
-    async def _get_intent_history(self, user_id: str, intent: str) -> List[Dict]:
-        """Get history specific to current intent"""
-        return await self.airtable.get_conversations_by_intent(user_id, intent)
+        async def history():
+            async for record in self.airtable.stream_user_conversations(user_id, include_archive=rebuild):
+                scan['turns'] += 1
+                # Archived turns only feed the preference summary; retrieval uses the hot set
+                if record.get('createdTime', '') >= cutoff:
+                    latest.append(record)
+                    if write:
+                        write(record)
+                yield record
+            scan['complete'] = True
         
-    async def _get_user_preferences(self, user_id: str) -> Dict:
-        """Get user preferences using PreferenceLearning system"""
+        changes = {}
         try:
-            preference_learner = PreferenceLearning()
-            preferences = await preference_learner.learn_preferences(user_id)
-            return preferences
+            # After one import from storage, history scans read the local journal
+            await self.airtable.seed_journal(user_id)
+            with ExitStack() as stack:
+                write = stack.enter_context(relevance_index.backfill_writer(user_id)) if backfill else None
+                if rebuild:
+                    rebuilt = await self.preference_learner.rebuild_preferences(user_id, history())
+                    changes['preferences'] = self.preference_learner.get_preferences(user_id)
+                    changes['preferences_rebuilt_at'] = rebuilt.get('rebuilt_at') or datetime.now().isoformat()
+                else:
+                    async for _ in history():
+                        pass
+                if not scan['complete']:
+                    # Leave no partial index behind; the next request retries
+                    raise _IncompleteScan("stream ended early")
         except Exception as e:
-            logger.error(f"Error extracting preferences: {e}")
-            return {}
+            logger.error(f"History scan for {user_id} failed after {scan['turns']} turns: {e}")
+            return profile
+        
+        if backfill:
+            logger.info(f"Backfilled relevance index for {user_id} with {scan['turns']} turns")
+        if not profile.get('recent_turns') and latest:
+            changes['recent_turns'] = [
+                {'body': r['fields'].get('Body', ''), 'response': r['fields'].get('Response', '')[:200], 'at': r.get('createdTime')}
+                for r in reversed(latest)
+            ]
+        return profile_store.update(user_id, changes) if changes else profile_store.get(user_id)
+        
+    def _get_relevant_history(self, user_id: str, query: str, limit: int = 5) -> List[Dict]:
+        """Get the past turns most relevant to the current message"""
+        return relevance_index.search(user_id, query, limit)
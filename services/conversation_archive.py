@@ -0,0 +1,216 @@
+import os
+import gzip
+import json
+import fcntl
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set
+from services.local_store import data_dir
+
+try:
+    import zstandard
+except ImportError:  # Optional: fall back to gzip frames
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Turns older than this many days are moved out of the live table
+ARCHIVE_DAYS = int(os.getenv('CONVERSATION_ARCHIVE_DAYS', '90'))
+
+
+def _compress(data: bytes, codec: str) -> bytes:
+    if codec == 'zst':
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def _decompress(data: bytes, codec: str) -> bytes:
+    if codec == 'zst':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+class ConversationArchive:
+    """Cold storage for old conversation turns on local disk.
+
+    Turns are partitioned by month into files of compressed frames (zstd
+    when the zstandard package is installed, gzip otherwise). Each frame
+    holds JSON lines for one user, and a per-month index maps users to
+    the (offset, length) of their frames, so one user's turns are read
+    without decompressing anyone else's. Concatenated frames are still a
+    valid zstd/gzip stream, so a whole month can be scanned for analytics.
+    """
+
+    def __init__(self, name: str = 'conversations', user_field: str = 'From'):
+        self.name = name
+        self.user_field = user_field
+
+    @property
+    def storage_dir(self) -> str:
+        return data_dir('archive', self.name)
+
+    @property
+    def codec(self) -> str:
+        """Codec for new partitions"""
+        return 'zst' if zstandard else 'gz'
+
+    def months(self) -> List[str]:
+        """Archived months (YYYY-MM), oldest first"""
+        if not os.path.isdir(self.storage_dir):
+            return []
+        return sorted(name[:-len('.index.json')] for name in os.listdir(self.storage_dir)
+                      if name.endswith('.index.json'))
+
+    def _index_path(self, month: str) -> str:
+        return os.path.join(self.storage_dir, f"{month}.index.json")
+
+    def _data_path(self, month: str, codec: str) -> str:
+        return os.path.join(self.storage_dir, f"{month}.jsonl.{codec}")
+
+    def _index(self, month: str) -> Dict:
+        try:
+            with open(self._index_path(month)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'codec': self.codec, 'users': {}, 'ids': [], 'turns': 0}
+
+    def _save_index(self, month: str, index: Dict) -> None:
+        path = self._index_path(month)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(index, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialise archive writers across worker processes"""
+        os.makedirs(self.storage_dir, exist_ok=True)
+        with open(os.path.join(self.storage_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def write(self, records: List[Dict]) -> List[str]:
+        """Archive records and return the ids now safe to delete from the live table.
+
+        Records already archived by an earlier, interrupted run are skipped
+        rather than written twice.
+        """
+        groups: Dict[tuple, List[Dict]] = {}
+        for record in records:
+            month = (record.get('createdTime') or '')[:7] or 'unknown'
+            user = record.get('fields', {}).get(self.user_field, '')
+            groups.setdefault((month, user), []).append(record)
+
+        archived = []
+        with self._locked():
+            for month in sorted({month for month, _ in groups}):
+                index = self._index(month)
+                seen = set(index['ids'])
+                codec = index['codec']
+                with open(self._data_path(month, codec), 'ab') as f:
+                    for (group_month, user), turns in sorted(groups.items()):
+                        if group_month != month:
+                            continue
+                        new = [r for r in turns if r['id'] not in seen]
+                        archived.extend(r['id'] for r in turns if r['id'] in seen)
+                        if not new:
+                            continue
+                        frame = _compress(''.join(json.dumps(r) + '\n' for r in new).encode(), codec)
+                        offset = f.tell()
+                        f.write(frame)
+                        index['users'].setdefault(user, []).append([offset, len(frame), len(new)])
+                        index['ids'].extend(r['id'] for r in new)
+                        index['turns'] += len(new)
+                        archived.extend(r['id'] for r in new)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._save_index(month, index)
+        return archived
+
+    def archived(self, record_ids: List[str]) -> Set[str]:
+        """Which of these record ids have been moved into the archive"""
+        wanted = set(record_ids)
+        found: Set[str] = set()
+        for month in self.months() if wanted else []:
+            found.update(wanted.intersection(self._index(month)['ids']))
+        return found
+
+    def _frames(self, month: str, extents: List[List[int]], codec: str) -> Iterator[Dict]:
+        with open(self._data_path(month, codec), 'rb') as f:
+            for offset, length, _ in extents:
+                f.seek(offset)
+                for line in _decompress(f.read(length), codec).splitlines():
+                    yield json.loads(line)
+
+    def _readable(self, month: str, index: Dict) -> bool:
+        if index['codec'] == 'zst' and not zstandard:
+            logger.error(f"Skipping archived {self.name} for {month}: zstandard is not installed")
+            return False
+        return True
+
+    def read_user(self, user_id: str, months: Optional[List[str]] = None) -> Iterator[Dict]:
+        """Yield a user's archived turns, oldest first"""
+        for month in months or self.months():
+            index = self._index(month)
+            extents = index['users'].get(user_id)
+            if extents and self._readable(month, index):
+                yield from sorted(self._frames(month, extents, index['codec']),
+                                  key=lambda r: r.get('createdTime', ''))
+
+    def scan(self, month: str) -> Iterator[Dict]:
+        """Yield every archived turn for a month, e.g. for analytics"""
+        index = self._index(month)
+        if not self._readable(month, index):
+            return
+        extents = [extent for user_extents in index['users'].values() for extent in user_extents]
+        yield from self._frames(month, sorted(extents), index['codec'])
+
+    def stats(self) -> Dict:
+        months = {}
+        for month in self.months():
+            index = self._index(month)
+            path = self._data_path(month, index['codec'])
+            months[month] = {
+                'turns': index['turns'],
+                'users': len(index['users']),
+                'bytes': os.path.getsize(path) if os.path.exists(path) else 0
+            }
+        return {'codec': self.codec, 'months': months}
+
+
+conversation_archive = ConversationArchive()
+
+
+def archive_cutoff(days: Optional[int] = None) -> str:
+    """createdTime before which turns belong in the archive rather than the hot set"""
+    days = ARCHIVE_DAYS if days is None else days
+    return (datetime.utcnow() - timedelta(days=days)).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+
+
+async def archive_old_turns(table, days: Optional[int] = None, batch_size: int = 100,
+                            archive: Optional[ConversationArchive] = None) -> int:
+    """Move turns older than the horizon from a live storage table into the archive.
+
+    Works in batches: each batch is made durable on disk before it is
+    deleted from the live table, so a crash at any point loses nothing.
+    """
+    archive = archive or conversation_archive
+    cutoff = archive_cutoff(days)
+    moved = 0
+    while True:
+        batch = await table.select(where={'createdTime': ('<', cutoff)}, order_by='createdTime', limit=batch_size)
+        if not batch:
+            break
+        record_ids = archive.write(batch)
+        await table.batch_delete(record_ids)
+        moved += len(record_ids)
+        logger.info(f"Archived {moved} {table.table_name} turns older than {cutoff}")
+        if len(batch) < batch_size:
+            break
+    return moved
@@ -0,0 +1,193 @@
+import os
+import json
+import mmap
+import fcntl
+import struct
+import logging
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+from services.local_store import data_dir, safe_key
+
+logger = logging.getLogger(__name__)
+
+# A new segment file is started once the active one reaches this size
+SEGMENT_BYTES = int(float(os.getenv('JOURNAL_SEGMENT_MB', '64')) * 1024 * 1024)
+
+# Per-user index entry: segment number, byte offset, record length
+ENTRY = struct.Struct('<IQI')
+
+
+class ConversationJournal:
+    """Append-only local log of conversation turns, shared by all workers.
+
+    Turns are written as compact JSON lines to numbered segment files that
+    are only ever appended to, and each user has an index file of
+    fixed-size (segment, offset, length) entries in history order. Reads
+    look up a user's entries and slice the records out of memory-mapped
+    segments, so the latest N turns cost N small reads and a full history
+    is a sequential scan of local memory rather than a network query.
+
+    The journal only answers for a user once their earlier history has
+    been seeded from storage (see seeder()); until then callers fall back
+    to the storage backend.
+    """
+
+    def __init__(self, name: str = 'conversations', segment_bytes: int = SEGMENT_BYTES):
+        self.name = name
+        self.segment_bytes = segment_bytes
+        self._maps: Dict[tuple, mmap.mmap] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def storage_dir(self) -> str:
+        return data_dir('journal', self.name)
+
+    def _segment_path(self, segment: int) -> str:
+        return os.path.join(self.storage_dir, f"{segment:08d}.log")
+
+    def _index_path(self, user_id: str) -> str:
+        return os.path.join(self.storage_dir, 'users', f"{safe_key(user_id)}.idx")
+
+    def _seeded_path(self, user_id: str) -> str:
+        return os.path.join(self.storage_dir, 'users', f"{safe_key(user_id)}.seeded")
+
+    def is_seeded(self, user_id: str) -> bool:
+        """Whether the journal holds the user's complete history"""
+        return os.path.exists(self._seeded_path(user_id))
+
+    def reset(self, user_id: str) -> None:
+        """Forget a user's journaled history, e.g. after it was edited in storage.
+
+        Their segment records stay on disk but are no longer indexed; reads
+        fall back to storage until the user is seeded again.
+        """
+        with self._locked():
+            for path in (self._seeded_path(user_id), self._index_path(user_id)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        """Serialise appends across worker processes"""
+        os.makedirs(os.path.join(self.storage_dir, 'users'), exist_ok=True)
+        with open(os.path.join(self.storage_dir, '.lock'), 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _active_segment(self) -> int:
+        segments = [int(name[:-4]) for name in os.listdir(self.storage_dir) if name.endswith('.log')]
+        segment = max(segments, default=1)
+        path = self._segment_path(segment)
+        if os.path.exists(path) and os.path.getsize(path) >= self.segment_bytes:
+            segment += 1
+        return segment
+
+    def _write(self, record: Dict) -> bytes:
+        """Append one record to the active segment (lock held) and return its index entry"""
+        segment = self._active_segment()
+        line = (json.dumps(record, separators=(',', ':')) + '\n').encode()
+        with open(self._segment_path(segment), 'ab') as f:
+            offset = f.seek(0, os.SEEK_END)
+            f.write(line)
+        return ENTRY.pack(segment, offset, len(line) - 1)
+
+    def append(self, user_id: str, record: Dict) -> None:
+        """Append a new turn to the log and the user's index"""
+        with self._locked():
+            entry = self._write(record)
+            with open(self._index_path(user_id), 'ab') as f:
+                f.write(entry)
+
+    @contextmanager
+    def seeder(self, user_id: str) -> Iterator[Callable[[Dict], None]]:
+        """Import a user's existing history, passed in oldest first.
+
+        Records created at or after the user's first journaled turn are
+        skipped, since the journal already has them. The imported entries
+        are put ahead of the journaled ones and the user is marked seeded
+        only if the block exits cleanly.
+        """
+        first = self._first_created(user_id)
+        entries: List[tuple] = []
+
+        def write(record: Dict) -> None:
+            created = record.get('createdTime') or ''
+            if first is None or created < first:
+                with self._locked():
+                    entries.append((created, self._write(record)))
+
+        yield write
+        with self._locked():
+            # Turns journaled while seeding ran supersede their stored copies
+            first = self._first_created(user_id)
+            seeded = b''.join(entry for created, entry in entries if first is None or created < first)
+            path = self._index_path(user_id)
+            current = b''
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    current = f.read()
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(seeded + current)
+            os.replace(tmp_path, path)
+            open(self._seeded_path(user_id), 'w').close()
+        logger.info(f"Seeded {self.name} journal for {user_id} with {len(seeded) // ENTRY.size} turns")
+
+    def _entries(self, user_id: str, last: Optional[int] = None) -> List[tuple]:
+        try:
+            with open(self._index_path(user_id), 'rb') as f:
+                if last:
+                    size = f.seek(0, os.SEEK_END)
+                    f.seek(max(size - last * ENTRY.size, 0) // ENTRY.size * ENTRY.size)
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        usable = len(data) // ENTRY.size * ENTRY.size
+        return list(ENTRY.iter_unpack(data[:usable]))
+
+    def _read(self, segment: int, offset: int, length: int) -> Dict:
+        key = (self.storage_dir, segment)
+        with self._lock:
+            view = self._maps.get(key)
+            if view is None or len(view) < offset + length:
+                # The active segment has grown since it was mapped
+                if view is not None:
+                    view.close()
+                with open(self._segment_path(segment), 'rb') as f:
+                    view = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._maps[key] = view
+            return json.loads(view[offset:offset + length])
+
+    def _first_created(self, user_id: str) -> Optional[str]:
+        entries = self._entries(user_id)
+        return self._read(*entries[0]).get('createdTime') if entries else None
+
+    def tail(self, user_id: str, limit: int) -> List[Dict]:
+        """The user's latest turns, newest first"""
+        return [self._read(*entry) for entry in reversed(self._entries(user_id, limit))]
+
+    def scan(self, user_id: str) -> Iterator[Dict]:
+        """Yield all of the user's turns, oldest first"""
+        for entry in self._entries(user_id):
+            yield self._read(*entry)
+
+    def stats(self) -> Dict:
+        if not os.path.isdir(self.storage_dir):
+            return {'segments': 0, 'bytes': 0, 'users': 0}
+        segments = [name for name in os.listdir(self.storage_dir) if name.endswith('.log')]
+        users = os.listdir(os.path.join(self.storage_dir, 'users'))
+        return {
+            'segments': len(segments),
+            'bytes': sum(os.path.getsize(os.path.join(self.storage_dir, name)) for name in segments),
+            'users': sum(1 for name in users if name.endswith('.idx')),
+            'seeded_users': sum(1 for name in users if name.endswith('.seeded'))
+        }
+
+
+conversation_journal = ConversationJournal()
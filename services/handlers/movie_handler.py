@@ -1,11 +1,28 @@
 import os
-import re
-from typing import Dict, Any, List, Optional
-import aiohttp
+import asyncio
+from concurrent.futures import Future
+from typing import Dict, Any, List, Optional, Tuple
 import json
 import random
-from services.base_handler import BaseHandler
 from datetime import datetime
+from services.airtable_client import io_loop
+from services.base_handler import BaseHandler
+from services.storage import get_storage
+from services.tmdb_client import TMDBClient, TMDBError
+from services.user_profile import profile_store
+from services.movie_catalog import movie_catalog
+from services.movie_intent import movie_intent_parser
+from services.recommendation_queue import QUEUE_SIZE, recommendation_queue
+from services.recommender import content_recommender, movie_features, taste_vector
+from services.movie_metadata import METADATA_FIELDS, directors, genre_ids, metadata_fields, writable
+from services.watched_index import WatchedIndex, normalise_title, watched_index
+
+# Whether each base's favorites table is reachable, checked once per worker
+_favorites_access: Dict[tuple, bool] = {}
+
+# Fields the handler reads from each table (older bases use Name/Rating/Date)
+WATCHED_FIELDS = ['Title', 'Name', 'Date Watched', 'Date Recommended', 'Date', 'User Rating', 'Rating'] + METADATA_FIELDS
+FAVORITE_FIELDS = ['Title', 'Genres'] + METADATA_FIELDS
 
 class MovieHandler(BaseHandler):
     def __init__(self):
@@ -13,6 +30,9 @@ class MovieHandler(BaseHandler):
         self.api_key = os.getenv('TMDB_API_KEY')
         self.base_url = "https://api.themoviedb.org/3"
         self.image_base_url = "https://image.tmdb.org/t/p/w500"
+        # TMDB reads go through the shared response cache
+        self.tmdb = TMDBClient(self.api_key, self.base_url)
+        self.user_id = None
         self.logger.info(f"MovieHandler initialized with API key available: {self.api_key is not None}")
         
         # Airtable setup for movie tracking
@@ -21,28 +41,16 @@ class MovieHandler(BaseHandler):
         self.airtable_favorites_table = os.getenv('AIRTABLE_MOVIE_FAVORITES', 'Movie Favorites')
         self.airtable_watched_table = os.getenv('AIRTABLE_MOVIES_WATCHED', 'Movies Watched')
         
-        # Set up Airtable connection
+        # Set up movie tracking storage (Airtable via the local replica by default)
         try:
-            from pyairtable import Api
-            if self.airtable_api_key and self.airtable_base_id:
-                self.airtable_api = Api(self.airtable_api_key)
-                self.airtable_base = self.airtable_api.base(self.airtable_base_id)
-                
-                # Check if we can access the watched table
-                self.watched_table = self.airtable_base.table(self.airtable_watched_table)
+            storage = get_storage()
+            if storage.available:
+                self.watched_table = storage.table('movies_watched', self.airtable_watched_table, indexed=['Title', 'Name'], fields=WATCHED_FIELDS)
                 self.watched_table_available = True
-                self.logger.info(f"Successfully connected to {self.airtable_watched_table} table")
                 
-                # Try to access favorites table, but continue if not available
-                try:
-                    self.favorites_table = self.airtable_base.table(self.airtable_favorites_table)
-                    # Test if we can actually access the table
-                    self.favorites_table.all(max_records=1)
-                    self.favorites_table_available = True
-                    self.logger.info(f"Successfully connected to {self.airtable_favorites_table} table")
-                except Exception as e:
-                    self.favorites_table_available = False
-                    self.logger.warning(f"Could not access {self.airtable_favorites_table} table: {e}")
+                # Favorites access is verified once per worker on first use
+                self.favorites_table = storage.table('movie_favorites', self.airtable_favorites_table, indexed=['TMDB_ID', 'Title'], fields=FAVORITE_FIELDS)
+                self.favorites_table_available = _favorites_access.get(self._favorites_key, True)
                 
                 self.airtable_available = self.watched_table_available
                 self.logger.info(f"Movie handler initialized with Airtable integration (Watched: {self.watched_table_available}, Favorites: {self.favorites_table_available})")
@@ -83,8 +91,36 @@ class MovieHandler(BaseHandler):
         # Mapping from user-friendly genre names to IDs
         self.genre_mapping = {genre.lower(): id for id, genre in self.genres.items()}
 
+    @property
+    def _favorites_key(self) -> tuple:
+        return (self.airtable_base_id, self.airtable_favorites_table)
+
+    async def _watched_index(self) -> WatchedIndex:
+        """The worker's index of watched and recommended movies, reloaded when stale"""
+        index = watched_index(self.watched_table)
+        if index.stale:
+            await index.load(self.watched_table)
+        return index
+
+    async def _check_favorites_table(self) -> None:
+        """Probe the favorites table once per worker and remember the outcome"""
+        if not self.airtable_available:
+            return
+        if self._favorites_key not in _favorites_access:
+            try:
+                await self.favorites_table.select(limit=1)
+                _favorites_access[self._favorites_key] = True
+                self.logger.info(f"Successfully connected to {self.airtable_favorites_table} table")
+            except Exception as e:
+                _favorites_access[self._favorites_key] = False
+                self.logger.warning(f"Could not access {self.airtable_favorites_table} table: {e}")
+        self.favorites_table_available = _favorites_access[self._favorites_key]
+
     async def handle(self, message: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.user_id = params.get('user_id')
         try:
+            await self._check_favorites_table()
+            
             # Extract movie query intent
             intent = self._parse_movie_intent(message.lower())
             self.logger.info(f"Parsed movie intent: {intent}")
@@ -135,114 +171,30 @@ class MovieHandler(BaseHandler):
     
     def _parse_movie_intent(self, message: str) -> Dict[str, Any]:
         """Parse the intent from the movie-related message"""
-        intent = {'action': None, 'genre': None, 'query': None, 'release_year': None}
-        
-        # Check for rating a movie - add this check earlier in the function to give it priority
-        rating_match = re.search(r'rate\s+(?:the\s+)?(?:movie\s+)?["\']?([^"\']+)["\']?(?:\s+as\s+)?(\d+(?:\.\d+)?)(?:\s+stars?)?(?:\/(\d+))?', message)
-        if rating_match or message.startswith('rate '):
-            intent['action'] = 'rate'
-            # If we have a match, use it
-            if rating_match:
-                intent['movie_title'] = rating_match.group(1).strip()
-                rating = float(rating_match.group(2))
-                scale = float(rating_match.group(3) or 5)  # Default to 5 if no scale provided
-                intent['rating'] = min(5, (rating / scale) * 5)  # Convert to 5-star scale, max of 5
-            else:
-                # Try a simpler match for cases like "rate The Shawshank Redemption 5 stars"
-                simple_match = re.search(r'rate\s+(?:the\s+)?(?:movie\s+)?([^0-9]+)(\d+(?:\.\d+)?)', message)
-                if simple_match:
-                    intent['movie_title'] = simple_match.group(1).strip()
-                    intent['rating'] = min(5, float(simple_match.group(2)))
-            
-            self.logger.info(f"Parsed rating intent: {intent}")
-            return intent
-            
-        # Check for popular movies request
-        if re.search(r'(popular|top|trending|what.*(watching|good)).*movie', message):
-            intent['action'] = 'popular'
-            
-        # Check for genre-based request
-        genre_match = re.search(r'(recommend|suggest|good|watch|find).*(\w+)(?:\s+movies?|\s+films?)', message)
-        if genre_match:
-            potential_genre = genre_match.group(2).lower()
-            self.logger.debug(f"Potential genre detected: {potential_genre}")
-            
-            # Check if this is a valid genre
-            if potential_genre in self.genre_mapping:
-                self.logger.info(f"Valid genre detected: {potential_genre}")
-                intent['action'] = 'genre'
-                intent['genre'] = potential_genre
-                
-        # Check for direct genre mentions
-        for genre_name in self.genre_mapping.keys():
-            if genre_name in message.lower():
-                self.logger.info(f"Direct genre mention detected: {genre_name}")
-                intent['action'] = 'genre'
-                intent['genre'] = genre_name
-                break
-                
-        # Check for specific search
-        search_match = re.search(r'(find|search|lookup|about).*movie[s]?\s+(?:called|named|titled)?\s+(.+?)(?:$|\?)', message)
-        if search_match:
-            intent['action'] = 'search'
-            intent['query'] = search_match.group(2).strip()
-            
-        # Check for adding movie to favorites
-        favorite_match = re.search(r'add\s+(?:movie\s+)?["\']?([^"\']+)["\']?(?:\s+to\s+(?:my\s+)?favorites)', message)
-        if favorite_match:
-            intent['action'] = 'add_favorite'
-            intent['movie_title'] = favorite_match.group(1).strip()
-            
-        # Check for recommendation
-        if (re.search(r'(recommend|suggest).*movie', message) or 
-            re.search(r'what\s+(?:movie|film)\s+should\s+I\s+watch', message)) and intent['action'] is None:
-            intent['action'] = 'recommend'
-            
-            # Try to extract preferences
-            if 'like' in message or 'similar to' in message:
-                like_match = re.search(r'like\s+["\']?([^"\']+)["\']?(?:$|\?|,|but)', message) or re.search(r'similar to\s+["\']?([^"\']+)["\']?(?:$|\?|,|but)', message)
-                if like_match:
-                    intent['query'] = like_match.group(1).strip()
-                    
-        # Default to popular if no clear intent
-        if intent['action'] is None:
-            intent['action'] = 'popular'
-            
-        self.logger.info(f"Parsed movie intent: {intent}")
-        return intent
+        return movie_intent_parser.parse(message)
     
     async def _get_popular_movies(self) -> Dict[str, Any]:
         """Get popular movies from TMDB"""
         try:
-            url = f"{self.base_url}/movie/popular"
-            params = {
-                'api_key': self.api_key,
-                'language': 'en-US',
-                'page': 1
-            }
-            
             self.logger.info(f"Fetching popular movies from TMDB API")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        movies = data.get('results', [])[:5]  # Get top 5 movies
-                        
-                        self.logger.info(f"Successfully fetched {len(movies)} popular movies")
-                        return {
-                            'success': True,
-                            'movies': movies,
-                            'count': len(movies),
-                            'category': 'Popular Movies'
-                        }
-                    else:
-                        error_data = await response.text()
-                        self.logger.error(f"TMDB API error: {response.status} - {error_data}")
-                        return {
-                            'success': False,
-                            'error': f"Movie API error: {response.status} - {error_data}"
-                        }
+            data = await self.tmdb.get('movie/popular', {'page': 1})
+            self._catalog_add(data.get('results', []))
+            movies = data.get('results', [])[:5]  # Get top 5 movies
+            
+            self.logger.info(f"Successfully fetched {len(movies)} popular movies")
+            return {
+                'success': True,
+                'movies': movies,
+                'count': len(movies),
+                'category': 'Popular Movies'
+            }
                         
+        except TMDBError as e:
+            self.logger.error(f"TMDB API error: {e}")
+            return {
+                'success': False,
+                'error': f"Movie API error: {e}"
+            }
         except Exception as e:
             self.logger.error(f"Error getting popular movies: {str(e)}")
             return {
@@ -262,44 +214,41 @@ class MovieHandler(BaseHandler):
                     'error': f"Unknown genre: {genre}. Try one of: {', '.join(list(self.genre_mapping.keys())[:5])}..."
                 }
                 
-            url = f"{self.base_url}/discover/movie"
-            params = {
-                'api_key': self.api_key,
-                'language': 'en-US',
-                'with_genres': genre_id,
-                'sort_by': 'popularity.desc',
-                'page': 1
-            }
+            # Answer from the local catalog when it knows enough movies in the genre
+            movies = self._catalog_genre(genre_id)
+            if not movies:
+                params = {
+                    'with_genres': genre_id,
+                    'sort_by': 'popularity.desc',
+                    'page': 1
+                }
+                
+                self.logger.info(f"Fetching {genre} movies from TMDB API with genre_id: {genre_id}")
+                data = await self.tmdb.get('discover/movie', params)
+                self._catalog_add(data.get('results', []))
+                movies = data.get('results', [])[:5]  # Get top 5 movies
             
-            self.logger.info(f"Fetching {genre} movies from TMDB API with URL: {url} and genre_id: {genre_id}")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        movies = data.get('results', [])[:5]  # Get top 5 movies
-                        
-                        if not movies:
-                            self.logger.warning(f"No {genre} movies found")
-                            return {
-                                'success': False,
-                                'error': f"No {genre} movies found"
-                            }
-                        
-                        self.logger.info(f"Successfully fetched {len(movies)} {genre} movies")
-                        return {
-                            'success': True,
-                            'movies': movies,
-                            'count': len(movies),
-                            'category': f"{genre.title()} Movies"
-                        }
-                    else:
-                        error_data = await response.text()
-                        self.logger.error(f"TMDB API error: {response.status} - {error_data}")
-                        return {
-                            'success': False,
-                            'error': f"Movie API error: {response.status} - {error_data}"
-                        }
+            if not movies:
+                self.logger.warning(f"No {genre} movies found")
+                return {
+                    'success': False,
+                    'error': f"No {genre} movies found"
+                }
+            
+            self.logger.info(f"Successfully fetched {len(movies)} {genre} movies")
+            return {
+                'success': True,
+                'movies': movies,
+                'count': len(movies),
+                'category': f"{genre.title()} Movies"
+            }
                         
+        except TMDBError as e:
+            self.logger.error(f"TMDB API error: {e}")
+            return {
+                'success': False,
+                'error': f"Movie API error: {e}"
+            }
         except Exception as e:
             self.logger.error(f"Error getting movies by genre: {str(e)}")
             return {
@@ -310,37 +259,25 @@ class MovieHandler(BaseHandler):
     async def _search_movies(self, query: str) -> Dict[str, Any]:
         """Search for movies by title"""
         try:
-            url = f"{self.base_url}/search/movie"
-            params = {
-                'api_key': self.api_key,
-                'language': 'en-US',
-                'query': query,
-                'page': 1,
-                'include_adult': 'false'
-            }
-            
             self.logger.info(f"Searching for movies with query: {query}")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        movies = data.get('results', [])[:5]  # Get top 5 matches
-                        
-                        self.logger.info(f"Successfully found {len(movies)} movies matching '{query}'")
-                        return {
-                            'success': True,
-                            'movies': movies,
-                            'count': len(movies),
-                            'category': f"Search Results for '{query}'"
-                        }
-                    else:
-                        error_data = await response.text()
-                        self.logger.error(f"TMDB API error: {response.status} - {error_data}")
-                        return {
-                            'success': False,
-                            'error': f"Movie API error: {response.status} - {error_data}"
-                        }
+            data = await self.tmdb.get('search/movie', {'query': query, 'page': 1, 'include_adult': 'false'})
+            self._catalog_add(data.get('results', []))
+            movies = data.get('results', [])[:5]  # Get top 5 matches
+            
+            self.logger.info(f"Successfully found {len(movies)} movies matching '{query}'")
+            return {
+                'success': True,
+                'movies': movies,
+                'count': len(movies),
+                'category': f"Search Results for '{query}'"
+            }
                         
+        except TMDBError as e:
+            self.logger.error(f"TMDB API error: {e}")
+            return {
+                'success': False,
+                'error': f"Movie API error: {e}"
+            }
         except Exception as e:
             self.logger.error(f"Error searching movies: {str(e)}")
             return {
@@ -348,6 +285,44 @@ class MovieHandler(BaseHandler):
                 'error': f"Error searching for movies: {str(e)}"
             }
     
+    def _catalog_add(self, movies: List[Dict[str, Any]]) -> None:
+        """Keep TMDB results in the local catalog for offline title resolution"""
+        try:
+            movie_catalog.add(movies)
+        except Exception as e:
+            self.logger.error(f"Error updating movie catalog: {e}")
+
+    def _catalog_genre(self, genre_id: int, limit: int = 5) -> List[Dict[str, Any]]:
+        try:
+            movies = movie_catalog.by_genre([genre_id], limit=limit)
+        except Exception as e:
+            self.logger.error(f"Error reading movie catalog: {e}")
+            return []
+        return movies if len(movies) >= limit else []
+
+    async def _resolve_movie(self, title: str) -> Optional[Dict[str, Any]]:
+        """The movie a free-text title refers to, from the local catalog when it can say.
+
+        Catalog entries known only from the id export are enriched with one
+        details call; titles the catalog can't match fall back to a search.
+        """
+        try:
+            match = movie_catalog.best_match(title)
+            if match and not match['enriched']:
+                details = await self.tmdb.get(f"movie/{match['id']}")
+                self._catalog_add([details])
+                match = dict(movie_catalog.get(match['id']), score=match['score'])
+            if match:
+                self.logger.info(f"Resolved '{title}' locally as '{match['title']}' ({match['score']})")
+                return match
+        except Exception as e:
+            self.logger.error(f"Error resolving '{title}' from the movie catalog: {e}")
+        
+        search_result = await self._search_movies(title)
+        if not search_result.get('success') or search_result.get('count', 0) == 0:
+            return None
+        return search_result['movies'][0]
+
     async def _get_recommendations(self, intent: Dict[str, Any]) -> Dict[str, Any]:
         """Get movie recommendations based on query or preferences"""
         try:
@@ -356,57 +331,41 @@ class MovieHandler(BaseHandler):
             
             # If we have a query (movie title to base recommendations on)
             if intent.get('query'):
-                # First search for the movie
-                search_result = await self._search_movies(intent['query'])
+                # First find the movie
+                base = await self._resolve_movie(intent['query'])
                 
-                if not search_result.get('success') or search_result.get('count', 0) == 0:
+                if not base:
                     # Fall back to personalized recommendations
                     return await self._get_personalized_recommendations()
                     
-                # Get the first movie's ID
-                movie_id = search_result['movies'][0]['id']
-                
-                # Now get recommendations for this movie
-                url = f"{self.base_url}/movie/{movie_id}/recommendations"
-                params = {
-                    'api_key': self.api_key,
-                    'language': 'en-US',
-                    'page': 1
-                }
+                # Get the movie's ID
+                movie_id = base['id']
                 
+                # Now get recommendations for this movie, reading further pages if most are watched
                 self.logger.info(f"Getting recommendations based on movie ID: {movie_id}")
-                async with aiohttp.ClientSession() as session:
-                    async with session.get(url, params=params) as response:
-                        if response.status == 200:
-                            data = await response.json()
-                            all_movies = data.get('results', [])
-                            
-                            # Filter out already watched movies
-                            if self.airtable_available:
-                                movies = [m for m in all_movies if not self._is_already_watched(m['id'])]
-                            else:
-                                movies = all_movies
-                                
-                            if not movies:
-                                # Fall back to similar movies if no recommendations or all watched
-                                return await self._get_similar_movies(movie_id)
-                                
-                            base_movie = search_result['movies'][0]['title']
-                            self.logger.info(f"Successfully found {len(movies)} recommendations based on '{base_movie}'")
-                            
-                            recommendations = movies[:5]  # Get top 5 recommendations
-                            category = f"Recommendations based on '{base_movie}'"
-                        else:
-                            # Fall back to similar movies if recommendation API fails
-                            return await self._get_similar_movies(movie_id)
+                try:
+                    movies = await self._first_unwatched_from(f"movie/{movie_id}/recommendations")
+                except TMDBError as e:
+                    # Fall back to similar movies if recommendation API fails
+                    self.logger.error(f"TMDB API error: {e}")
+                    return await self._get_similar_movies(movie_id)
+                    
+                if not movies:
+                    # Fall back to similar movies if no recommendations or all watched
+                    return await self._get_similar_movies(movie_id)
+                    
+                base_movie = base['title']
+                self.logger.info(f"Successfully found {len(movies)} recommendations based on '{base_movie}'")
+                
+                recommendations = movies[:5]  # Get top 5 recommendations
+                category = f"Recommendations based on '{base_movie}'"
             else:
                 # Get personalized recommendations
                 return await self._get_personalized_recommendations()
                 
-            # Save these recommendations to Airtable
+            # Save these recommendations to Airtable, off the response path
             if self.airtable_available:
-                for movie in recommendations:
-                    self._save_recommendation(movie)
+                await self._save_recommendations(recommendations)
             
             return {
                 'success': True,
@@ -425,58 +384,15 @@ class MovieHandler(BaseHandler):
     async def _get_personalized_recommendations(self) -> Dict[str, Any]:
         """Get personalized movie recommendations based on user preferences"""
         try:
-            recommendations = []
-            category = "Recommended Movies For You"
-            
-            # First try to get recommendations based on favorite genres
-            if self.airtable_available:
-                favorite_genres = await self._get_favorite_genres()
-                
-                if favorite_genres:
-                    # Use the top genre for recommendations
-                    url = f"{self.base_url}/discover/movie"
-                    params = {
-                        'api_key': self.api_key,
-                        'language': 'en-US',
-                        'sort_by': 'popularity.desc',
-                        'with_genres': ','.join(map(str, favorite_genres)),
-                        'page': 1
-                    }
-                    
-                    self.logger.info(f"Getting personalized recommendations based on favorite genres: {favorite_genres}")
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(url, params=params) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                all_movies = data.get('results', [])
-                                
-                                # Filter out already watched movies
-                                movies = [m for m in all_movies if not self._is_already_watched(m['id'])]
-                                
-                                if movies:
-                                    recommendations = movies[:5]  # Get top 5 matches
-                                    genre_names = [self.genres.get(genre_id, 'Favorite') for genre_id in favorite_genres if genre_id in self.genres]
-                                    category = f"Recommended {', '.join(genre_names[:2])} Movies For You"
-            
-            # If we don't have recommendations yet, try using popular movies
+            # Served from the user's precomputed list when there is one
+            recommendations, category = await self._next_candidates()
             if not recommendations:
-                popular_result = await self._get_popular_movies()
-                if popular_result.get('success'):
-                    all_movies = popular_result.get('movies', [])
-                    
-                    # Filter out already watched movies
-                    if self.airtable_available:
-                        movies = [m for m in all_movies if not self._is_already_watched(m['id'])]
-                    else:
-                        movies = all_movies
-                        
-                    recommendations = movies[:5]
-                    category = "Popular Movies You Haven't Seen"
+                recommendations, category = await self._compute_recommendations()
+            self._refresh_candidates()
             
-            # Save these recommendations to Airtable
+            # Save these recommendations to Airtable, off the response path
             if self.airtable_available:
-                for movie in recommendations:
-                    self._save_recommendation(movie)
+                await self._save_recommendations(recommendations)
             
             return {
                 'success': True,
@@ -489,47 +405,144 @@ class MovieHandler(BaseHandler):
             self.logger.error(f"Error getting personalized recommendations: {str(e)}")
             # Fall back to popular movies
             return await self._get_popular_movies()
+
+    async def _compute_recommendations(self, limit: int = 5,
+                                       user_id: Optional[str] = None) -> Tuple[List[Dict[str, Any]], str]:
+        """Rank unwatched movies for a user: local taste matches, favourite genres, then popular movies.
+
+        user_id defaults to the current request's user; background builds
+        pass it explicitly because the handler may have moved on by then.
+        """
+        user_id = user_id or self.user_id
+        recommendations = await self._local_recommendations(limit)
+        if len(recommendations) >= limit:
+            return recommendations, "Recommended For You From Your Ratings"
+        recommendations = []
+        category = "Recommended Movies For You"
+        
+        # Otherwise get recommendations based on favorite genres from TMDB
+        if self.airtable_available:
+            favorite_genres = await self._get_favorite_genres(user_id)
+            
+            if favorite_genres:
+                params = {
+                    'sort_by': 'popularity.desc',
+                    'with_genres': ','.join(map(str, favorite_genres))
+                }
+                
+                self.logger.info(f"Getting personalized recommendations based on favorite genres: {favorite_genres}")
+                try:
+                    # Unwatched movies only, reading as many pages as that takes
+                    movies = await self._first_unwatched_from('discover/movie', params, limit)
+                except Exception as e:
+                    self.logger.error(f"TMDB API error: {e}")
+                    movies = []
+                
+                if movies:
+                    recommendations = movies
+                    genre_names = [self.genres.get(genre_id, 'Favorite') for genre_id in favorite_genres if genre_id in self.genres]
+                    category = f"Recommended {', '.join(genre_names[:2])} Movies For You"
+        
+        # If we don't have recommendations yet, try using popular movies
+        if not recommendations:
+            try:
+                recommendations = await self._first_unwatched_from('movie/popular', {}, limit)
+            except Exception as e:
+                self.logger.error(f"TMDB API error: {e}")
+            category = "Popular Movies You Haven't Seen"
+        return recommendations, category
+
+    async def _local_recommendations(self, limit: int) -> List[Dict[str, Any]]:
+        """Unwatched catalog movies closest to the user's taste, scored locally"""
+        if not self.airtable_available:
+            return []
+        try:
+            taste = await self._taste_vector()
+            if not taste:
+                return []
+            index = await self._watched_index()
+            return content_recommender.recommend(taste, limit, exclude=index.__contains__)
+        except Exception as e:
+            self.logger.error(f"Error scoring local recommendations: {e}")
+            return []
+
+    async def _taste_vector(self) -> Dict[str, float]:
+        """The user's taste from the stored metadata of rated (rating - 3) and favourite (+3) movies"""
+        rated = []
+        rating_field = (await self._watched_fields())['rating']
+        async for movie in self.watched_table.stream():
+            fields = movie.get('fields', {})
+            stored = genre_ids(fields)
+            try:
+                weight = float(fields.get(rating_field)) - 3
+            except (TypeError, ValueError):
+                continue  # recommended but never rated
+            if stored and weight:
+                rated.append((movie_features(stored, self._year(fields), fields.get('Director')), weight))
+        if self.favorites_table_available:
+            async for movie in self.favorites_table.stream():
+                stored = genre_ids(movie['fields'])
+                if stored:
+                    rated.append((movie_features(stored, self._year(movie['fields']), movie['fields'].get('Director')), 3))
+        return taste_vector(rated)
+
+    def _year(self, fields: Dict[str, Any]) -> Optional[int]:
+        year = str(fields.get('Year') or '')[:4]
+        return int(year) if year.isdigit() else None
+
+    async def _next_candidates(self, count: int = 5) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """The next few movies from the user's precomputed list, skipping any watched since"""
+        if not self.user_id:
+            return [], None
+        try:
+            index = await self._watched_index() if self.airtable_available else None
+            return recommendation_queue.pop(self.user_id, count, skip=index.__contains__ if index else None)
+        except Exception as e:
+            self.logger.error(f"Error reading recommendation candidates: {e}")
+            return [], None
+
+    def _refresh_candidates(self, changed: bool = False) -> Optional[Future]:
+        """Rebuild the user's candidate list in the background when it is due.
+
+        changed marks the list out of date after a rating or favourite;
+        lists are only kept for users who have asked for recommendations.
+        """
+        user_id = self.user_id
+        if not user_id:
+            return None
+        try:
+            if changed:
+                if not recommendation_queue.has_list(user_id):
+                    return None
+                recommendation_queue.invalidate(user_id)
+            if recommendation_queue.due(user_id):
+                return recommendation_queue.refresh(user_id, lambda: self._compute_recommendations(QUEUE_SIZE, user_id))
+        except Exception as e:
+            self.logger.error(f"Error scheduling recommendation refresh: {e}")
+        return None
     
     async def _get_similar_movies(self, movie_id: int) -> Dict[str, Any]:
         """Get similar movies to a given movie ID"""
         try:
-            url = f"{self.base_url}/movie/{movie_id}/similar"
-            params = {
-                'api_key': self.api_key,
-                'language': 'en-US',
-                'page': 1
-            }
-            
             self.logger.info(f"Getting similar movies to ID: {movie_id}")
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        movies = data.get('results', [])[:5]  # Get top 5 similar movies
-                        
-                        # Get the original movie's title for context
-                        movie_url = f"{self.base_url}/movie/{movie_id}"
-                        movie_params = {
-                            'api_key': self.api_key,
-                            'language': 'en-US'
-                        }
-                        
-                        async with session.get(movie_url, params=movie_params) as movie_response:
-                            original_movie = None
-                            if movie_response.status == 200:
-                                movie_data = await movie_response.json()
-                                original_movie = movie_data.get('title')
-                        
-                        self.logger.info(f"Successfully found {len(movies)} similar movies")
-                        return {
-                            'success': True,
-                            'movies': movies,
-                            'count': len(movies),
-                            'category': f"Movies similar to '{original_movie}'" if original_movie else "Similar Movies"
-                        }
-                    else:
-                        # Fall back to popular if similar API fails
-                        return await self._get_popular_movies()
+            try:
+                movies = await self._first_unwatched_from(f"movie/{movie_id}/similar")
+            except TMDBError as e:
+                # Fall back to popular if similar API fails
+                self.logger.error(f"TMDB API error: {e}")
+                return await self._get_popular_movies()
+            
+            # Get the original movie's title for context
+            movie_data = await self._get_movie_details(movie_id)
+            original_movie = movie_data.get('title') if movie_data else None
+            
+            self.logger.info(f"Successfully found {len(movies)} similar movies")
+            return {
+                'success': True,
+                'movies': movies,
+                'count': len(movies),
+                'category': f"Movies similar to '{original_movie}'" if original_movie else "Similar Movies"
+            }
                         
         except Exception as e:
             self.logger.error(f"Error getting similar movies: {str(e)}")
@@ -597,22 +610,19 @@ class MovieHandler(BaseHandler):
                     'error': 'Please specify a movie title to add to favorites'
                 }
                 
-            # Search for the movie in TMDB
-            search_result = await self._search_movies(movie_title)
-            if not search_result.get('success') or search_result.get('count', 0) == 0:
+            # Find the movie, locally if the catalog knows it
+            movie = await self._resolve_movie(movie_title)
+            if not movie:
                 return {
                     'success': False,
                     'error': f"Could not find movie '{movie_title}' in the database"
                 }
-                
-            # Get the first matching movie
-            movie = search_result['movies'][0]
             movie_id = str(movie['id'])
             
             # Check if movie already exists in favorites
             try:
                 if self.favorites_table_available:
-                    existing = self.favorites_table.all(formula=f"{{TMDB_ID}} = '{movie_id}'")
+                    existing = await self.favorites_table.select(where={'TMDB_ID': movie_id})
                     if existing:
                         return {
                             'success': True,
@@ -635,13 +645,13 @@ class MovieHandler(BaseHandler):
                 'Title': movie['title'],
                 'Genres': genre_text
             }
-            
-            if director:
-                new_favorite['Director'] = director
+            new_favorite.update(await writable(self.favorites_table, metadata_fields(movie, director)))
                 
             try:
                 if self.favorites_table_available:
-                    self.favorites_table.create(new_favorite)
+                    await self.favorites_table.create(new_favorite)
+                    self._record_genres(movie, 2)
+                    self._refresh_candidates(changed=True)
                     self.logger.info(f"Added movie to favorites: {movie['title']}")
                     
                     return {
@@ -683,29 +693,33 @@ class MovieHandler(BaseHandler):
                     'error': 'Please specify a movie title and rating'
                 }
                 
-            # Search for the movie in TMDB
-            search_result = await self._search_movies(movie_title)
-            if not search_result.get('success') or search_result.get('count', 0) == 0:
+            # Find the movie, locally if the catalog knows it
+            movie = await self._resolve_movie(movie_title)
+            if not movie:
                 return {
                     'success': False,
                     'error': f"Could not find movie '{movie_title}' in the database"
                 }
-                
-            # Get the first matching movie
-            movie = search_result['movies'][0]
             movie_id = str(movie['id'])
             
-            # Prepare record to add to watched table
+            # Prepare record to add to watched table, using the field names this base has
             current_date = datetime.now().strftime('%Y-%m-%d')
+            fields = await self._watched_fields()
             new_watched = {
-                'Title': movie['title'],
-                'Date Watched': current_date,
-                'User Rating': rating
+                fields['title']: movie['title'],
+                fields['watched']: current_date,
+                fields['rating']: rating
             }
+            # Store the TMDB details so preferences never need to look them up again
+            director = await self._get_movie_director(movie['id'])
+            new_watched.update(await writable(self.watched_table, metadata_fields(movie, director)))
             
-            # Try to add the movie to watched table
             try:
-                self.watched_table.create(new_watched)
+                await self.watched_table.create(new_watched)
+                (await self._watched_index()).add(movie['title'], movie['id'])
+                if float(rating) >= 4:
+                    self._record_genres(movie, 1)
+                self._refresh_candidates(changed=True)
                 self.logger.info(f"Added movie to watched list with rating: {movie['title']} - {rating}")
                 
                 return {
@@ -714,30 +728,6 @@ class MovieHandler(BaseHandler):
                 }
             except Exception as e:
                 self.logger.error(f"Error rating movie: {e}")
-                
-                # If we get a field name error, try different field names
-                if "Unknown field name" in str(e):
-                    try:
-                        # Try with alternative field names
-                        alt_watched = {
-                            'Name': movie['title'],
-                            'Date': current_date,
-                            'Rating': rating
-                        }
-                        self.watched_table.create(alt_watched)
-                        self.logger.info(f"Added movie to watched list with alternative field names: {movie['title']} - {rating}")
-                        
-                        return {
-                            'success': True,
-                            'message': f"Rated '{movie['title']}' as {rating}/5"
-                        }
-                    except Exception as e2:
-                        self.logger.error(f"Error rating movie with alternative field names: {e2}")
-                        return {
-                            'success': False,
-                            'error': f"Error rating movie: {str(e2)}"
-                        }
-                
                 return {
                     'success': False,
                     'error': f"Error rating movie: {str(e)}"
@@ -753,248 +743,237 @@ class MovieHandler(BaseHandler):
     async def _get_movie_director(self, movie_id: int) -> Optional[str]:
         """Get the director for a movie"""
         try:
-            url = f"{self.base_url}/movie/{movie_id}/credits"
-            params = {
-                'api_key': self.api_key,
-                'language': 'en-US'
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        crew = data.get('crew', [])
-                        directors = [member['name'] for member in crew if member.get('job') == 'Director']
-                        if directors:
-                            return ', '.join(directors)
+            data = await self.tmdb.get(f"movie/{movie_id}/credits")
+            crew = data.get('crew', [])
+            directors = [member['name'] for member in crew if member.get('job') == 'Director']
+            if directors:
+                return ', '.join(directors)
             return None
         except Exception as e:
             self.logger.error(f"Error getting movie director: {e}")
             return None
     
-    def _is_already_watched(self, movie_id: int) -> bool:
-        """Check if a movie has already been watched or recommended"""
-        if not self.airtable_available or not self.watched_table_available:
-            return False
-            
+    async def _watched_fields(self) -> Dict[str, str]:
+        """Field names for the watched table; older bases use Name/Date/Rating"""
+        available = await self.watched_table.field_names()
+        if 'Name' in available and 'Title' not in available:
+            return {'title': 'Name', 'watched': 'Date', 'recommended': 'Date', 'rating': 'Rating'}
+        return {
+            'title': 'Title',
+            'watched': 'Date Watched',
+            'recommended': 'Date Recommended',
+            'rating': 'Rating' if 'Rating' in available and 'User Rating' not in available else 'User Rating'
+        }
+
+    async def _first_unwatched_from(self, path: str, params: Optional[Dict[str, Any]] = None,
+                                    limit: int = 5) -> List[Dict[str, Any]]:
+        """The first few unwatched movies from a paged TMDB list, fetching only the pages needed.
+
+        Pages after the first are prefetched while this one is filtered, and
+        every page read is kept in the local catalog.
+        """
+        index = None
+        if self.airtable_available and self.watched_table_available:
+            try:
+                index = await self._watched_index()
+            except Exception as e:
+                self.logger.error(f"Error loading watched movies: {e}")
+        movies = []
+        source = self.tmdb.stream(path, params, on_page=self._catalog_add)
         try:
-            # Since we don't have TMDB_ID field, we need to check by title
-            # For each movie we find, we'll need to compare its title
-            # This is less accurate but works with the current table structure
-            watched = self.watched_table.all()
-            
-            # Get the movie details to compare titles
-            movie_details = self._get_movie_details_sync(movie_id)
-            if not movie_details or 'title' not in movie_details:
-                return False
-                
-            title = movie_details['title'].lower()
-            
-            # Check if any movie in watched list has a matching title
-            for record in watched:
-                fields = record.get('fields', {})
-                watched_title = fields.get('Title', fields.get('Name', '')).lower()
-                if watched_title == title:
-                    return True
-                    
-            return False
-        except Exception as e:
-            self.logger.error(f"Error checking watched movies: {e}")
-            return False
+            async for movie in source:
+                if index is None or movie not in index:
+                    movies.append(movie)
+                    if len(movies) >= limit:
+                        break
+        finally:
+            await source.aclose()
+        return movies
+            
+    async def _save_recommendations(self, movies: List[Dict[str, Any]]) -> Optional[Future]:
+        """Record recommended movies in the watched table without waiting for the write.
+
+        Movies already in the watched index, or being saved to it, are
+        skipped. The rest are written in the background through the table's
+        write-behind buffer, which creates them in batches of up to 10, and
+        join the index once their rows are safely spooled.
+        """
+        if not self.airtable_available or not self.watched_table_available:
+            return None
             
-    def _get_movie_details_sync(self, movie_id: int) -> Optional[Dict[str, Any]]:
-        """Get movie details synchronously - simplified version for checking watched status"""
         try:
-            import requests
-            url = f"{self.base_url}/movie/{movie_id}"
-            params = {
-                'api_key': self.api_key,
-                'language': 'en-US'
-            }
-            
-            response = requests.get(url, params=params)
-            if response.status_code == 200:
-                return response.json()
-            return None
+            index = await self._watched_index()
+            new = []
+            for movie in movies:
+                if movie not in index:
+                    index.saving.add(movie['id'])
+                    new.append(movie)
+            if not new:
+                return None
+            future = io_loop.submit(self._write_recommendations(new, index))
+            future.add_done_callback(lambda f: f.exception() and self.logger.error(
+                f"Error saving recommendations: {f.exception()}"))
+            return future
         except Exception as e:
-            self.logger.error(f"Error getting movie details synchronously: {e}")
+            self.logger.error(f"Error saving recommendations: {e}")
             return None
-            
-    def _save_recommendation(self, movie: Dict[str, Any]) -> None:
-        """Save a movie that was recommended to the user"""
-        if not self.airtable_available or not self.watched_table_available:
-            return
-            
+
+    async def _write_recommendations(self, movies: List[Dict[str, Any]], index: WatchedIndex) -> None:
+        """Queue watched-table rows, with TMDB details, for recommended movies.
+
+        Runs on the I/O loop; the spool writes (each fsynced) go to a worker
+        thread so they don't hold up other requests' network calls.
+        """
         try:
-            # Check if movie already exists
-            if self._is_already_watched(movie['id']):
-                return
-                
-            # Add to watched table with recommended date
             current_date = datetime.now().strftime('%Y-%m-%d')
-            
+            fields = await self._watched_fields()
+            # Directors come from the catalog when it knows them, otherwise from cached credits
+            missing = [movie for movie in movies if not movie.get('director')]
             try:
-                self.watched_table.create({
-                    'Title': movie['title'],
-                    'Date Recommended': current_date
-                })
+                credits = await self.tmdb.get_all([(f"movie/{movie['id']}/credits", {}) for movie in missing])
+                director_of = {movie['id']: directors(c) for movie, c in zip(missing, credits)}
             except Exception as e:
-                if "Unknown field name" in str(e):
-                    # Try alternative field names
-                    self.watched_table.create({
-                        'Name': movie['title'],
-                        'Date': current_date
-                    })
-                else:
-                    raise e
-                    
-            self.logger.info(f"Saved recommendation: {movie['title']}")
-        except Exception as e:
-            self.logger.error(f"Error saving recommendation: {e}")
-            
-    async def _get_favorite_genres(self) -> List[int]:
-        """Extract favorite genres from saved movies"""
+                self.logger.error(f"Error getting movie directors: {e}")
+                director_of = {}
+            rows = []
+            for movie in movies:
+                director = movie.get('director') or director_of.get(movie['id'])
+                rows.append({
+                    fields['title']: movie['title'],
+                    fields['recommended']: current_date,
+                    **await writable(self.watched_table, metadata_fields(movie, director))
+                })
+            await asyncio.to_thread(self._append_recommendations, rows, movies, index)
+            self.logger.info(f"Saved {len(movies)} recommendations: {', '.join(m['title'] for m in movies)}")
+        finally:
+            for movie in movies:
+                index.saving.discard(movie['id'])
+
+    def _append_recommendations(self, rows: List[Dict[str, Any]], movies: List[Dict[str, Any]],
+                                index: WatchedIndex) -> None:
+        for row, movie in zip(rows, movies):
+            self.watched_table.append(row)
+            index.add(movie['title'], movie['id'])
+            
+    async def _get_favorite_genres(self, user_id: Optional[str] = None) -> List[int]:
+        """Top genres from the user's genre histogram, (re)built from saved movies when due"""
         if not self.airtable_available:
             return []
+        user_id = user_id or self.user_id
             
         try:
-            genre_counts = {}
+            profile = profile_store.get(user_id) if user_id else None
+            if profile and profile_store.genre_counts_current(profile):
+                # Kept current by ratings and favourites as they arrive
+                return profile_store.top_genres(profile)
             
-            # Process favorites if available
-            if self.favorites_table_available:
-                try:
-                    favorites = self.favorites_table.all()
-                    
-                    # Process favorites
-                    for movie in favorites:
-                        genres = movie['fields'].get('Genres', '').split(',')
-                        for genre in genres:
-                            genre = genre.strip()
-                            if genre:
-                                # Convert genre name to ID
-                                for genre_name, genre_id in self.genre_mapping.items():
-                                    if genre.lower() == genre_name:
-                                        genre_counts[genre_id] = genre_counts.get(genre_id, 0) + 2  # More weight for favorites
-                except Exception as e:
-                    self.logger.error(f"Error getting favorite genres from favorites table: {e}")
-            
-            # Get details for highly rated movies (4+)
-            try:
-                # Try to determine which rating field to use
-                # First, check if we can get a sample record to see field names
-                try:
-                    sample_records = self.watched_table.all(max_records=1)
-                    if sample_records:
-                        fields = sample_records[0].get('fields', {})
-                        
-                        # Check which rating field exists
-                        rating_field = None
-                        if 'User Rating' in fields:
-                            rating_field = 'User Rating'
-                        elif 'Rating' in fields:
-                            rating_field = 'Rating'
-                        
-                        if rating_field:
-                            # Use the appropriate field in the formula
-                            formula = f"{{{rating_field}}} >= 4"
-                            watched = self.watched_table.all(formula=formula)
-                            
-                            # Get details for watched movies to extract genres
-                            for movie in watched:
-                                fields = movie.get('fields', {})
-                                title = fields.get('Title', fields.get('Name', ''))
-                                
-                                if title:
-                                    # Search for the movie in TMDB to get genre information
-                                    search_url = f"{self.base_url}/search/movie"
-                                    params = {
-                                        'api_key': self.api_key,
-                                        'language': 'en-US',
-                                        'query': title,
-                                        'page': 1,
-                                        'include_adult': 'false'
-                                    }
-                                    
-                                    async with aiohttp.ClientSession() as session:
-                                        async with session.get(search_url, params=params) as response:
-                                            if response.status == 200:
-                                                data = await response.json()
-                                                results = data.get('results', [])
-                                                
-                                                if results:
-                                                    # Use the first matching movie's genre information
-                                                    movie_genres = results[0].get('genre_ids', [])
-                                                    for genre_id in movie_genres:
-                                                        if genre_id in self.genres:  # Make sure it's a valid genre
-                                                            genre_counts[genre_id] = genre_counts.get(genre_id, 0) + 1
-                    else:
-                        self.logger.warning("No sample records found to determine rating field")
-                        await self._get_genre_counts_from_all_watched(genre_counts)
-                except Exception as e:
-                    self.logger.error(f"Error determining rating field: {e}")
-                    # If we can't determine fields, try with some defaults
-                    await self._get_genre_counts_from_all_watched(genre_counts)
-            except Exception as e:
-                self.logger.error(f"Error getting favorite genres from watched table: {e}")
-                # Try to get genre counts from all watched movies if formula doesn't work
-                await self._get_genre_counts_from_all_watched(genre_counts)
+            built_at = datetime.now().isoformat()
+            genre_counts = await self._build_genre_counts()
             
             # Sort by count and return top genre IDs
             sorted_genres = sorted(genre_counts.items(), key=lambda x: x[1], reverse=True)
-            return [genre_id for genre_id, count in sorted_genres[:3]]
+            top_genres = [genre_id for genre_id, count in sorted_genres[:3]]
+            if user_id:
+                profile_store.update(user_id, {
+                    'genre_counts': {str(g): count for g, count in genre_counts.items()},
+                    'genre_counts_built_at': built_at,
+                    'favourite_genres': [self.genres[g] for g in top_genres]
+                })
+            return top_genres
         except Exception as e:
             self.logger.error(f"Error getting favorite genres: {e}")
             return []
-            
-    async def _get_genre_counts_from_all_watched(self, genre_counts: Dict[int, int]) -> None:
-        """Get genre counts from all watched movies as a fallback"""
+
+    async def _build_genre_counts(self) -> Dict[int, int]:
+        """Count genres across favourites (weight 2) and highly rated movies (weight 1).
+
+        Uses the genre ids stored with each movie; only records saved before
+        those were stored (see backfill_movie_metadata.py) need a TMDB search.
+        """
+        genre_counts = {}
+        
+        # Process favorites if available
+        if self.favorites_table_available:
+            try:
+                # Stream favorites, folding each into the counts
+                async for movie in self.favorites_table.stream():
+                    stored = genre_ids(movie['fields'])
+                    if stored is None:
+                        # Convert genre names to IDs
+                        names = [g.strip().lower() for g in movie['fields'].get('Genres', '').split(',')]
+                        stored = [self.genre_mapping[name] for name in names if name in self.genre_mapping]
+                    for genre_id in stored:
+                        if genre_id in self.genres:
+                            genre_counts[genre_id] = genre_counts.get(genre_id, 0) + 2  # More weight for favorites
+            except Exception as e:
+                self.logger.error(f"Error getting favorite genres from favorites table: {e}")
+        
+        # Highly rated movies (4+), or every watched movie if this base has no rating field
+        where = None
         try:
-            watched = self.watched_table.all()
-            
-            for movie in watched:
+            available = await self.watched_table.field_names()
+            rating_field = next((f for f in ('User Rating', 'Rating') if f in available), None)
+            if rating_field:
+                where = {rating_field: ('>=', 4)}
+            else:
+                self.logger.warning("No rating field found in watched table")
+        except Exception as e:
+            self.logger.error(f"Error determining rating field: {e}")
+        
+        try:
+            unenriched = []
+            async for movie in self.watched_table.stream(where=where):
                 fields = movie.get('fields', {})
-                title = fields.get('Title', fields.get('Name', ''))
-                
-                if title:
-                    # Search for the movie in TMDB to get genre information
-                    search_url = f"{self.base_url}/search/movie"
-                    params = {
-                        'api_key': self.api_key,
-                        'language': 'en-US',
-                        'query': title,
-                        'page': 1,
-                        'include_adult': 'false'
-                    }
-                    
-                    async with aiohttp.ClientSession() as session:
-                        async with session.get(search_url, params=params) as response:
-                            if response.status == 200:
-                                data = await response.json()
-                                results = data.get('results', [])
-                                
-                                if results:
-                                    # Use the first matching movie's genre information
-                                    movie_genres = results[0].get('genre_ids', [])
-                                    for genre_id in movie_genres:
-                                        if genre_id in self.genres:  # Make sure it's a valid genre
-                                            genre_counts[genre_id] = genre_counts.get(genre_id, 0) + 1
+                stored = genre_ids(fields)
+                if stored is None:
+                    unenriched.append(fields.get('Title', fields.get('Name', '')))
+                    continue
+                for genre_id in stored:
+                    if genre_id in self.genres:
+                        genre_counts[genre_id] = genre_counts.get(genre_id, 0) + 1
+            await self._count_title_genres(unenriched, genre_counts)
         except Exception as e:
-            self.logger.error(f"Error getting genre counts from all watched movies: {e}")
-            
+            self.logger.error(f"Error getting favorite genres from watched table: {e}")
+        return genre_counts
+
+    def _record_genres(self, movie: Dict[str, Any], weight: int) -> None:
+        """Fold a newly rated or favourited movie into the user's genre histogram"""
+        if not self.user_id:
+            return
+        try:
+            profile = profile_store.record_genres(self.user_id, movie.get('genre_ids', []), weight)
+            if profile_store.genre_counts_current(profile):
+                top_genres = [g for g in profile_store.top_genres(profile) if g in self.genres]
+                profile_store.update(self.user_id, {'favourite_genres': [self.genres[g] for g in top_genres]})
+        except Exception as e:
+            self.logger.error(f"Error updating genre histogram: {e}")
+
+    async def _count_title_genres(self, titles: List[str], genre_counts: Dict[int, int]) -> None:
+        """Add one count per title for each genre of its best TMDB match.
+
+        Each distinct title is searched once, by its normalised form so the
+        cached response is shared by every spelling, with the searches fanned
+        out under the TMDB client's concurrency limit.
+        """
+        titles = [title for title in titles if title]
+        if not titles:
+            return
+        queries = sorted({normalise_title(title) for title in titles})
+        results = await self.tmdb.get_many('search/movie', [
+            {'query': query, 'page': 1, 'include_adult': 'false'} for query in queries])
+        genres_by_title = {}
+        for key, data in zip(queries, results):
+            matches = (data or {}).get('results', [])
+            # Use the first matching movie's genre information
+            genres_by_title[key] = [g for g in matches[0].get('genre_ids', []) if g in self.genres] if matches else []
+        for title in titles:
+            for genre_id in genres_by_title[normalise_title(title)]:
+                genre_counts[genre_id] = genre_counts.get(genre_id, 0) + 1
+
     async def _get_movie_details(self, movie_id: int) -> Optional[Dict[str, Any]]:
         """Get detailed information about a movie"""
         try:
-            url = f"{self.base_url}/movie/{movie_id}"
-            params = {
-                'api_key': self.api_key,
-                'language': 'en-US'
-            }
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.get(url, params=params) as response:
-                    if response.status == 200:
-                        return await response.json()
-            return None
+            return await self.tmdb.get(f"movie/{movie_id}")
         except Exception as e:
             self.logger.error(f"Error getting movie details: {e}")
             return None
@@ -1,8 +1,19 @@
 import os
 import re
+import time
 import datetime
 from typing import Dict, Any, List, Optional
 from services.base_handler import BaseHandler
+from services.storage import get_storage
+from services.user_profile import profile_store
+
+# Fields the handler reads; the replica only downloads these
+SHIFT_FIELDS = ['ID', 'Date', 'Start Time', 'End Time', 'Status', 'Notes']
+
+ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+
+# When each shifts table (by name) was last seen holding only ISO dates
+_iso_checked: Dict[str, float] = {}
 
 class ShiftHandler(BaseHandler):
     def __init__(self):
@@ -10,21 +21,19 @@ class ShiftHandler(BaseHandler):
         self.airtable_api_key = os.getenv('AIRTABLE_API_KEY')
         self.airtable_base_id = os.getenv('AIRTABLE_BASE_ID')
         self.airtable_table_name = os.getenv('AIRTABLE_SHIFTS_TABLE', 'Shifts')
+        self.user_id = None
         
-        # Import here to avoid importing if the handler is not used
         try:
-            from pyairtable import Table
-            self.airtable_client = Table(self.airtable_api_key, self.airtable_base_id, self.airtable_table_name)
+            # Shifts come from the configured storage backend (Airtable via the local replica by default)
+            self.airtable_client = get_storage().table('shifts', self.airtable_table_name, indexed=['Date'], fields=SHIFT_FIELDS)
             self.airtable_available = True
             self.logger.info("Shift handler initialized with Airtable configuration")
-        except ImportError:
-            self.logger.warning("pyairtable not installed, Airtable integration disabled")
-            self.airtable_available = False
         except Exception as e:
             self.logger.error(f"Error initializing Airtable client: {e}")
             self.airtable_available = False
 
     async def handle(self, message: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        self.user_id = params.get('user_id')
         try:
             # Parse the shift query intent
             intent = self._parse_shift_intent(message.lower())
@@ -166,100 +175,30 @@ class ShiftHandler(BaseHandler):
     async def _handle_list_shifts(self, intent: Dict[str, Any]) -> Dict[str, Any]:
         """Handle listing shifts based on intent"""
         try:
-            if self.airtable_available:
-                # Get all shifts from Airtable
-                all_shifts = self.airtable_client.all()
-                
-                # Get available fields in Airtable
-                available_fields = self._get_airtable_fields()
-                self.logger.info(f"Available Airtable fields for listing: {available_fields}")
-                
-                # Convert Airtable records to our format
-                shifts = []
-                for record in all_shifts:
-                    try:
-                        shift = {
-                            'id': record['id'],
-                            'date': record['fields'].get('Date', ''),
-                            'start_time': record['fields'].get('Start Time', ''),
-                            'end_time': record['fields'].get('End Time', '')
-                        }
-                        
-                        # Add optional fields if they exist in Airtable
-                        if 'Status' in available_fields:
-                            shift['status'] = record['fields'].get('Status', 'working')
-                        if 'Notes' in available_fields:
-                            shift['notes'] = record['fields'].get('Notes', '')
-                        
-                        # Only add shifts with valid dates
-                        if shift['date']:
-                            shifts.append(shift)
-                    except Exception as e:
-                        self.logger.warning(f"Error processing shift record: {e}")
-                        continue
-            else:
-                # Use simulated data for testing
-                shifts = self._get_simulated_shifts()
-            
-            # Parse date strings to datetime objects for comparison
-            valid_shifts = []
-            for shift in shifts:
-                try:
-                    # Convert to datetime.date
-                    if '/' in shift['date']:
-                        day, month, year = map(int, shift['date'].split('/'))
-                        shift['date_obj'] = datetime.date(year, month, day)
-                    elif '-' in shift['date']:
-                        # Handle ISO format YYYY-MM-DD
-                        shift['date_obj'] = datetime.datetime.strptime(shift['date'], '%Y-%m-%d').date()
-                    else:
-                        # Skip shifts with invalid date format
-                        self.logger.warning(f"Skipping shift with invalid date format: {shift['date']}")
-                        continue
-                        
-                    valid_shifts.append(shift)
-                except (ValueError, TypeError) as e:
-                    self.logger.warning(f"Error parsing date {shift['date']}: {e}")
-                    continue  # Skip shifts with invalid dates
-            
-            # Use the valid shifts for filtering
-            shifts = valid_shifts
-            
+            today = datetime.date.today()
             if intent['date'] == 'week':
-                # Filter shifts for this week
-                today = datetime.date.today()
-                start_of_week = today - datetime.timedelta(days=today.weekday())
-                end_of_week = start_of_week + datetime.timedelta(days=6)
-                filtered_shifts = [
-                    shift for shift in shifts 
-                    if start_of_week <= shift['date_obj'] <= end_of_week
-                ]
+                # Shifts for this week
+                start = today - datetime.timedelta(days=today.weekday())
+                matches = lambda d: start <= d <= start + datetime.timedelta(days=6)
             elif intent['date'] == 'next_week':
-                # Filter shifts for next week
-                today = datetime.date.today()
-                start_of_week = today - datetime.timedelta(days=today.weekday())
-                start_of_next_week = start_of_week + datetime.timedelta(days=7)
-                end_of_next_week = start_of_next_week + datetime.timedelta(days=6)
-                filtered_shifts = [
-                    shift for shift in shifts 
-                    if start_of_next_week <= shift['date_obj'] <= end_of_next_week
-                ]
+                # Shifts for next week
+                start = today - datetime.timedelta(days=today.weekday()) + datetime.timedelta(days=7)
+                matches = lambda d: start <= d <= start + datetime.timedelta(days=6)
             elif intent['date'] == 'month':
-                # Filter shifts for this month
-                today = datetime.date.today()
-                filtered_shifts = [
-                    shift for shift in shifts 
-                    if shift['date_obj'].month == today.month and shift['date_obj'].year == today.year
-                ]
+                # Shifts for this month
+                matches = lambda d: d.month == today.month and d.year == today.year
             elif isinstance(intent['date'], datetime.date):
-                # Filter shifts for a specific date
-                filtered_shifts = [
-                    shift for shift in shifts 
-                    if shift['date_obj'] == intent['date']
-                ]
+                # Shifts for a specific date
+                matches = lambda d: d == intent['date']
             else:
-                # Return all shifts
-                filtered_shifts = shifts
+                # All shifts
+                matches = lambda d: True
+            
+            # Keep only the matching shifts while streaming through the table
+            filtered_shifts = []
+            async for shift in self._stream_shifts():
+                if matches(shift['date_obj']):
+                    filtered_shifts.append(shift)
                 
             # Sort shifts by date
             filtered_shifts.sort(key=lambda x: x['date_obj'])
@@ -279,97 +218,34 @@ class ShiftHandler(BaseHandler):
     async def _handle_next_shift(self) -> Dict[str, Any]:
         """Get the next upcoming shift"""
         try:
-            if self.airtable_available:
-                # Get all shifts from Airtable
-                all_shifts = self.airtable_client.all()
-                
-                # Get available fields in Airtable
-                available_fields = self._get_airtable_fields()
-                self.logger.info(f"Available Airtable fields for next shift: {available_fields}")
-                
-                # Convert Airtable records to our format
-                shifts = []
-                for record in all_shifts:
-                    try:
-                        shift = {
-                            'id': record['id'],
-                            'date': record['fields'].get('Date', ''),
-                            'start_time': record['fields'].get('Start Time', ''),
-                            'end_time': record['fields'].get('End Time', '')
-                        }
-                        
-                        # Add optional fields if they exist in Airtable
-                        if 'Status' in available_fields:
-                            shift['status'] = record['fields'].get('Status', 'working')
-                        if 'Notes' in available_fields:
-                            shift['notes'] = record['fields'].get('Notes', '')
-                        
-                        # Only add shifts with valid dates
-                        if shift['date']:
-                            shifts.append(shift)
-                    except Exception as e:
-                        self.logger.warning(f"Error processing shift record: {e}")
-                        continue
-            else:
-                # Use simulated data for testing
-                shifts = self._get_simulated_shifts()
-            
             today = datetime.date.today()
             now = datetime.datetime.now().time()
             
-            # Parse date strings and filter upcoming shifts
-            upcoming_shifts = []
-            for shift in shifts:
-                try:
-                    # Convert to datetime.date
-                    if '/' in shift['date']:
-                        day, month, year = map(int, shift['date'].split('/'))
-                        shift_date = datetime.date(year, month, day)
-                    elif '-' in shift['date']:
-                        # Handle ISO format YYYY-MM-DD
-                        shift_date = datetime.datetime.strptime(shift['date'], '%Y-%m-%d').date()
-                    else:
-                        # Skip shifts with invalid date format
-                        continue
-                        
-                    # Skip shifts that have already passed
-                    if shift_date < today:
-                        continue
-                        
-                    # For today's shifts, check if the time has passed
-                    if shift_date == today and 'status' not in shift:
-                        try:
-                            shift_time = shift['start_time']
-                            hour, minute = map(int, shift_time.split(':'))
-                            shift_start = datetime.time(hour, minute)
-                            
-                            # Skip if the shift has already started
-                            if shift_start < now:
-                                continue
-                        except (ValueError, IndexError):
-                            # If we can't parse the time, include the shift anyway
-                            pass
-                    
-                    # Add date object for sorting
-                    shift['date_obj'] = shift_date
-                    upcoming_shifts.append(shift)
-                except (ValueError, TypeError) as e:
-                    self.logger.warning(f"Error parsing date/time for shift: {e}")
+            # Shifts arrive in date order, so the scan stops at the first date
+            # after the earliest upcoming shift; with ISO dates in storage the
+            # rest of the table isn't read at all
+            next_shift = None
+            async for shift in self._stream_shifts(since=today):
+                if next_shift and shift['date_obj'] > next_shift['date_obj']:
+                    break
+                if not self._is_upcoming(shift, today, now):
                     continue
+                if next_shift is None or shift['start_time'] < next_shift['start_time']:
+                    next_shift = shift
             
-            if not upcoming_shifts:
+            if not next_shift:
+                self._remember_next_shift(None)
                 return {
                     'success': True,
                     'message': "You don't have any upcoming shifts scheduled."
                 }
                 
-            # Sort by date
-            upcoming_shifts.sort(key=lambda x: (x['date_obj'], x['start_time']))
+            self._remember_next_shift(next_shift)
             
             # Return the next shift
             return {
                 'success': True,
-                'shift': upcoming_shifts[0],
+                'shift': next_shift,
                 'count': 1
             }
         except Exception as e:
@@ -378,6 +254,108 @@ class ShiftHandler(BaseHandler):
                 'success': False,
                 'error': f"Error getting next shift: {str(e)}"
             }
+    
+    async def _stream_shifts(self, since: Optional[datetime.date] = None):
+        """Yield shifts with a parsed 'date_obj', in date order, optionally from a date on.
+
+        Ordering and the date filter only run in storage while every stored
+        date is YYYY-MM-DD, where text order is calendar order. Otherwise
+        (say DD/MM/YYYY rows typed into Airtable) every shift is parsed,
+        filtered and sorted here; that pass also rechecks the formats, at
+        most SHIFT_DATE_CHECK_TTL seconds after the last one.
+        """
+        if not self.airtable_available:
+            # Use simulated data for testing
+            shifts = [self._with_date(shift) for shift in self._get_simulated_shifts()]
+            for shift in sorted((s for s in shifts if s), key=lambda x: x['date_obj']):
+                if since is None or shift['date_obj'] >= since:
+                    yield shift
+            return
+        
+        # Get available fields in Airtable
+        available_fields = await self._get_airtable_fields()
+        self.logger.info(f"Available Airtable fields for reading shifts: {available_fields}")
+        
+        checked_at = _iso_checked.get(self.airtable_table_name)
+        if checked_at is not None and time.monotonic() - checked_at < float(os.getenv('SHIFT_DATE_CHECK_TTL', '300')):
+            where = {'Date': ('>=', since.isoformat())} if since else None
+            async for record in self.airtable_client.stream(where=where, order_by='Date'):
+                shift = self._shift_from_record(record, available_fields)
+                if shift and (since is None or shift['date_obj'] >= since):
+                    yield shift
+            return
+
+        shifts = []
+        all_iso = True
+        async for record in self.airtable_client.stream():
+            all_iso = all_iso and bool(ISO_DATE.match(str(record['fields'].get('Date', ''))))
+            shift = self._shift_from_record(record, available_fields)
+            if shift and (since is None or shift['date_obj'] >= since):
+                shifts.append(shift)
+        if all_iso:
+            _iso_checked[self.airtable_table_name] = time.monotonic()
+        else:
+            _iso_checked.pop(self.airtable_table_name, None)
+        for shift in sorted(shifts, key=lambda x: x['date_obj']):
+            yield shift
+
+    def _shift_from_record(self, record: Dict[str, Any], available_fields: List[str]) -> Optional[Dict[str, Any]]:
+        """Build a shift from a stored record, or None if its date can't be parsed"""
+        try:
+            shift = {
+                'id': record['id'],
+                'date': record['fields'].get('Date', ''),
+                'start_time': record['fields'].get('Start Time', ''),
+                'end_time': record['fields'].get('End Time', '')
+            }
+            
+            # Add optional fields if they exist in Airtable
+            if 'Status' in available_fields:
+                shift['status'] = record['fields'].get('Status', 'working')
+            if 'Notes' in available_fields:
+                shift['notes'] = record['fields'].get('Notes', '')
+        except Exception as e:
+            self.logger.warning(f"Error processing shift record: {e}")
+            return None
+        
+        # Only keep shifts with valid dates
+        return self._with_date(shift)
+    
+    def _with_date(self, shift: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Add a datetime.date for the shift's date string, or None if it can't be parsed"""
+        try:
+            if '/' in shift['date']:
+                day, month, year = map(int, shift['date'].split('/'))
+                shift['date_obj'] = datetime.date(year, month, day)
+            elif '-' in shift['date']:
+                # Handle ISO format YYYY-MM-DD
+                shift['date_obj'] = datetime.datetime.strptime(shift['date'], '%Y-%m-%d').date()
+            else:
+                # Skip shifts with invalid date format
+                if shift['date']:
+                    self.logger.warning(f"Skipping shift with invalid date format: {shift['date']}")
+                return None
+            return shift
+        except (ValueError, TypeError) as e:
+            self.logger.warning(f"Error parsing date {shift['date']}: {e}")
+            return None
+    
+    def _is_upcoming(self, shift: Dict[str, Any], today: datetime.date, now: datetime.time) -> bool:
+        """Whether a shift is today or later and, if today, hasn't started yet"""
+        if shift['date_obj'] < today:
+            return False
+        
+        # For today's shifts, check if the time has passed
+        if shift['date_obj'] == today and 'status' not in shift:
+            try:
+                hour, minute = map(int, shift['start_time'].split(':'))
+                # Skip if the shift has already started
+                if datetime.time(hour, minute) < now:
+                    return False
+            except (ValueError, IndexError):
+                # If we can't parse the time, include the shift anyway
+                pass
+        return True
             
     async def _handle_add_shift(self, intent: Dict[str, Any], message: str) -> Dict[str, Any]:
         """Add a new shift"""
@@ -408,7 +386,7 @@ class ShiftHandler(BaseHandler):
             formatted_date = date_obj.strftime('%Y-%m-%d')
             
             # Get available fields in Airtable
-            available_fields = self._get_airtable_fields()
+            available_fields = await self._get_airtable_fields()
             self.logger.info(f"Available Airtable fields: {available_fields}")
             
             # Create the record - use only the fields that exist in Airtable
@@ -490,7 +468,7 @@ class ShiftHandler(BaseHandler):
             
             # Add to Airtable
             self.logger.info(f"Creating shift with fields: {new_shift}")
-            created = self.airtable_client.create(new_shift)
+            created = await self.airtable_client.create(new_shift)
             
             # Prepare response message
             if status == 'off':
@@ -515,6 +493,13 @@ class ShiftHandler(BaseHandler):
             if 'Notes' in available_fields and 'Notes' in new_shift:
                 shift_response['notes'] = new_shift['Notes']
             
+            # Keep the profile's next shift current if this one comes sooner
+            if date_obj >= datetime.date.today() and status == 'working':
+                current = profile_store.get(self.user_id).get('next_shift') if self.user_id else None
+                if not current or current['date'] < datetime.date.today().isoformat() or \
+                        (formatted_date, shift_response['start_time']) < (current['date'], current.get('start_time', '')):
+                    self._remember_next_shift(dict(shift_response, date_obj=date_obj))
+            
             return {
                 'success': True,
                 'message': msg,
@@ -556,7 +541,7 @@ class ShiftHandler(BaseHandler):
             formatted_date = date_obj.strftime('%Y-%m-%d')
             
             # Find shifts on this date
-            all_shifts = self.airtable_client.all(formula=f"{{Date}} = '{formatted_date}'")
+            all_shifts = await self.airtable_client.select(where={'Date': formatted_date})
             
             if not all_shifts:
                 return {
@@ -580,7 +565,9 @@ class ShiftHandler(BaseHandler):
                 
             # Delete the shift
             shift_to_delete = all_shifts[0]
-            self.airtable_client.delete(shift_to_delete['id'])
+            await self.airtable_client.delete(shift_to_delete['id'])
+            if self.user_id and (profile_store.get(self.user_id).get('next_shift') or {}).get('id') == shift_to_delete['id']:
+                self._remember_next_shift(None)
             
             start_time = shift_to_delete['fields'].get('Start Time', 'Unknown')
             end_time = shift_to_delete['fields'].get('End Time', 'Unknown')
@@ -724,24 +711,26 @@ class ShiftHandler(BaseHandler):
             }
         ]
             
-    def _get_airtable_fields(self) -> List[str]:
-        """Get the field names in the Airtable table"""
-        try:
-            if not self.airtable_available:
-                return []
-                
-            # Get a record to see fields
-            records = self.airtable_client.all(max_records=1)
-            
-            if records:
-                return list(records[0]['fields'].keys())
+    def _remember_next_shift(self, shift: Optional[Dict[str, Any]]) -> None:
+        """Store the user's next shift on their profile with an ISO date"""
+        if not self.user_id:
+            return
+        if shift:
+            date_obj = shift.get('date_obj')
+            shift = {key: value for key, value in shift.items() if key != 'date_obj'}
+            if date_obj:
+                shift['date'] = date_obj.isoformat()
+        profile_store.update(self.user_id, {'next_shift': shift})
+
+    async def _get_airtable_fields(self) -> List[str]:
+        """Get the field names in the Airtable table from the cached schema"""
+        if not self.airtable_available:
+            return []
             
-            # If no records, assume default fields
-            return ['ID', 'Date', 'Start Time', 'End Time', 'Status', 'Notes']
-        except Exception as e:
-            self.logger.error(f"Error getting Airtable fields: {e}")
-            # Return default field set
-            return ['Date', 'Start Time', 'End Time', 'Status', 'Notes']
+        fields = await self.airtable_client.field_names()
+        
+        # If the schema is unknown (e.g. an empty table), assume default fields
+        return fields or ['ID', 'Date', 'Start Time', 'End Time', 'Status', 'Notes']
             
     def format_response(self, data: Dict[str, Any]) -> str:
         """Format the shift data for display"""
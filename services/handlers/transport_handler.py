@@ -5,6 +5,7 @@ import json
 import datetime
 from typing import Dict, Any
 from .base_handler import BaseHandler
+from services.user_profile import profile_store
 
 logger = logging.getLogger(__name__)
 
@@ -358,6 +359,10 @@ class TransportHandler(BaseHandler):
             
             logger.info(f"Parsed locations - From: {from_station} To: {to_station}")
             
+            # Remember which stations this user usually asks about
+            if params.get('user_id'):
+                profile_store.record_stations(params['user_id'], [from_station.lower(), to_station.lower()])
+            
             # Convert station names to CRS codes
             from_code = self._get_station_code(from_station)
             to_code = self._get_station_code(to_station)
@@ -0,0 +1,103 @@
+import os
+import re
+import copy
+import json
+import fcntl
+import logging
+import threading
+from typing import Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def data_dir(*parts: str) -> str:
+    """Path under the local data directory (SMS_DATA_DIR)"""
+    return os.path.join(os.getenv('SMS_DATA_DIR', 'data'), *parts)
+
+
+def safe_key(user_id: str) -> str:
+    """Turn a phone number or other user id into a safe file name"""
+    return re.sub(r'[^A-Za-z0-9]', '_', user_id)
+
+
+class JsonRecordStore:
+    """Keyed JSON documents on local disk with a per-worker read cache.
+
+    Each key is one file, written atomically. Cached copies are checked
+    against the file mtime so a write from another worker is picked up on
+    the next read without re-parsing unchanged files. get() returns a copy;
+    changes go through save(), or update() where they depend on the stored
+    document, which holds a per-key lock shared by every worker.
+    """
+
+    def __init__(self, name: str, default: Optional[Callable[[], Dict]] = None):
+        self.name = name
+        self.default = default or dict
+        self._cache: Dict[str, tuple] = {}
+
+    @property
+    def storage_dir(self) -> str:
+        return data_dir(self.name)
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.storage_dir, f"{safe_key(key)}.json")
+
+    def get(self, key: str) -> Dict:
+        """Load a document, from the worker cache when the file is unchanged"""
+        path = self.path(key)
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+
+        cached = self._cache.get(key)
+        if cached and cached[0] == mtime and cached[1] == path:
+            return copy.deepcopy(cached[2])
+
+        document = self._read(path) if mtime is not None else self.default()
+        self._cache[key] = (mtime, path, document)
+        return copy.deepcopy(document)
+
+    def update(self, key: str, change: Callable[[Dict], Optional[Dict]]) -> Dict:
+        """Read, change and save a document with no other writer in between.
+
+        change is given the stored document and returns the fields to
+        merge into it, or None to leave it unchanged. Returns the result.
+        """
+        path = self.path(key)
+        os.makedirs(self.storage_dir, exist_ok=True)
+        with open(f"{path}.lock", 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                document = self._read(path) if os.path.exists(path) else self.default()
+                changes = change(copy.deepcopy(document))
+                if changes is not None:
+                    document.update(changes)
+                    self.save(key, document)
+                return copy.deepcopy(document)
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def save(self, key: str, document: Dict) -> None:
+        """Persist a document atomically and refresh the worker cache"""
+        path = self.path(key)
+        document = copy.deepcopy(document)
+        self._cache[key] = (None, path, document)
+        try:
+            os.makedirs(self.storage_dir, exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(document, f)
+            os.replace(tmp_path, path)
+            self._cache[key] = (os.stat(path).st_mtime_ns, path, document)
+        except Exception as e:
+            logger.error(f"Error storing {self.name} record: {e}")
+
+    def _read(self, path: str) -> Dict:
+        document = self.default()
+        try:
+            with open(path) as f:
+                document.update(json.load(f))
+        except Exception as e:
+            logger.error(f"Error loading {self.name} record: {e}")
+        return document
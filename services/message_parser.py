@@ -54,20 +54,21 @@ class MessageParser:
             api_response = None
             if initial_intent == 'transport':
                 transport_handler = self._handle_transport
-                api_response = await transport_handler(message, {})
+                api_response = await transport_handler(message, {'user_id': user_id})
 
             # Use OpenAI Assistant
             thread = openai.beta.threads.create()
 
             # Get context
-            context = await context_service.get_context(user_id, initial_intent)
+            context = await context_service.get_context(user_id, initial_intent, message)
 
             # Add message with context to thread
             context_prompt = f"""
 Context:
 - Recent interactions: {context['recent_context']}
-- Related history: {context['intent_context']}
+- Related history: {context['relevant_context']}
 - User preferences: {context['user_preferences']}
+- User profile: {context['user_profile']}
 
 User message: {message}
 
@@ -119,7 +120,7 @@ API Response: {api_response if api_response else 'No API data available'}
 
             # Parse AI response for intent classification
             intent = self._get_initial_intent(message)  # Use message intent
-            parameters = {'ai_response': ai_response, 'original_message': message}
+            parameters = {'ai_response': ai_response, 'original_message': message, 'user_id': user_id}
 
             # Basic intent mapping
             intents = {
@@ -0,0 +1,315 @@
+import os
+import gzip
+import json
+import time
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+from services.local_store import data_dir
+from services.movie_metadata import directors
+from services.watched_index import normalise_title
+
+logger = logging.getLogger(__name__)
+
+# TMDB publishes a gzipped JSON-lines file of every movie id each day
+EXPORT_URL = "http://files.tmdb.org/p/exports/movie_ids_{date}.json.gz"
+
+# Fuzzy matches scoring below this are treated as misses and sent to TMDB
+MATCH_THRESHOLD = float(os.getenv('MOVIE_CATALOG_MATCH', '0.45'))
+
+# Movies whose scoring features may change before the catalog's version is bumped
+VERSION_ROWS = int(os.getenv('MOVIE_CATALOG_VERSION_ROWS', '100'))
+
+
+def trigrams(text: str) -> set:
+    padded = f"  {normalise_title(text)} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def similarity(query: str, title: str) -> float:
+    """How well a query matches a title, from their trigram sets.
+
+    Jaccard similarity, or for a query that is mostly contained in a
+    longer title ('amelie poulain') a containment score, damped for
+    short queries so 'it' doesn't match every title containing it.
+    """
+    tq, tt = trigrams(query), trigrams(title)
+    if not tq or not tt:
+        return 0.0
+    shared = len(tq & tt)
+    containment = 0.8 * shared / len(tq) * min(1.0, len(tq) / 8)
+    return max(shared / len(tq | tt), containment)
+
+
+class MovieCatalog:
+    """Local copy of the TMDB movie catalog for resolving titles offline.
+
+    Seeded from TMDB's daily id export (id, title, popularity) and filled
+    in with year, genres and display fields from any TMDB results that
+    pass through the app. Titles are indexed by trigram (SQLite FTS5), so
+    a misspelt or partial title is resolved locally; only misses need a
+    TMDB search. One SQLite file under SMS_DATA_DIR is shared by workers.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._fts: Optional[bool] = None
+
+    @property
+    def path(self) -> str:
+        return data_dir('movie_catalog.sqlite3')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS movies (id INTEGER PRIMARY KEY, title TEXT NOT NULL, "
+                         "norm TEXT NOT NULL, year INTEGER, genres TEXT, popularity REAL, vote_average REAL, "
+                         "poster_path TEXT, overview TEXT, enriched_at REAL, director TEXT)")
+            if 'director' not in {row['name'] for row in conn.execute("PRAGMA table_info(movies)")}:
+                conn.execute("ALTER TABLE movies ADD COLUMN director TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_movies_norm ON movies (norm)")
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_movies_year ON movies (year)")
+            conn.execute("CREATE TABLE IF NOT EXISTS movie_genres (genre INTEGER, id INTEGER, popularity REAL, "
+                         "PRIMARY KEY (genre, id)) WITHOUT ROWID")
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)")
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS titles USING fts5(norm, tokenize='trigram')")
+                self._fts = True
+            except sqlite3.OperationalError:
+                # SQLite without FTS5 trigrams: fall back to a substring scan
+                self._fts = False
+            conn.commit()
+            self._local.conn = conn
+            self._local.path = self.path
+        return conn
+
+    def _write(self, conn: sqlite3.Connection, rows: List[tuple], enriched: bool) -> None:
+        """Upsert (id, title, year, genres, popularity, vote, poster, overview, director) rows"""
+        changed = 0
+        new_genres = False
+        for row in rows:
+            movie_id, title, genres = row[0], row[1], row[3]
+            norm = normalise_title(title)
+            existing = conn.execute("SELECT norm, year, genres, director FROM movies WHERE id = ?",
+                                    (movie_id,)).fetchone()
+            if existing and not enriched:
+                # An export row only refreshes popularity; it never overwrites details
+                conn.execute("UPDATE movies SET popularity = ? WHERE id = ?", (row[4], movie_id))
+                continue
+            # New scoring features (year, genres, director) change the catalog's version
+            if existing is None:
+                changed += genres is not None
+            elif any(new is not None and new != old for new, old in
+                     zip((row[2], genres, row[8]), (existing['year'], existing['genres'], existing['director']))):
+                changed += 1
+            conn.execute(
+                "INSERT INTO movies (id, title, norm, year, genres, popularity, vote_average, poster_path, overview, "
+                "director, enriched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?) ON CONFLICT(id) DO UPDATE SET "
+                "title = excluded.title, norm = excluded.norm, year = COALESCE(excluded.year, year), "
+                "genres = COALESCE(excluded.genres, genres), popularity = COALESCE(excluded.popularity, popularity), "
+                "vote_average = COALESCE(excluded.vote_average, vote_average), "
+                "poster_path = COALESCE(excluded.poster_path, poster_path), "
+                "overview = COALESCE(excluded.overview, overview), director = COALESCE(excluded.director, director), "
+                "enriched_at = excluded.enriched_at",
+                (movie_id, title, norm, *row[2:], time.time() if enriched else None))
+            if self._fts and (not existing or existing['norm'] != norm):
+                conn.execute("DELETE FROM titles WHERE rowid = ?", (movie_id,))
+                conn.execute("INSERT INTO titles (rowid, norm) VALUES (?, ?)", (movie_id, norm))
+            if genres is not None:
+                ids = [int(g) for g in genres.split(',') if g]
+                new_genres = new_genres or any(
+                    conn.execute("SELECT 1 FROM movie_genres WHERE genre = ? LIMIT 1", (g,)).fetchone() is None
+                    for g in ids)
+                conn.execute("DELETE FROM movie_genres WHERE id = ?", (movie_id,))
+                conn.executemany("INSERT OR REPLACE INTO movie_genres (genre, id, popularity) VALUES (?, ?, ?)",
+                                 [(g, movie_id, row[4] or 0) for g in ids])
+        if not changed:
+            return
+        # Most writes are a TMDB list re-reading movies it already knows, so the
+        # version only moves for a new genre or once enough movies have changed
+        conn.execute("INSERT INTO meta (key, value) VALUES ('pending', ?) "
+                     "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value", (changed,))
+        if new_genres or self.pending(conn) >= VERSION_ROWS:
+            conn.execute("INSERT INTO meta (key, value) VALUES ('version', 1) "
+                         "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+            conn.execute("UPDATE meta SET value = 0 WHERE key = 'pending'")
+
+    def version(self) -> int:
+        """Bumped when a write brings a new genre or MOVIE_CATALOG_VERSION_ROWS movies' features have changed.
+
+        Changes to a movie's year, genres or director count; popularity
+        refreshes don't. Lets anything derived from those, like the
+        recommender's feature matrix, be kept until the catalog has
+        changed enough to matter, in any worker.
+        """
+        row = self._connect().execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        return row[0] if row else 0
+
+    def pending(self, conn: Optional[sqlite3.Connection] = None) -> int:
+        """Movies whose features changed since the version was last bumped"""
+        row = (conn or self._connect()).execute("SELECT value FROM meta WHERE key = 'pending'").fetchone()
+        return row[0] if row else 0
+
+    def import_export(self, lines: Iterable[bytes], min_popularity: float = 0.0, batch_size: int = 5000) -> int:
+        """Load id-export lines ({"id", "original_title", "popularity", "adult", ...})"""
+        conn = self._connect()
+        count = 0
+        batch = []
+        for line in lines:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            if entry.get('adult') or entry.get('video') or (entry.get('popularity') or 0) < min_popularity:
+                continue
+            batch.append((entry['id'], entry.get('original_title') or entry.get('title') or '', None, None,
+                          entry.get('popularity'), None, None, None, None))
+            if len(batch) >= batch_size:
+                with conn:
+                    self._write(conn, batch, enriched=False)
+                count += len(batch)
+                batch = []
+        if batch:
+            with conn:
+                self._write(conn, batch, enriched=False)
+            count += len(batch)
+        logger.info(f"Imported {count} movies from the TMDB id export")
+        return count
+
+    def import_export_file(self, path: str, min_popularity: float = 0.0) -> int:
+        with gzip.open(path, 'rb') as f:
+            return self.import_export(f, min_popularity)
+
+    def add(self, movies: List[Dict[str, Any]]) -> None:
+        """Store TMDB results (search, lists or details) with their year, genres and director"""
+        rows = []
+        for movie in movies:
+            if not movie or not movie.get('id') or not movie.get('title'):
+                continue
+            genre_ids = movie.get('genre_ids')
+            if genre_ids is None and 'genres' in movie:
+                genre_ids = [g['id'] for g in movie['genres']]
+            year = (movie.get('release_date') or '')[:4]
+            rows.append((movie['id'], movie['title'], int(year) if year.isdigit() else None,
+                         ','.join(str(g) for g in genre_ids) if genre_ids is not None else None,
+                         movie.get('popularity'), movie.get('vote_average'), movie.get('poster_path'),
+                         (movie.get('overview') or '')[:500] or None, directors(movie.get('credits'))))
+        if rows:
+            conn = self._connect()
+            with conn:
+                self._write(conn, rows, enriched=True)
+
+    def _movie(self, row: sqlite3.Row) -> Dict[str, Any]:
+        """A catalog row in the shape TMDB returns in result lists"""
+        movie = {'id': row['id'], 'title': row['title'], 'popularity': row['popularity'] or 0}
+        if row['year']:
+            movie['release_date'] = f"{row['year']}-01-01"
+        if row['genres'] is not None:
+            movie['genre_ids'] = [int(g) for g in row['genres'].split(',') if g]
+        for field in ('vote_average', 'poster_path', 'overview', 'director'):
+            if row[field] is not None:
+                movie[field] = row[field]
+        movie['enriched'] = row['enriched_at'] is not None
+        return movie
+
+    def _candidates(self, norm: str, limit: int) -> List[sqlite3.Row]:
+        conn = self._connect()
+        grams = sorted({g.strip() for g in trigrams(norm) if len(g.strip()) == 3})
+        if self._fts and grams:
+            match = ' OR '.join('"' + g.replace('"', '""') + '"' for g in grams)
+            return conn.execute(
+                "SELECT m.* FROM titles JOIN movies m ON m.id = titles.rowid WHERE titles MATCH ? "
+                "ORDER BY bm25(titles) LIMIT ?", (match, limit)).fetchall()
+        words = sorted(norm.split(), key=len, reverse=True)
+        if not words:
+            return []
+        return conn.execute("SELECT * FROM movies WHERE norm LIKE ? ORDER BY popularity DESC LIMIT ?",
+                            (f"%{words[0]}%", limit)).fetchall()
+
+    def resolve(self, title: str, limit: int = 5, year: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Best local matches for a free-text title, best first, each with a 'score'"""
+        norm = normalise_title(title)
+        if not norm:
+            return []
+        conn = self._connect()
+        exact = conn.execute("SELECT * FROM movies WHERE norm = ?", (norm,)).fetchall()
+        rows = {row['id']: row for row in exact}
+        if len(rows) < limit:
+            for row in self._candidates(norm, 200):
+                rows.setdefault(row['id'], row)
+        scored = []
+        for row in rows.values():
+            score = 1.0 if row['norm'] == norm else similarity(norm, row['norm'])
+            if year and row['year'] == year:
+                score += 0.1
+            scored.append((score, row['popularity'] or 0, row))
+        scored.sort(key=lambda x: (x[0], x[1]), reverse=True)
+        return [dict(self._movie(row), score=round(score, 3)) for score, _, row in scored[:limit]]
+
+    def best_match(self, title: str) -> Optional[Dict[str, Any]]:
+        """The catalog's answer for a title, if it is confident enough"""
+        matches = self.resolve(title, limit=1)
+        return matches[0] if matches and matches[0]['score'] >= MATCH_THRESHOLD else None
+
+    def by_genre(self, genre_ids: List[int], limit: int = 20, min_year: Optional[int] = None,
+                 exclude: Iterable[int] = ()) -> List[Dict[str, Any]]:
+        """The most popular known movies having all the given genres"""
+        if not genre_ids:
+            return []
+        conn = self._connect()
+        excluded = set(exclude)
+        first, rest = genre_ids[0], genre_ids[1:]
+        sql = "SELECT m.* FROM movie_genres g JOIN movies m ON m.id = g.id WHERE g.genre = ?"
+        params: List[Any] = [first]
+        for genre in rest:
+            sql += " AND EXISTS (SELECT 1 FROM movie_genres h WHERE h.id = g.id AND h.genre = ?)"
+            params.append(genre)
+        if min_year:
+            sql += " AND m.year >= ?"
+            params.append(min_year)
+        sql += " ORDER BY g.popularity DESC LIMIT ?"
+        params.append(limit + len(excluded))
+        movies = [self._movie(row) for row in conn.execute(sql, params)]
+        return [m for m in movies if m['id'] not in excluded][:limit]
+
+    def enriched(self, limit: int = 2000) -> List[Dict[str, Any]]:
+        """The most popular movies whose genres are known, for local scoring"""
+        return [self._movie(row) for row in self._connect().execute(
+            "SELECT * FROM movies WHERE genres IS NOT NULL ORDER BY popularity DESC LIMIT ?", (limit,))]
+
+    def get(self, movie_id: int) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute("SELECT * FROM movies WHERE id = ?", (movie_id,)).fetchone()
+        return self._movie(row) if row else None
+
+    async def enrich(self, tmdb, limit: int = 500) -> int:
+        """Fetch details (with credits) for the most popular movies known only from the id export"""
+        ids = [row['id'] for row in self._connect().execute(
+            "SELECT id FROM movies WHERE enriched_at IS NULL ORDER BY popularity DESC LIMIT ?", (limit,))]
+        details = await tmdb.get_all([(f"movie/{movie_id}", {'append_to_response': 'credits'}) for movie_id in ids])
+        self.add([movie for movie in details if movie])
+        return sum(1 for movie in details if movie)
+
+    def stats(self) -> Dict:
+        conn = self._connect()
+        total, enriched = conn.execute("SELECT COUNT(*), COUNT(enriched_at) FROM movies").fetchone()
+        return {
+            'movies': total,
+            'enriched': enriched,
+            'bytes': os.path.getsize(self.path) if os.path.exists(self.path) else 0,
+            'fuzzy_index': 'fts5-trigram' if self._fts else 'substring'
+        }
+
+
+movie_catalog = MovieCatalog()
+
+
+def export_url(day: Optional[datetime] = None) -> str:
+    """URL of TMDB's id export for a day (published each morning UTC; default yesterday)"""
+    day = day or datetime.utcnow() - timedelta(days=1)
+    return EXPORT_URL.format(date=day.strftime('%m_%d_%Y'))
@@ -0,0 +1,148 @@
+import re
+import logging
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Words people use for each TMDB genre (keyed by the handler's lowercase genre names)
+GENRE_SYNONYMS = {
+    'action': ['action'],
+    'adventure': ['adventure', 'adventures'],
+    'animation': ['animation', 'animated', 'cartoon', 'cartoons', 'anime'],
+    'comedy': ['comedy', 'comedies', 'funny'],
+    'crime': ['crime', 'gangster', 'heist'],
+    'documentary': ['documentary', 'documentaries'],
+    'drama': ['drama', 'dramas'],
+    'family': ['family', 'kids'],
+    'fantasy': ['fantasy'],
+    'history': ['history', 'historical'],
+    'horror': ['horror', 'horrors', 'scary'],
+    'music': ['music', 'musical', 'musicals'],
+    'mystery': ['mystery', 'mysteries', 'whodunit', 'whodunnit'],
+    'romance': ['romance', 'romances', 'romantic', 'rom com', 'rom coms'],
+    'science fiction': ['science fiction', 'sci fi', 'scifi'],
+    'tv movie': ['tv movie', 'tv movies', 'made for tv'],
+    'thriller': ['thriller', 'thrillers', 'thrilling', 'suspense'],
+    'war': ['war'],
+    'western': ['western', 'westerns']
+}
+
+
+def _phrase_key(text: str) -> str:
+    return re.sub(r'[\s-]+', '', text.lower())
+
+
+class GenreMatcher:
+    """Finds genre words in a message with one precompiled pattern.
+
+    Every synonym becomes a branch of a single alternation (longest first,
+    whole words only, with spaces and hyphens interchangeable), so 'award'
+    doesn't match 'war' and 'sci-fi', 'scifi' and 'sci fi' all match.
+    """
+
+    def __init__(self, synonyms: Dict[str, List[str]]):
+        self.genre_of = {_phrase_key(word): genre for genre, words in synonyms.items() for word in words}
+        branches = sorted({word for words in synonyms.values() for word in words}, key=len, reverse=True)
+        self.pattern = re.compile(
+            r'\b(?:' + '|'.join(r'[\s-]?'.join(map(re.escape, re.split(r'[\s-]+', w))) for w in branches) + r')\b',
+            re.IGNORECASE)
+
+    def find(self, message: str) -> Optional[str]:
+        """The first genre mentioned in a message, if any"""
+        match = self.pattern.search(message)
+        return self.genre_of[_phrase_key(match.group(0))] if match else None
+
+    def find_all(self, message: str) -> List[str]:
+        genres = [self.genre_of[_phrase_key(m.group(0))] for m in self.pattern.finditer(message)]
+        return list(dict.fromkeys(genres))
+
+
+class MovieIntentParser:
+    """Turns a movie-related message into the handler's intent dict.
+
+    Patterns are compiled once for the class. Checks run in priority order:
+    a rating returns immediately; otherwise popular, then genre, search and
+    add-to-favourites each override what came before, and a recommendation
+    is only considered if nothing else matched. Genres are only looked for
+    outside a search or "like X" title.
+    """
+
+    RATING = re.compile(r'\brate\s+(?:the\s+)?(?:movie\s+)?["\']?([^"\']+?)["\']?\s+(?:as\s+)?(\d+(?:\.\d+)?)'
+                        r'(?:\s*stars?)?(?:\s*(?:\/|out of)\s*(\d+))?\s*[.!]?$', re.I)
+    # Looser fallback for ratings followed by more text ("rate heat 8/10 please")
+    RATING_SIMPLE = re.compile(r'\brate\s+(?:the\s+)?(?:movie\s+)?([^0-9]+)(\d+(?:\.\d+)?)'
+                               r'(?:\s*stars?)?(?:\s*(?:\/|out of)\s*(\d+))?', re.I)
+    POPULAR = re.compile(r'(popular|top|trending|what.*(watching|good)).*movie', re.I)
+    SEARCH = re.compile(r'(find|search|lookup|about).*movies?\s+(?:(?:called|named|titled)\s+)?(.+?)\s*(?:$|\?)', re.I)
+    FAVORITE = re.compile(r'add\s+(?:movie\s+)?["\']?([^"\']+)["\']?(?:\s+to\s+(?:my\s+)?favorites)', re.I)
+    RECOMMEND = re.compile(r'(recommend|suggest).*(?:movie|film)|what\s+(?:movie|film)\s+should\s+i\s+watch', re.I)
+    LIKE = re.compile(r'like\s+["\']?([^"\']+)["\']?(?:$|\?|,|but)', re.I)
+    SIMILAR = re.compile(r'similar to\s+["\']?([^"\']+)["\']?(?:$|\?|,|but)', re.I)
+    COMPANY = re.compile(r'\bwith\s+(?:the|my|our)\s+\w+', re.I)
+    GENRES = GenreMatcher(GENRE_SYNONYMS)
+
+    def parse(self, message: str) -> Dict[str, Any]:
+        intent = {'action': None, 'genre': None, 'query': None, 'release_year': None}
+
+        # Ratings take priority over everything else
+        if 'rate' in message.lower():
+            rating_match = self.RATING.search(message)
+            if rating_match or message.lower().startswith('rate '):
+                intent['action'] = 'rate'
+                rating_match = rating_match or self.RATING_SIMPLE.search(message)
+                if rating_match:
+                    intent['movie_title'] = rating_match.group(1).strip()
+                    rating = float(rating_match.group(2))
+                    scale = float(rating_match.group(3) or 5) or 5  # Default to a 5 star scale
+                    intent['rating'] = min(5, (rating / scale) * 5)
+                return intent
+
+        if self.POPULAR.search(message):
+            intent['action'] = 'popular'
+
+        search_match = self.SEARCH.search(message)
+        like_match = None
+        if self.RECOMMEND.search(message) and ('like' in message or 'similar to' in message):
+            like_match = self.LIKE.search(message) or self.SIMILAR.search(message)
+
+        # Genre words in a title ("like scary movie", "called the funny people")
+        # or in who's watching ("with the kids") don't ask for that genre
+        spans = [m.span() for m in self.COMPANY.finditer(message)]
+        if search_match:
+            spans.append(search_match.span(2))
+        if like_match:
+            spans.append(like_match.span(1))
+        genre = self.GENRES.find(self._without(message, spans))
+        if genre:
+            intent['action'] = 'genre'
+            intent['genre'] = genre
+
+        if search_match:
+            intent['action'] = 'search'
+            intent['query'] = search_match.group(2).strip()
+
+        favorite_match = self.FAVORITE.search(message)
+        if favorite_match:
+            intent['action'] = 'add_favorite'
+            intent['movie_title'] = favorite_match.group(1).strip()
+
+        if intent['action'] is None and self.RECOMMEND.search(message):
+            intent['action'] = 'recommend'
+            # "movies like X" / "similar to X" recommends from X
+            if like_match:
+                intent['query'] = like_match.group(1).strip()
+
+        # Default to popular if no clear intent
+        if intent['action'] is None:
+            intent['action'] = 'popular'
+        return intent
+
+    @staticmethod
+    def _without(message: str, spans: List[tuple]) -> str:
+        """The message with the given (start, end) spans blanked out"""
+        for start, end in sorted(spans, reverse=True):
+            message = message[:start] + ' ' + message[end:]
+        return message
+
+
+movie_intent_parser = MovieIntentParser()
@@ -0,0 +1,95 @@
+import logging
+from typing import Any, Dict, List, Optional
+from services.tmdb_client import TMDBClient
+from services.watched_index import normalise_title
+
+logger = logging.getLogger(__name__)
+
+# TMDB details stored with each watched or favourite movie, when the table has the field
+METADATA_FIELDS = ['TMDB_ID', 'Genre IDs', 'Year', 'Director']
+
+
+def title_of(record: Dict) -> str:
+    fields = record.get('fields', {})
+    return fields.get('Title') or fields.get('Name') or ''
+
+
+def genre_ids(fields: Dict[str, Any]) -> Optional[List[int]]:
+    """Stored genre ids of a record, or None if it has not been enriched"""
+    value = fields.get('Genre IDs')
+    if value is None or value == '':
+        return [] if fields.get('TMDB_ID') else None
+    return [int(g) for g in str(value).split(',') if g.strip().isdigit()]
+
+
+def directors(credits: Optional[Dict]) -> Optional[str]:
+    names = [member['name'] for member in (credits or {}).get('crew', []) if member.get('job') == 'Director']
+    return ', '.join(names) or None
+
+
+def metadata_fields(movie: Dict[str, Any], director: Optional[str] = None) -> Dict[str, Any]:
+    """The stored form of a TMDB movie's metadata"""
+    fields = {
+        'TMDB_ID': str(movie['id']),
+        'Genre IDs': ', '.join(str(g) for g in movie.get('genre_ids') or [g['id'] for g in movie.get('genres', [])]),
+        'Year': (movie.get('release_date') or '')[:4] or None,
+        'Director': director
+    }
+    return {k: v for k, v in fields.items() if v is not None}
+
+
+async def writable(table, fields: Dict[str, Any]) -> Dict[str, Any]:
+    """Drop metadata fields the table doesn't have (older Airtable bases)"""
+    available = await table.field_names()
+    return {k: v for k, v in fields.items() if k not in METADATA_FIELDS or not available or k in available}
+
+
+async def backfill_movie_metadata(table, tmdb: Optional[TMDBClient] = None, batch_size: int = 50) -> Dict:
+    """Look up and store TMDB metadata for records that were saved without it.
+
+    Titles are matched a batch at a time through TMDB search (each distinct
+    title once), then credits are fetched for the director, and the batch
+    is written back with batched updates. Safe to re-run: enriched records
+    are skipped.
+    """
+    tmdb = tmdb or TMDBClient()
+    available = await table.field_names()
+    if 'TMDB_ID' not in available:
+        logger.warning(f"{table.table_name} has no TMDB_ID field - nothing to backfill")
+        return {'checked': 0, 'updated': 0, 'unmatched': 0}
+    counts = {'checked': 0, 'updated': 0, 'unmatched': 0}
+    batch: List[Dict] = []
+
+    async def flush() -> None:
+        queries = sorted({normalise_title(title_of(r)) for r in batch})
+        results = await tmdb.get_many('search/movie', [{'query': q, 'page': 1, 'include_adult': 'false'} for q in queries])
+        matches = {}
+        for query, data in zip(queries, results):
+            hits = (data or {}).get('results') or []
+            matches[query] = hits[0] if hits else None
+        found = [m for m in matches.values() if m]
+        credits = await tmdb.get_all([(f"movie/{m['id']}/credits", {}) for m in found])
+        director_of = {m['id']: directors(c) for m, c in zip(found, credits)}
+        updates = []
+        for record in batch:
+            movie = matches[normalise_title(title_of(record))]
+            if not movie:
+                counts['unmatched'] += 1
+                continue
+            fields = metadata_fields(movie, director_of.get(movie['id']))
+            updates.append({'id': record['id'], 'fields': {k: v for k, v in fields.items() if k in available}})
+        if updates:
+            await table.batch_update(updates)
+            counts['updated'] += len(updates)
+        batch.clear()
+
+    async for record in table.stream():
+        counts['checked'] += 1
+        if not record['fields'].get('TMDB_ID') and title_of(record):
+            batch.append(record)
+            if len(batch) >= batch_size:
+                await flush()
+    if batch:
+        await flush()
+    logger.info(f"Backfilled {table.table_name}: {counts}")
+    return counts
@@ -1,69 +1,172 @@
-
-from typing import Dict, List, Optional
+from typing import AsyncIterable, Dict, List, Optional, Union
 from datetime import datetime, timedelta
 import logging
+import os
+import re
 from services.airtable_service import AirtableService
+from services.local_store import JsonRecordStore
 
 logger = logging.getLogger(__name__)
 
+# How often the incremental aggregate is checked against a full rebuild
+REBUILD_INTERVAL = timedelta(hours=int(os.getenv('PREFERENCE_REBUILD_HOURS', '24')))
+
+TOPIC_KEYWORDS = {
+    'food': ['recipe', 'cook', 'dinner', 'lunch', 'breakfast'],
+    'travel': ['train', 'bus', 'station', 'journey', 'trip'],
+    'work': ['shift', 'work', 'rota', 'schedule'],
+    'movies': ['movie', 'film', 'watch', 'cinema'],
+    'weather': ['weather', 'rain', 'forecast', 'temperature'],
+    'email': ['email', 'inbox', 'mail']
+}
+
+LOCATION_PATTERNS = [
+    re.compile(r'(?:weather|forecast)\s+(?:in|at|for)\s+([a-z][a-z\s]*?)(?:\?|\.|,|$|\s+(?:today|tomorrow|now))'),
+    re.compile(r'from\s+([a-z][a-z\s]*?)\s+to\s+([a-z][a-z\s]*?)(?:\?|\.|,|$)')
+]
+
+
+def _empty_aggregate() -> Dict:
+    return {
+        'turns': 0,
+        'services': {},
+        'hours': {},
+        'locations': {},
+        'topics': {},
+        'updated_at': None,
+        'rebuilt_at': None
+    }
+
+
+async def _aiter(records: List[Dict]):
+    for record in records:
+        yield record
+
+
+# Per-user aggregates on local disk, cached per worker
+aggregate_store = JsonRecordStore('preferences', _empty_aggregate)
+
+
 class PreferenceLearning:
-    def __init__(self):
-        self.airtable = AirtableService()
-        
+    def __init__(self, airtable: Optional[AirtableService] = None):
+        self.airtable = airtable or AirtableService()
+
     async def learn_preferences(self, user_id: str) -> Dict:
-        """Learn user preferences from historical data"""
+        """Return learned preferences, running the periodic full rebuild when due"""
         try:
-            history = await self.airtable.get_all_user_conversations(user_id)
-            preferences = {
-                'services': await self._analyze_service_usage(history),
-                'timing': await self._analyze_timing_patterns(history),
-                'locations': await self._analyze_locations(history),
-                'topics': await self._analyze_topics(history)
-            }
-            await self._store_preferences(user_id, preferences)
-            return preferences
+            aggregate = aggregate_store.get(user_id)
+            if self.rebuild_due(aggregate.get('rebuilt_at')):
+                await self.rebuild_preferences(user_id)
+            return self.get_preferences(user_id)
         except Exception as e:
             logger.error(f"Error learning preferences: {e}")
             return {}
-            
-    async def _analyze_service_usage(self, history: List[Dict]) -> Dict:
-        """Analyze which services the user uses most frequently"""
-        service_counts = {}
-        for interaction in history:
-            if 'intent' in interaction:
-                service = interaction['intent']
-                service_counts[service] = service_counts.get(service, 0) + 1
-        return {'most_used': sorted(service_counts.items(), key=lambda x: x[1], reverse=True)}
-        
-    async def _analyze_timing_patterns(self, history: List[Dict]) -> Dict:
-        """Analyze when the user is most active"""
-        hour_counts = {i: 0 for i in range(24)}
-        for interaction in history:
-            if 'timestamp' in interaction:
-                hour = datetime.fromisoformat(interaction['timestamp']).hour
-                hour_counts[hour] += 1
-        return {'peak_hours': sorted(hour_counts.items(), key=lambda x: x[1], reverse=True)[:3]}
-        
-    async def _analyze_locations(self, history: List[Dict]) -> List[str]:
-        """Extract frequently referenced locations"""
-        locations = set()
-        for interaction in history:
-            if 'parameters' in interaction and 'location' in interaction['parameters']:
-                locations.add(interaction['parameters']['location'])
-        return list(locations)
-        
-    async def _analyze_topics(self, history: List[Dict]) -> Dict:
-        """Analyze frequently discussed topics"""
-        topic_counts = {}
-        for interaction in history:
-            if 'topics' in interaction:
-                for topic in interaction['topics']:
-                    topic_counts[topic] = topic_counts.get(topic, 0) + 1
-        return {'frequent_topics': sorted(topic_counts.items(), key=lambda x: x[1], reverse=True)}
-        
-    async def _store_preferences(self, user_id: str, preferences: Dict) -> None:
-        """Store learned preferences in Airtable"""
+
+    def get_preferences(self, user_id: str) -> Dict:
+        """Get the summarised preferences for a user from the cached aggregate"""
+        return self._summarise(aggregate_store.get(user_id))
+
+    def record_turn(self, user_id: str, message: str, intent: str = '',
+                    timestamp: Optional[datetime] = None) -> Dict:
+        """Fold a single new conversation turn into the user's aggregate"""
+        def change(aggregate: Dict) -> Dict:
+            self._count_turn(aggregate, message, intent, timestamp or datetime.now())
+            aggregate['updated_at'] = datetime.now().isoformat()
+            return aggregate
+        return aggregate_store.update(user_id, change)
+
+    async def rebuild_preferences(self, user_id: str,
+                                  history: Optional[Union[List[Dict], AsyncIterable[Dict]]] = None) -> Dict:
+        """Recompute the aggregate from the full conversation history.
+
+        The history is streamed from storage unless given; records are
+        folded in one at a time, so the full history is never held at once.
+        """
+        if history is None:
+            history = self.airtable.stream_user_conversations(user_id, include_archive=True)
+        if isinstance(history, list):
+            history = _aiter(history)
+        rebuilt = _empty_aggregate()
         try:
-            await self.airtable.update_user_preferences(user_id, preferences)
+            async for record in history:
+                message, intent, timestamp = self._turn_from_record(record)
+                self._count_turn(rebuilt, message, intent, timestamp)
         except Exception as e:
-            logger.error(f"Error storing preferences: {e}")
+            # Keep the incremental aggregate rather than save a partial rebuild
+            logger.error(f"Error reading history for {user_id}, skipping preference rebuild: {e}")
+            return aggregate_store.get(user_id)
+
+        current = aggregate_store.get(user_id)
+        if not rebuilt['turns'] and current['turns']:
+            # An empty fetch is more likely a failed read than a wiped table
+            logger.warning(f"Skipping preference rebuild for {user_id}: no history returned")
+            return current
+        if current['turns'] != rebuilt['turns'] or current['services'] != rebuilt['services']:
+            logger.warning(
+                f"Preference aggregate drift for {user_id}: "
+                f"{current['turns']} incremental turns vs {rebuilt['turns']} stored"
+            )
+
+        now = datetime.now().isoformat()
+        rebuilt['updated_at'] = now
+        rebuilt['rebuilt_at'] = now
+        aggregate_store.save(user_id, rebuilt)
+        return rebuilt
+
+    def _count_turn(self, aggregate: Dict, message: str, intent: str,
+                    timestamp: Optional[datetime]) -> None:
+        """Apply the O(1) count updates for one turn"""
+        aggregate['turns'] += 1
+        if intent:
+            aggregate['services'][intent] = aggregate['services'].get(intent, 0) + 1
+        if timestamp:
+            hour = str(timestamp.hour)
+            aggregate['hours'][hour] = aggregate['hours'].get(hour, 0) + 1
+        for location in self._extract_locations(message):
+            aggregate['locations'][location] = aggregate['locations'].get(location, 0) + 1
+        for topic in self._extract_topics(message):
+            aggregate['topics'][topic] = aggregate['topics'].get(topic, 0) + 1
+
+    def _turn_from_record(self, record: Dict):
+        """Pull message, intent and timestamp out of a Conversations record"""
+        fields = record.get('fields', {})
+        timestamp = None
+        if record.get('createdTime'):
+            try:
+                created = datetime.fromisoformat(record['createdTime'].replace('Z', '+00:00'))
+                timestamp = created.astimezone().replace(tzinfo=None)
+            except ValueError:
+                pass
+        return fields.get('Body', ''), fields.get('Intent', ''), timestamp
+
+    def _extract_locations(self, message: str) -> List[str]:
+        """Extract referenced locations from a message"""
+        locations = []
+        message = (message or '').lower()
+        for pattern in LOCATION_PATTERNS:
+            for match in pattern.finditer(message):
+                locations.extend(group.strip() for group in match.groups() if group and group.strip())
+        return locations
+
+    def _extract_topics(self, message: str) -> List[str]:
+        """Find which known topics a message touches on"""
+        message = (message or '').lower()
+        return [topic for topic, words in TOPIC_KEYWORDS.items() if any(word in message for word in words)]
+
+    def _summarise(self, aggregate: Dict) -> Dict:
+        """Turn raw counts into the preference structure used for context"""
+        by_count = lambda counts: sorted(counts.items(), key=lambda x: x[1], reverse=True)
+        return {
+            'services': {'most_used': by_count(aggregate['services'])},
+            'timing': {'peak_hours': [(int(hour), count) for hour, count in by_count(aggregate['hours'])[:3]]},
+            'locations': [location for location, _ in by_count(aggregate['locations'])],
+            'topics': {'frequent_topics': by_count(aggregate['topics'])}
+        }
+
+    def rebuild_due(self, rebuilt_at: Optional[str]) -> bool:
+        """Whether the periodic full rebuild should run"""
+        if not self.airtable.airtable:
+            return False
+        if not rebuilt_at:
+            return True
+        return datetime.now() - datetime.fromisoformat(rebuilt_at) >= REBUILD_INTERVAL
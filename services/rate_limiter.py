@@ -0,0 +1,88 @@
+import os
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from services.local_store import data_dir
+
+logger = logging.getLogger(__name__)
+
+
+class SharedRateLimiter:
+    """Request rate limiter shared by every worker process on the host.
+
+    Keeps one schedule per key (e.g. an Airtable base) in a small SQLite
+    database, using the generic cell rate algorithm: each call reserves the
+    next free slot in a single short transaction and then sleeps until it.
+    The transaction runs in a worker thread so a busy database never
+    stalls the shared I/O loop.
+    A key can also be blocked for a while, e.g. after a 429 response, and
+    every worker honours the block.
+    """
+
+    def __init__(self, name: str, rate: float, burst: int = 1):
+        self.name = name
+        self.interval = 1.0 / rate
+        self.tolerance = (max(burst, 1) - 1) * self.interval
+        self._local = threading.local()
+
+    @property
+    def path(self) -> str:
+        return data_dir(f"{self.name}.sqlite3")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS schedule "
+                         "(key TEXT PRIMARY KEY, tat REAL, blocked_until REAL)")
+            self._local.conn = conn
+            self._local.path = self.path
+        return conn
+
+    def reserve(self, key: str) -> float:
+        """Claim the next slot for a key and return how long to wait for it"""
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat, blocked_until FROM schedule WHERE key = ?", (key,)).fetchone()
+            tat, blocked_until = row if row else (now, 0.0)
+            at = max(now, blocked_until, tat - self.tolerance)
+            conn.execute("INSERT OR REPLACE INTO schedule (key, tat, blocked_until) VALUES (?, ?, ?)",
+                         (key, max(tat, at) + self.interval, blocked_until))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return at - now
+
+    def block(self, key: str, seconds: float) -> None:
+        """Hold every worker's calls for a key until the given delay has passed"""
+        conn = self._connect()
+        until = time.time() + seconds
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tat, blocked_until FROM schedule WHERE key = ?", (key,)).fetchone()
+            tat, blocked_until = row if row else (until, 0.0)
+            conn.execute("INSERT OR REPLACE INTO schedule (key, tat, blocked_until) VALUES (?, ?, ?)",
+                         (key, tat, max(blocked_until, until)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def acquire(self, key: str) -> float:
+        """Wait for a slot; returns the time spent waiting"""
+        try:
+            delay = await asyncio.to_thread(self.reserve, key)
+        except sqlite3.Error as e:
+            # Never let the limiter itself take Airtable access down
+            logger.error(f"Rate limiter unavailable: {e}")
+            return 0.0
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
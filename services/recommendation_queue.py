@@ -0,0 +1,189 @@
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from services.airtable_client import io_loop
+from services.local_store import data_dir
+
+logger = logging.getLogger(__name__)
+
+# How long a candidate list is served before it is rebuilt on a schedule
+REFRESH_INTERVAL = float(os.getenv('RECOMMENDATION_REFRESH_HOURS', '6')) * 3600
+
+# Candidates kept per user, and the level at which a list is topped up early
+QUEUE_SIZE = int(os.getenv('RECOMMENDATION_QUEUE_SIZE', '30'))
+LOW_WATER = 5
+
+# A build claimed by a worker that hasn't finished after this long may be retried
+BUILD_TIMEOUT = 300
+
+Builder = Callable[[], Awaitable[Tuple[List[Dict[str, Any]], str]]]
+
+
+class RecommendationQueue:
+    """Precomputed, ranked recommendation candidates per user.
+
+    A background build ranks and filters a list of unwatched movies for a
+    user; answering "recommend me a movie" then just takes the head of the
+    list. Lists are rebuilt when the user's ratings or favourites change,
+    when they run low, and every REFRESH_INTERVAL. One SQLite file under
+    SMS_DATA_DIR is shared by all workers, so a pop is atomic across them
+    and only one worker builds a given user's list at a time.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._building: Dict[str, Future] = {}
+
+    @property
+    def path(self) -> str:
+        return data_dir('recommendations.sqlite3')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS candidates (user_id TEXT, position INTEGER, movie TEXT, "
+                         "PRIMARY KEY (user_id, position)) WITHOUT ROWID")
+            conn.execute("CREATE TABLE IF NOT EXISTS lists (user_id TEXT PRIMARY KEY, category TEXT, "
+                         "built_at REAL, changed_at REAL, building_at REAL)")
+            self._local.conn = conn
+            self._local.path = self.path
+        return conn
+
+    def pop(self, user_id: str, count: int = 5,
+            skip: Optional[Callable[[Dict[str, Any]], bool]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Take the next few candidates off a user's list.
+
+        Candidates matching skip (e.g. watched since the list was built)
+        are discarded on the way. Returns the movies and the list's category.
+        """
+        conn = self._connect()
+        movies = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT category FROM lists WHERE user_id = ?", (user_id,)).fetchone()
+            while len(movies) < count:
+                rows = conn.execute("SELECT position, movie FROM candidates WHERE user_id = ? "
+                                    "ORDER BY position LIMIT ?", (user_id, count - len(movies))).fetchall()
+                if not rows:
+                    break
+                conn.execute("DELETE FROM candidates WHERE user_id = ? AND position <= ?", (user_id, rows[-1][0]))
+                movies.extend(m for m in (json.loads(r[1]) for r in rows) if not (skip and skip(m)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return movies, row[0] if row else None
+
+    def replace(self, user_id: str, movies: List[Dict[str, Any]], category: str,
+                built_at: Optional[float] = None) -> None:
+        """Store a freshly built list, replacing whatever was left of the old one.
+
+        built_at is when the build started reading the user's data, so a
+        rating that arrives mid-build still leaves the list due.
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM candidates WHERE user_id = ?", (user_id,))
+            conn.executemany("INSERT INTO candidates (user_id, position, movie) VALUES (?, ?, ?)",
+                             [(user_id, i, json.dumps(movie)) for i, movie in enumerate(movies)])
+            conn.execute("INSERT INTO lists (user_id, category, built_at) VALUES (?, ?, ?) "
+                         "ON CONFLICT(user_id) DO UPDATE SET category = excluded.category, "
+                         "built_at = excluded.built_at, building_at = NULL",
+                         (user_id, category, built_at or time.time()))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def remaining(self, user_id: str) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM candidates WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    def has_list(self, user_id: str) -> bool:
+        return self._connect().execute("SELECT 1 FROM lists WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    def invalidate(self, user_id: str) -> None:
+        """Mark a user's list out of date (their ratings or favourites changed)"""
+        self._connect().execute("UPDATE lists SET changed_at = ? WHERE user_id = ?", (time.time(), user_id))
+
+    def clear(self) -> None:
+        """Empty every user's list (the movie tables changed outside the app)"""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM candidates")
+            conn.execute("UPDATE lists SET changed_at = ?", (time.time(),))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def due(self, user_id: str) -> bool:
+        """Whether a user's list is missing, stale, old or running low"""
+        row = self._connect().execute("SELECT built_at, changed_at FROM lists WHERE user_id = ?",
+                                      (user_id,)).fetchone()
+        if not row or not row[0] or (row[1] or 0) >= row[0] or time.time() - row[0] > REFRESH_INTERVAL:
+            return True
+        return self.remaining(user_id) < LOW_WATER
+
+    def users_due(self) -> List[str]:
+        """Users whose lists the scheduled refresh should rebuild"""
+        return [user_id for (user_id,) in self._connect().execute("SELECT user_id FROM lists") if self.due(user_id)]
+
+    def _claim(self, user_id: str) -> bool:
+        """Claim a user's next build so no other worker starts the same one"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("INSERT OR IGNORE INTO lists (user_id) VALUES (?)", (user_id,))
+        return conn.execute("UPDATE lists SET building_at = ? WHERE user_id = ? AND "
+                            "(building_at IS NULL OR building_at < ?)",
+                            (now, user_id, now - BUILD_TIMEOUT)).rowcount == 1
+
+    async def rebuild(self, user_id: str, build: Builder) -> int:
+        """Build a user's list now; returns the number of candidates stored"""
+        started = time.time()
+        if not self._claim(user_id):
+            return 0
+        try:
+            movies, category = await build()
+        except Exception as e:
+            self._connect().execute("UPDATE lists SET building_at = NULL WHERE user_id = ?", (user_id,))
+            logger.error(f"Error building recommendations for {user_id}: {e}")
+            return 0
+        self.replace(user_id, movies[:QUEUE_SIZE], category, started)
+        logger.info(f"Built {len(movies[:QUEUE_SIZE])} recommendation candidates for {user_id}")
+        return len(movies[:QUEUE_SIZE])
+
+    def refresh(self, user_id: str, build: Builder) -> Future:
+        """Rebuild a user's list on the I/O loop without waiting for it"""
+        running = self._building.get(user_id)
+        if running and not running.done():
+            return running
+        future = io_loop.submit(self.rebuild(user_id, build))
+        future.add_done_callback(lambda f: f.exception() and logger.error(
+            f"Error refreshing recommendations for {user_id}: {f.exception()}"))
+        self._building[user_id] = future
+        return future
+
+    def stats(self) -> Dict:
+        conn = self._connect()
+        users, stale = conn.execute("SELECT COUNT(*), COUNT(CASE WHEN changed_at >= built_at THEN 1 END) "
+                                    "FROM lists").fetchone()
+        return {
+            'users': users,
+            'stale': stale,
+            'candidates': conn.execute("SELECT COUNT(*) FROM candidates").fetchone()[0],
+            'building': sum(1 for f in self._building.values() if not f.done())
+        }
+
+
+recommendation_queue = RecommendationQueue()
@@ -0,0 +1,165 @@
+import os
+import math
+import time
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from services.movie_catalog import movie_catalog
+
+logger = logging.getLogger(__name__)
+
+# Relative weight of each kind of feature in a movie's vector
+GENRE_WEIGHT = 1.0
+DECADE_WEIGHT = 0.5
+DIRECTOR_WEIGHT = 0.8
+
+# Relevance vs diversity when re-ranking (1.0 = pure relevance)
+MMR_LAMBDA = float(os.getenv('RECOMMENDER_DIVERSITY', '0.7'))
+
+# Catalog movies scored per recommendation, most popular first
+CANDIDATE_POOL = int(os.getenv('RECOMMENDER_POOL', '2000'))
+
+# Seconds before catalog changes too small to bump its version are picked up
+REBUILD_INTERVAL = float(os.getenv('RECOMMENDER_REBUILD_SECONDS', '600'))
+
+Vector = Dict[str, float]
+
+
+def movie_features(genre_ids: Iterable[int], year: Optional[int] = None, director: Optional[str] = None) -> Vector:
+    """Sparse unit vector of a movie's genres, decade and director(s).
+
+    Neighbouring decades get half weight so a 1999 film is still close to
+    one from 2001.
+    """
+    vector: Vector = {}
+    for genre_id in genre_ids or []:
+        vector[f"g:{genre_id}"] = GENRE_WEIGHT
+    if year:
+        decade = int(year) // 10 * 10
+        vector[f"y:{decade}"] = DECADE_WEIGHT
+        vector[f"y:{decade - 10}"] = DECADE_WEIGHT / 2
+        vector[f"y:{decade + 10}"] = DECADE_WEIGHT / 2
+    for name in (director or '').split(','):
+        if name.strip():
+            vector[f"d:{name.strip().lower()}"] = DIRECTOR_WEIGHT
+    norm = math.sqrt(sum(v * v for v in vector.values()))
+    return {k: v / norm for k, v in vector.items()} if norm else {}
+
+
+def taste_vector(rated: Iterable[Tuple[Vector, float]]) -> Vector:
+    """Weighted sum of rated movies' vectors (negative weights for dislikes), as a unit vector"""
+    taste: Vector = {}
+    for features, weight in rated:
+        for key, value in features.items():
+            taste[key] = taste.get(key, 0.0) + weight * value
+    norm = math.sqrt(sum(v * v for v in taste.values()))
+    return {k: v / norm for k, v in taste.items() if v} if norm else {}
+
+
+def cosine(a: Vector, b: Vector) -> float:
+    """Cosine similarity of two unit vectors"""
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(value * b.get(key, 0.0) for key, value in a.items())
+
+
+def mmr(candidates: List[Tuple[float, Vector, Any]], limit: int, diversity: float = MMR_LAMBDA) -> List[Any]:
+    """Maximal marginal relevance: pick items that score well but differ from those already picked"""
+    remaining = list(candidates)
+    picked: List[Tuple[float, Vector, Any]] = []
+    while remaining and len(picked) < limit:
+        best = max(remaining, key=lambda c: diversity * c[0] - (1 - diversity) * max(
+            (cosine(c[1], p[1]) for p in picked), default=0.0))
+        remaining.remove(best)
+        picked.append(best)
+    return [item for _, _, item in picked]
+
+
+class CatalogFeatures:
+    """Feature vectors for the catalog's scoring pool, built once per catalog version.
+
+    The vectors are also laid out as one dense NumPy matrix (a column per
+    feature), so scoring a taste is a single matrix-vector product.
+    """
+
+    def __init__(self, movies: List[Dict[str, Any]], version: int, pending: int = 0):
+        self.movies = movies
+        self.version = version
+        self.pending = pending
+        self.built_at = time.monotonic()
+        self.vectors = [movie_features(m.get('genre_ids'), _year(m), m.get('director')) for m in movies]
+        # Small popularity nudge so ties go to well-known films
+        top_popularity = max((m.get('popularity') or 0 for m in movies), default=0) or 1
+        self.boosts = [0.05 * math.log1p(m.get('popularity') or 0) / math.log1p(top_popularity) for m in movies]
+        self.columns: Dict[str, int] = {}
+        for vector in self.vectors:
+            for key in vector:
+                self.columns.setdefault(key, len(self.columns))
+        self.matrix = np.zeros((len(self.vectors), len(self.columns)), dtype=np.float32)
+        for row, vector in enumerate(self.vectors):
+            for key, value in vector.items():
+                self.matrix[row, self.columns[key]] = value
+
+    def scores(self, taste: Vector) -> List[float]:
+        """Cosine similarity of the taste vector to every movie in the pool"""
+        dense = np.zeros(len(self.columns), dtype=np.float32)
+        for key, value in taste.items():
+            column = self.columns.get(key)
+            if column is not None:
+                dense[column] = value
+        return (self.matrix @ dense).tolist()
+
+
+def _year(movie: Dict[str, Any]) -> Optional[int]:
+    year = (movie.get('release_date') or '')[:4]
+    return int(year) if year.isdigit() else None
+
+
+class ContentRecommender:
+    """Recommends catalog movies by similarity to a user's taste.
+
+    Every movie in the local catalog with known genres is a vector of
+    genre, decade and director features; a user's taste is the weighted
+    sum of the vectors of the movies they rated or favourited. Candidates
+    are scored by cosine similarity, nudged by popularity so ties go to
+    well-known films, and the top of the list is re-ranked with MMR so the
+    picks aren't five films from the same director. The catalog's vectors
+    are built once and only rebuilt when its version changes. No network
+    calls.
+    """
+
+    def __init__(self, catalog=movie_catalog, pool: int = CANDIDATE_POOL, diversity: float = MMR_LAMBDA):
+        self.catalog = catalog
+        self.pool = pool
+        self.diversity = diversity
+        self._features: Optional[CatalogFeatures] = None
+
+    def features(self) -> CatalogFeatures:
+        """The pool's feature vectors, rebuilt if the catalog's version moved since they were built.
+
+        Smaller changes that haven't bumped the version are picked up once
+        the vectors are REBUILD_INTERVAL old.
+        """
+        version, pending = self.catalog.version(), self.catalog.pending()
+        features = self._features
+        if features is None or features.version != version or (
+                features.pending != pending and time.monotonic() - features.built_at >= REBUILD_INTERVAL):
+            features = CatalogFeatures(self.catalog.enriched(self.pool), version, pending)
+            self._features = features
+        return features
+
+    def recommend(self, taste: Vector, limit: int = 5,
+                  exclude: Optional[Callable[[Dict[str, Any]], bool]] = None) -> List[Dict[str, Any]]:
+        if not taste:
+            return []
+        features = self.features()
+        ranked = sorted(
+            ((score + boost, vector, m) for score, boost, vector, m in
+             zip(features.scores(taste), features.boosts, features.vectors, features.movies)
+             if score > 0 and not (exclude and exclude(m))),
+            key=lambda c: c[0], reverse=True)
+        # Copies, so callers can't change the cached pool
+        return [dict(m) for m in mmr(ranked[:limit * 10], limit, self.diversity)]
+
+
+content_recommender = ContentRecommender()
@@ -0,0 +1,210 @@
+import os
+import re
+import json
+import math
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+from services.local_store import data_dir, safe_key
+
+logger = logging.getLogger(__name__)
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can', 'could', 'did', 'do',
+    'does', 'for', 'from', 'had', 'has', 'have', 'he', 'her', 'his', 'how', 'i', 'if', 'in',
+    'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or', 'our', 'she', 'so', 'that', 'the',
+    'their', 'them', 'then', 'there', 'they', 'this', 'to', 'was', 'we', 'were', 'what',
+    'when', 'where', 'which', 'who', 'will', 'with', 'would', 'you', 'your'
+}
+
+# Collapse common synonyms so "film" finds turns that said "movie"
+SYNONYMS = {'film': 'movie', 'flick': 'movie', 'rota': 'shift', 'train': 'rail'}
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase, drop stopwords and apply a light suffix stemmer"""
+    tokens = []
+    for token in TOKEN_RE.findall((text or '').lower()):
+        if token in STOPWORDS:
+            continue
+        for suffix in ('ing', 'ed', 's'):
+            if len(token) > len(suffix) + 2 and token.endswith(suffix):
+                token = token[:-len(suffix)]
+                break
+        tokens.append(SYNONYMS.get(token, token))
+    return tokens
+
+
+class _UserIndex:
+    """In-memory BM25 postings for one user's turns"""
+
+    def __init__(self):
+        self.docs: List[Dict] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, Dict[int, int]] = {}
+        self.total_length = 0
+        self.file_offset = 0
+        # (inode, mtime) of the file the postings were read from
+        self.file_id: Optional[tuple] = None
+
+    def add(self, doc: Dict) -> None:
+        doc_id = len(self.docs)
+        terms = Counter(tokenize(f"{doc.get('b', '')} {doc.get('r', '')}"))
+        self.docs.append(doc)
+        self.lengths.append(sum(terms.values()))
+        self.total_length += self.lengths[-1]
+        for term, tf in terms.items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+
+
+class RelevanceIndex:
+    """Per-user BM25 inverted index over conversation Body/Response text.
+
+    Each user's turns are kept in an append-only JSON lines file of compact
+    records; postings are built in memory on first use and extended
+    incrementally as new turns are written, by this worker or another one.
+    """
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._indexes: Dict[str, _UserIndex] = {}
+
+    @property
+    def storage_dir(self) -> str:
+        return data_dir('relevance')
+
+    def has_user(self, user_id: str) -> bool:
+        return os.path.exists(self._index_path(user_id))
+
+    def drop(self, user_id: str) -> None:
+        """Delete a user's index so it is backfilled again from their history"""
+        self._indexes.pop(user_id, None)
+        try:
+            os.remove(self._index_path(user_id))
+        except FileNotFoundError:
+            pass
+
+    def backfill(self, user_id: str, records: List[Dict]) -> None:
+        """Create a user's index from their existing Conversations records"""
+        with self.backfill_writer(user_id) as write:
+            for record in sorted(records, key=lambda r: r.get('createdTime', '')):
+                write(record)
+
+    @contextmanager
+    def backfill_writer(self, user_id: str) -> Iterator[Callable[[Dict], None]]:
+        """Build a user's index from records passed in oldest first.
+
+        The file is written aside and only replaces the index once the block
+        exits cleanly, so a scan that fails part way leaves no partial index.
+        """
+        os.makedirs(self.storage_dir, exist_ok=True)
+        path = self._index_path(user_id)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                yield lambda record: f.write(json.dumps(self._compact(record)) + '\n')
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        self._indexes.pop(user_id, None)
+
+    def add(self, user_id: str, record: Dict) -> None:
+        """Append a newly stored turn to an existing user index"""
+        if not self.has_user(user_id):
+            return
+        try:
+            with open(self._index_path(user_id), 'a') as f:
+                f.write(json.dumps(self._compact(record)) + '\n')
+            self._load(user_id)
+        except Exception as e:
+            logger.error(f"Error adding turn to relevance index: {e}")
+
+    def search(self, user_id: str, query: str, k: int = 5) -> List[Dict]:
+        """Return the k past turns most relevant to the query, best first"""
+        index = self._load(user_id)
+        terms = set(tokenize(query))
+        if not index.docs or not terms:
+            return []
+
+        n_docs = len(index.docs)
+        avg_length = index.total_length / n_docs or 1
+        scores: Dict[int, float] = {}
+        for term in terms:
+            postings = index.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n_docs - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = self.k1 * (1 - self.b + self.b * index.lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        best = sorted(scores.items(), key=lambda x: (x[1], x[0]), reverse=True)[:k]
+        return [self._expand(index.docs[doc_id]) for doc_id, _ in best]
+
+    def recent(self, user_id: str, limit: int = 5) -> List[Dict]:
+        """Return the user's latest indexed turns, newest first"""
+        index = self._load(user_id)
+        return [self._expand(doc) for doc in reversed(index.docs[-limit:])]
+
+    def _load(self, user_id: str) -> _UserIndex:
+        """Get the user's postings, reading any turns appended since last load"""
+        index = self._indexes.setdefault(user_id, _UserIndex())
+        path = self._index_path(user_id)
+        try:
+            stat = os.stat(path)
+            if index.file_id and (stat.st_ino != index.file_id[0] or stat.st_size < index.file_offset
+                                  or (stat.st_size == index.file_offset and stat.st_mtime_ns != index.file_id[1])):
+                # Rebuilt by another worker since we loaded it
+                index = self._indexes[user_id] = _UserIndex()
+            if stat.st_size > index.file_offset:
+                try:
+                    self._read(index, path)
+                except json.JSONDecodeError:
+                    # Our offset fell mid-line in a rebuilt file that kept the inode
+                    index = self._indexes[user_id] = _UserIndex()
+                    self._read(index, path)
+        except FileNotFoundError:
+            index = self._indexes[user_id] = _UserIndex()
+        except Exception as e:
+            logger.error(f"Error loading relevance index: {e}")
+        return index
+
+    def _read(self, index: _UserIndex, path: str) -> None:
+        """Add the complete lines after the index's offset and note which file they came from"""
+        with open(path) as f:
+            f.seek(index.file_offset)
+            for line in f:
+                if line.endswith('\n'):
+                    index.add(json.loads(line))
+                    index.file_offset += len(line.encode('utf-8'))
+            stat = os.fstat(f.fileno())
+            index.file_id = (stat.st_ino, stat.st_mtime_ns)
+
+    def _index_path(self, user_id: str) -> str:
+        return os.path.join(self.storage_dir, f"{safe_key(user_id)}.jsonl")
+
+    def _compact(self, record: Dict) -> Dict:
+        fields = record.get('fields', {})
+        return {
+            'i': record.get('id'),
+            't': record.get('createdTime'),
+            'b': fields.get('Body', ''),
+            'r': fields.get('Response', ''),
+            'n': fields.get('Intent', '')
+        }
+
+    def _expand(self, doc: Dict) -> Dict:
+        """Turn a compact record back into the Conversations record shape"""
+        return {
+            'id': doc.get('i'),
+            'createdTime': doc.get('t'),
+            'fields': {'Body': doc.get('b', ''), 'Response': doc.get('r', ''), 'Intent': doc.get('n', '')}
+        }
+
+
+relevance_index = RelevanceIndex()
@@ -0,0 +1,369 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from services.airtable_client import AirtableError, AirtableTable, io_loop
+from services.airtable_query import Query, modified_after
+from services.schema_registry import schema_registry
+from services.storage import StorageTable
+from services.write_behind import get_buffer
+from services.local_store import data_dir, safe_key
+
+logger = logging.getLogger(__name__)
+
+# Seconds between incremental syncs, and hours between full resyncs that
+# also pick up records deleted directly in Airtable
+SYNC_SECONDS = float(os.getenv('REPLICA_SYNC_SECONDS', '30'))
+FULL_SYNC_HOURS = float(os.getenv('REPLICA_FULL_SYNC_HOURS', '6'))
+
+# Re-read a little before the last cursor to allow for clock skew
+SYNC_OVERLAP = timedelta(minutes=2)
+
+OPERATORS = {'=', '>=', '<=', '>', '<', '!='}
+
+
+class ReplicatedTable(StorageTable):
+    """A local SQLite copy of one Airtable table.
+
+    Reads are answered locally; a stale replica is refreshed in the
+    background with an incremental LAST_MODIFIED_TIME() fetch, and only a
+    replica that has never synced makes the caller wait. Writes go to
+    Airtable first and are then applied locally, so our own changes are
+    visible immediately to every worker.
+    """
+
+    def __init__(self, replica: 'AirtableReplica', table: AirtableTable, indexed: Sequence[str],
+                 fields: Optional[Sequence[str]] = None):
+        self.replica = replica
+        self.remote = table
+        self.indexed = list(indexed)
+        # Fields the app reads from this table; None replicates every field
+        self.fields = list(fields) if fields else None
+        self.declared = list(fields or [])
+        self.name = f"t_{safe_key(table.table_name)}"
+        self._columns = {field: f"f_{safe_key(field)}" for field in self.indexed}
+        self._sync_future = None
+        self._lock = threading.Lock()
+        self._ready_path: Optional[str] = None
+
+    @property
+    def table_name(self) -> str:
+        return self.remote.table_name
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = self.replica.connection()
+        if self._ready_path != self.replica.path:
+            existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({self.name})")}
+            if existing and not set(self._columns.values()) <= existing:
+                # New indexed fields: rebuild the replica with a full sync
+                conn.execute(f"DROP TABLE {self.name}")
+                conn.execute("DELETE FROM sync_state WHERE tbl = ?", (self.name,))
+            columns = ''.join(f", {column} TEXT COLLATE NOCASE" for column in self._columns.values())
+            conn.execute(f"CREATE TABLE IF NOT EXISTS {self.name} "
+                         f"(id TEXT PRIMARY KEY, created_time TEXT, fields TEXT{columns})")
+            for column in self._columns.values():
+                conn.execute(f"CREATE INDEX IF NOT EXISTS ix_{self.name}_{column} ON {self.name} ({column})")
+            conn.commit()
+            self._ready_path = self.replica.path
+        return conn
+
+    def _state(self) -> Optional[sqlite3.Row]:
+        return self._connect().execute(
+            "SELECT cursor, synced_at, full_at FROM sync_state WHERE tbl = ?", (self.name,)).fetchone()
+
+    async def refresh(self) -> None:
+        """Sync if stale; wait only if the replica has never been synced"""
+        state = self._state()
+        now = time.time()
+        if state and now - state['synced_at'] < SYNC_SECONDS:
+            return
+        full = not state or now - state['full_at'] > FULL_SYNC_HOURS * 3600
+        with self._lock:
+            if self._sync_future is None or self._sync_future.done():
+                self._sync_future = io_loop.submit(self.sync(full))
+            future = self._sync_future
+        if not state:
+            await asyncio.wrap_future(future)
+
+    async def sync(self, full: bool = False) -> int:
+        """Pull records changed since the last sync (or everything) into the replica.
+
+        Pages are applied as they arrive, so a full sync of a large table
+        holds one page in memory rather than the whole table.
+        """
+        started = datetime.utcnow()
+        cursor = (started - SYNC_OVERLAP).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+        state = None if full else self._state()
+        if not (state and state['cursor']):
+            full = True
+        count = 0
+        seen = set()
+        try:
+            async for page in self._fetch(None if full else state['cursor']):
+                conn = self._connect()
+                with conn:
+                    self._upsert(conn, page)
+                count += len(page)
+                if full:
+                    seen.update(r['id'] for r in page)
+        except Exception as e:
+            logger.error(f"Error syncing {self.table_name} replica: {e}")
+            raise
+
+        conn = self._connect()
+        with conn:
+            if full:
+                # Drop rows deleted in Airtable, but not ones we created while the sync ran
+                stale = [(row['id'],) for row in conn.execute(
+                    f"SELECT id FROM {self.name} WHERE created_time < ?", (cursor,)) if row['id'] not in seen]
+                conn.executemany(f"DELETE FROM {self.name} WHERE id = ?", stale)
+            now = time.time()
+            full_at = now if full else state['full_at']
+            conn.execute("INSERT OR REPLACE INTO sync_state (tbl, cursor, synced_at, full_at) VALUES (?, ?, ?, ?)",
+                         (self.name, cursor, now, full_at))
+        logger.info(f"Synced {count} {self.table_name} records ({'full' if full else 'incremental'})")
+        return count
+
+    async def _fetch(self, since: Optional[str]) -> AsyncIterator[List[Dict]]:
+        """Stream records in full pages, projected to the fields we use"""
+        query = Query(self.remote)
+        if since:
+            query.where_formula(modified_after(since))
+        if self.fields:
+            # Only project onto fields this base actually has
+            known = await schema_registry.field_names(self.remote, expected=self.fields)
+            query.select(*[name for name in self.fields if not known or name in known])
+        try:
+            async for page in query.pages():
+                yield page
+        except AirtableError as e:
+            if not self.fields or e.error_type != 'UNKNOWN_FIELD_NAME':
+                raise
+            # A declared field doesn't exist in this base; replicate everything instead
+            logger.warning(f"Dropping field projection for {self.table_name}: {e}")
+            schema_registry.invalidate(self.remote)
+            self.fields = None
+            async for page in query.select().pages():
+                yield page
+
+    def _column(self, field: str) -> str:
+        if field == 'createdTime':
+            return 'created_time'
+        if field in self._columns:
+            return self._columns[field]
+        return f"json_extract(fields, '$.\"{field.replace(chr(39), chr(39) * 2)}\"')"
+
+    def _query(self, where: Optional[Dict[str, Any]], order_by: Optional[str],
+               descending: bool, limit: Optional[int]) -> tuple:
+        clauses, params = [], []
+        for field, condition in (where or {}).items():
+            op, value = condition if isinstance(condition, tuple) else ('=', condition)
+            if op not in OPERATORS:
+                raise ValueError(f"Unsupported operator: {op}")
+            clauses.append(f"{self._column(field)} {op} ?")
+            params.append(value)
+        sql = f"SELECT id, created_time, fields FROM {self.name}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        direction = 'DESC' if descending else 'ASC'
+        sql += f" ORDER BY {self._column(order_by or 'createdTime')} {direction}, rowid {direction}"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return sql, params
+
+    def _record(self, row: sqlite3.Row) -> Dict:
+        return {'id': row['id'], 'createdTime': row['created_time'], 'fields': json.loads(row['fields'])}
+
+    async def select(self, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+                     descending: bool = False, limit: Optional[int] = None) -> List[Dict]:
+        """Query the replica, returning records in the Airtable shape.
+
+        where maps field names to a value (equality) or an (operator, value)
+        tuple; indexed fields are matched case-insensitively.
+        """
+        await self.refresh()
+        sql, params = self._query(where, order_by, descending, limit)
+        return [self._record(row) for row in self._connect().execute(sql, params).fetchall()]
+
+    async def stream(self, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+                     descending: bool = False, batch_size: int = 100) -> AsyncIterator[Dict]:
+        """Yield matching records, reading batch_size rows at a time.
+
+        The rows come from one read snapshot on a connection of their own,
+        so writes made while the caller is still iterating don't shift it.
+        """
+        await self.refresh()
+        self._connect()
+        sql, params = self._query(where, order_by, descending, None)
+        conn = self.replica.reader()
+        try:
+            cursor = conn.execute(sql, params)
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for row in rows:
+                    yield self._record(row)
+        finally:
+            conn.close()
+
+    def upsert(self, records: List[Dict]) -> None:
+        """Apply records we have written (or fetched) to the replica"""
+        conn = self._connect()
+        with conn:
+            self._upsert(conn, records)
+
+    def remove(self, record_ids: List[str]) -> None:
+        conn = self._connect()
+        with conn:
+            conn.executemany(f"DELETE FROM {self.name} WHERE id = ?", [(i,) for i in record_ids])
+
+    def _upsert(self, conn: sqlite3.Connection, records: List[Dict]) -> None:
+        columns = ''.join(f", {column}" for column in self._columns.values())
+        placeholders = ', ?' * len(self._columns)
+        conn.executemany(
+            f"INSERT OR REPLACE INTO {self.name} (id, created_time, fields{columns}) VALUES (?, ?, ?{placeholders})",
+            [(r['id'], r.get('createdTime'), json.dumps(r.get('fields', {})),
+              *[self._index_value(r.get('fields', {}).get(field)) for field in self._columns])
+             for r in records])
+
+    def _index_value(self, value: Any) -> Optional[str]:
+        if value is None:
+            return None
+        return value if isinstance(value, str) else json.dumps(value)
+
+    async def create(self, fields: Dict[str, Any], typecast: bool = False) -> Dict:
+        record = await self.remote.create(fields, typecast)
+        self.upsert([record])
+        return record
+
+    async def batch_create(self, records: List[Dict[str, Any]], typecast: bool = False) -> List[Dict]:
+        created = await self.remote.batch_create(records, typecast)
+        self.upsert(created)
+        return created
+
+    async def update(self, record_id: str, fields: Dict[str, Any], typecast: bool = False) -> Dict:
+        record = await self.remote.update(record_id, fields, typecast)
+        self.upsert([record])
+        return record
+
+    async def batch_update(self, records: List[Dict[str, Any]], typecast: bool = False) -> List[Dict]:
+        updated = await self.remote.batch_update(records, typecast)
+        self.upsert(updated)
+        return updated
+
+    async def delete(self, record_id: str) -> Dict:
+        result = await self.remote.delete(record_id)
+        self.remove([record_id])
+        return result
+
+    async def batch_delete(self, record_ids: List[str]) -> None:
+        await self.remote.batch_delete(record_ids)
+        self.remove(record_ids)
+
+    async def field_names(self) -> List[str]:
+        return await schema_registry.field_names(self.remote, expected=self.declared)
+
+    def append(self, fields: Dict[str, Any], max_age: float = 5.0) -> None:
+        """Queue a row for a batched write; it reaches the replica once flushed"""
+        self._write_log(max_age).enqueue(fields)
+
+    def pending_writes(self) -> Dict:
+        return self._write_log().stats()
+
+    def _write_log(self, max_age: float = 5.0):
+        return get_buffer(self.table_name, safe_key(self.table_name).lower(), max_age, on_flush=self.upsert)
+
+
+class AirtableReplica:
+    """Shared SQLite database holding replicas of the Airtable tables we read.
+
+    The database lives under SMS_DATA_DIR and is opened in WAL mode so all
+    gunicorn workers on the host read and write the same replica.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._tables: Dict[tuple, ReplicatedTable] = {}
+
+    @property
+    def path(self) -> str:
+        return data_dir('replica.sqlite3')
+
+    def connection(self) -> sqlite3.Connection:
+        """This thread's connection to the replica database"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS sync_state "
+                         "(tbl TEXT PRIMARY KEY, cursor TEXT, synced_at REAL, full_at REAL)")
+            conn.commit()
+            self._local.conn = conn
+            self._local.path = self.path
+        return conn
+
+    def reader(self) -> sqlite3.Connection:
+        """A new connection for a long-running read; the caller closes it"""
+        conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _local_tables(self, table_name: Optional[str]) -> List[str]:
+        """Replica tables for an Airtable table name, or all of them when it is None"""
+        conn = self.connection()
+        names = [row['name'] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name LIKE 't\\_%' ESCAPE '\\'")]
+        if table_name is None:
+            return names
+        return [name for name in names if name == f"t_{safe_key(table_name)}"]
+
+    def records(self, table_name: Optional[str], record_ids: List[str]) -> List[Dict]:
+        """Look up replicated records by id, without syncing"""
+        found = []
+        conn = self.connection()
+        for name in self._local_tables(table_name):
+            for record_id in record_ids:
+                row = conn.execute(f"SELECT id, created_time, fields FROM {name} WHERE id = ?", (record_id,)).fetchone()
+                if row:
+                    found.append({'id': row['id'], 'createdTime': row['created_time'], 'fields': json.loads(row['fields'])})
+        return found
+
+    def remove_records(self, table_name: Optional[str], record_ids: List[str]) -> None:
+        """Drop records deleted in Airtable from the replica"""
+        conn = self.connection()
+        with conn:
+            for name in self._local_tables(table_name):
+                conn.executemany(f"DELETE FROM {name} WHERE id = ?", [(i,) for i in record_ids])
+
+    def mark_stale(self, table_name: Optional[str] = None) -> None:
+        """Make every worker's next read of a table (or all tables) start a sync"""
+        conn = self.connection()
+        with conn:
+            for name in self._local_tables(table_name):
+                conn.execute("UPDATE sync_state SET synced_at = 0 WHERE tbl = ?", (name,))
+
+    def loaded(self, table_name: str) -> List[ReplicatedTable]:
+        """Replicas of a table already opened by this worker"""
+        return [t for (_, name), t in self._tables.items() if name == table_name]
+
+    def table(self, table: AirtableTable, indexed: Sequence[str] = (),
+              fields: Optional[Sequence[str]] = None) -> ReplicatedTable:
+        """Get the replica of an Airtable table, indexing the given fields"""
+        key = (table.client.base_id, table.table_name)
+        if key not in self._tables:
+            self._tables[key] = ReplicatedTable(self, table, indexed, fields)
+        replicated = self._tables[key]
+        replicated.remote = table
+        return replicated
+
+
+replica = AirtableReplica()
@@ -0,0 +1,148 @@
+import os
+import time
+import logging
+from typing import Dict, List, Optional, Sequence
+from services.airtable_client import AirtableError, AirtableTable
+from services.local_store import JsonRecordStore
+
+logger = logging.getLogger(__name__)
+
+# Records sampled per table when the metadata API isn't available
+PROBE_RECORDS = 10
+
+
+def _empty_schema() -> Dict:
+    return {'tables': {}, 'ids': {}, 'loaded_at': {}, 'metadata_available': None, 'metadata_checked_at': 0,
+            'checked': {}}
+
+
+class SchemaRegistry:
+    """Cached field names for each table of an Airtable base.
+
+    Schemas come from the metadata API when the token has the
+    schema.bases:read scope, otherwise from one probe of a few records per
+    table. A probe can't see fields that are empty on every sampled record
+    (Airtable leaves them out), so fields a caller expects are confirmed
+    with an explicit fields[] request instead. Schemas are kept on local
+    disk so every worker shares them, and reloaded after
+    AIRTABLE_SCHEMA_TTL seconds.
+    """
+
+    def __init__(self, ttl: Optional[float] = None):
+        self.ttl = ttl if ttl is not None else float(os.getenv('AIRTABLE_SCHEMA_TTL', '3600'))
+        self.store = JsonRecordStore('schema', _empty_schema)
+
+    async def field_names(self, table: AirtableTable, expected: Optional[Sequence[str]] = None) -> List[str]:
+        """The table's field names, loading them if missing or expired.
+
+        expected names the fields the caller reads or writes; when the
+        schema came from a probe, any of them the probe didn't see are
+        checked directly rather than assumed missing.
+        """
+        fields = await self._field_names(table)
+        schema = self.store.get(table.client.base_id)
+        checked = schema.setdefault('checked', {}).get(table.table_name, [])
+        unseen = [name for name in expected or [] if name not in fields and name not in checked]
+        if not unseen or schema['metadata_available'] is not False:
+            return fields
+        try:
+            confirmed = await self._confirm(table, unseen)
+        except Exception as e:
+            logger.error(f"Error checking fields of {table.table_name}: {e}")
+            return fields
+        fields = fields + confirmed
+        schema['tables'][table.table_name] = fields
+        schema['checked'][table.table_name] = checked + unseen
+        self.store.save(table.client.base_id, schema)
+        return fields
+
+    async def _field_names(self, table: AirtableTable) -> List[str]:
+        base_id = table.client.base_id
+        schema = self.store.get(base_id)
+        now = time.time()
+        if table.table_name in schema['tables'] and now - schema['loaded_at'].get(table.table_name, 0) < self.ttl:
+            return schema['tables'][table.table_name]
+
+        try:
+            tables = None
+            if schema['metadata_available'] is not False or now - schema['metadata_checked_at'] > self.ttl:
+                tables = await self._load_metadata(table)
+                schema['metadata_available'] = tables is not None
+                schema['metadata_checked_at'] = now
+                if tables is not None:
+                    schema['ids'] = {name: table_id for name, (table_id, _) in tables.items()}
+                    tables = {name: fields for name, (_, fields) in tables.items()}
+            if tables is None or table.table_name not in tables:
+                tables = dict(tables or {}, **{table.table_name: await self._probe(table)})
+            for name, fields in tables.items():
+                schema['tables'][name] = fields
+                schema['loaded_at'][name] = now
+                schema.setdefault('checked', {}).pop(name, None)
+            self.store.save(base_id, schema)
+            return tables[table.table_name]
+        except Exception as e:
+            logger.error(f"Error loading schema for {table.table_name}: {e}")
+            return schema['tables'].get(table.table_name, [])
+
+    async def has_field(self, table: AirtableTable, name: str) -> bool:
+        return name in await self.field_names(table)
+
+    async def pick(self, table: AirtableTable, *candidates: str) -> Optional[str]:
+        """The first candidate field name the table actually has"""
+        fields = await self.field_names(table)
+        return next((name for name in candidates if name in fields), None)
+
+    def invalidate(self, table: AirtableTable) -> None:
+        """Forget a table's schema so the next lookup reloads it"""
+        schema = self.store.get(table.client.base_id)
+        schema['tables'].pop(table.table_name, None)
+        schema['loaded_at'].pop(table.table_name, None)
+        schema.setdefault('checked', {}).pop(table.table_name, None)
+        self.store.save(table.client.base_id, schema)
+
+    async def table_names_by_id(self, table: AirtableTable) -> Dict[str, str]:
+        """Map Airtable table ids (tbl...) to names; empty without the metadata scope"""
+        schema = self.store.get(table.client.base_id)
+        if not schema['ids'] and schema['metadata_available'] is not False:
+            self.invalidate(table)
+            await self.field_names(table)
+            schema = self.store.get(table.client.base_id)
+        return {table_id: name for name, table_id in schema['ids'].items()}
+
+    async def _load_metadata(self, table: AirtableTable) -> Optional[Dict[str, tuple]]:
+        """Every table's id and fields in one metadata API call, or None without the scope"""
+        try:
+            data = await table.client.request('GET', f"meta/bases/{table.client.base_id}/tables")
+        except AirtableError as e:
+            if e.status in (401, 403, 404):
+                logger.info(f"Airtable metadata API unavailable ({e}) - probing records instead")
+                return None
+            raise
+        return {t['name']: (t.get('id'), [f['name'] for f in t.get('fields', [])]) for t in data.get('tables', [])}
+
+    async def _probe(self, table: AirtableTable) -> List[str]:
+        """Field names seen on a sample of records (empty fields are omitted by Airtable)"""
+        records = await table.all(max_records=PROBE_RECORDS)
+        fields: List[str] = []
+        for record in records:
+            fields.extend(name for name in record.get('fields', {}) if name not in fields)
+        return fields
+
+    async def _confirm(self, table: AirtableTable, names: List[str]) -> List[str]:
+        """Which of the names the table has: Airtable rejects a fields[] list naming an unknown field"""
+        names = list(names)
+        while names:
+            try:
+                await table.all(fields=names, max_records=1)
+                return names
+            except AirtableError as e:
+                if e.error_type != 'UNKNOWN_FIELD_NAME':
+                    raise
+                unknown = next((name for name in names if f'"{name}"' in str(e)), None)
+                if unknown is None:
+                    return []
+                names.remove(unknown)
+        return names
+
+
+schema_registry = SchemaRegistry()
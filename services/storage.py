@@ -0,0 +1,454 @@
+import os
+import json
+import uuid
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence
+from sqlalchemy import Column, Float, Index, MetaData, String, Table, Text, create_engine, event, func, inspect, select, text
+from services.local_store import data_dir
+
+logger = logging.getLogger(__name__)
+
+
+class StorageTable(ABC):
+    """One table of application data, with records in the Airtable shape.
+
+    Records are dicts of {'id', 'createdTime', 'fields'} keyed by Airtable
+    field names, so handlers work unchanged whichever backend holds them.
+    """
+
+    table_name: str
+
+    @abstractmethod
+    async def select(self, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+                     descending: bool = False, limit: Optional[int] = None) -> List[Dict]:
+        """Query records; where maps fields to a value or an (operator, value) tuple"""
+
+    @abstractmethod
+    def stream(self, where: Optional[Dict[str, Any]] = None, order_by: Optional[str] = None,
+               descending: bool = False, batch_size: int = 100) -> AsyncIterator[Dict]:
+        """Yield matching records in order, reading batch_size at a time.
+
+        Use this instead of select() for scans that may be large or can stop
+        early: only one batch is held in memory and nothing past the point
+        where the caller breaks out is read.
+        """
+
+    @abstractmethod
+    async def create(self, fields: Dict[str, Any]) -> Dict:
+        pass
+
+    @abstractmethod
+    async def batch_create(self, records: List[Dict[str, Any]]) -> List[Dict]:
+        pass
+
+    @abstractmethod
+    async def update(self, record_id: str, fields: Dict[str, Any]) -> Dict:
+        pass
+
+    @abstractmethod
+    async def batch_update(self, records: List[Dict[str, Any]]) -> List[Dict]:
+        """Update several records, each given as {'id', 'fields'}"""
+
+    @abstractmethod
+    async def delete(self, record_id: str) -> Dict:
+        pass
+
+    @abstractmethod
+    async def batch_delete(self, record_ids: List[str]) -> None:
+        pass
+
+    @abstractmethod
+    async def field_names(self) -> List[str]:
+        """Field names the table has"""
+
+    @abstractmethod
+    def append(self, fields: Dict[str, Any], max_age: float = 5.0) -> None:
+        """Add a row to an append-only log table; the write may be deferred"""
+
+    @abstractmethod
+    def pending_writes(self) -> Dict:
+        """Stats for writes that have been accepted but not yet persisted remotely"""
+
+
+# Column layout for each logical table: Airtable field name -> (column, type)
+SQL_SCHEMAS = {
+    'conversations': {
+        'From': ('from_number', 'text'),
+        'Body': ('body', 'long_text'),
+        'Response': ('response', 'long_text'),
+        'Intent': ('intent', 'text')
+    },
+    'shifts': {
+        'ID': ('shift_ref', 'text'),
+        'Date': ('date', 'text'),
+        'Start Time': ('start_time', 'text'),
+        'End Time': ('end_time', 'text'),
+        'Status': ('status', 'text'),
+        'Notes': ('notes', 'long_text')
+    },
+    'movies_watched': {
+        'Title': ('title', 'text'),
+        'Date Watched': ('date_watched', 'text'),
+        'Date Recommended': ('date_recommended', 'text'),
+        'User Rating': ('user_rating', 'number'),
+        'TMDB_ID': ('tmdb_id', 'text'),
+        'Genre IDs': ('genre_ids', 'text'),
+        'Year': ('year', 'text'),
+        'Director': ('director', 'text')
+    },
+    'movie_favorites': {
+        'TMDB_ID': ('tmdb_id', 'text'),
+        'Title': ('title', 'text'),
+        'Genres': ('genres', 'text'),
+        'Director': ('director', 'text'),
+        'Genre IDs': ('genre_ids', 'text'),
+        'Year': ('year', 'text')
+    }
+}
+
+
+class SQLTable(StorageTable):
+    """A table stored through SQLAlchemy, optionally mirrored to Airtable.
+
+    Indexed text fields match case-insensitively (via lower() expression
+    indexes) to behave like the replica. Fields without a column are kept
+    in a JSON 'extra' column and filtered in Python.
+    """
+
+    def __init__(self, storage: 'SQLStorage', kind: str, table_name: str, indexed: Sequence[str]):
+        self.storage = storage
+        self.kind = kind
+        self.table_name = table_name
+        self.schema = SQL_SCHEMAS[kind]
+        self.indexed = [f for f in indexed if f in self.schema]
+        types = {'text': lambda: String(255), 'long_text': Text, 'number': Float}
+        columns = [Column(column, types[kind_]()) for column, kind_ in self.schema.values()]
+        self.table = Table(
+            kind, storage.metadata,
+            Column('id', String(32), primary_key=True),
+            Column('airtable_id', String(32), unique=True),
+            Column('created_time', String(32), index=True),
+            *columns,
+            Column('extra', Text)
+        )
+        for field in self.indexed:
+            column = self.table.c[self.schema[field][0]]
+            Index(f"ix_{kind}_{column.name}_lower", func.lower(column))
+        self._mirror = None
+
+    def _record(self, row) -> Dict:
+        fields = json.loads(row.extra) if row.extra else {}
+        for field, (column, _) in self.schema.items():
+            value = getattr(row, column)
+            if value is not None:
+                fields[field] = value
+        return {'id': row.id, 'createdTime': row.created_time, 'fields': fields}
+
+    def _row(self, fields: Dict[str, Any]) -> Dict:
+        row = {column: fields.get(field) for field, (column, _) in self.schema.items()}
+        extra = {k: v for k, v in fields.items() if k not in self.schema}
+        row['extra'] = json.dumps(extra) if extra else None
+        return row
+
+    def _condition(self, field: str, op: str, value: Any):
+        if field == 'createdTime':
+            column = self.table.c.created_time
+        else:
+            column = self.table.c[self.schema[field][0]]
+        if field in self.indexed and isinstance(value, str):
+            column, value = func.lower(column), value.lower()
+        return {'=': column == value, '!=': column != value, '>': column > value,
+                '>=': column >= value, '<': column < value, '<=': column <= value}[op]
+
+    def _query(self, where: Optional[Dict[str, Any]], order_by: Optional[str], descending: bool):
+        """Build the SQL query; filters on fields without a column are returned for Python"""
+        query = select(self.table)
+        python_filters = []
+        for field, condition in (where or {}).items():
+            op, value = condition if isinstance(condition, tuple) else ('=', condition)
+            if field in self.schema or field == 'createdTime':
+                query = query.where(self._condition(field, op, value))
+            else:
+                python_filters.append((field, op, value))
+
+        if order_by in self.schema:
+            order = self.table.c[self.schema[order_by][0]]
+        else:
+            order = self.table.c.created_time
+        if descending:
+            query = query.order_by(order.desc(), self.table.c.id.desc())
+        else:
+            query = query.order_by(order.asc(), self.table.c.id.asc())
+        return query, python_filters
+
+    def _filter(self, records: List[Dict], python_filters: List[tuple]) -> List[Dict]:
+        if not python_filters:
+            return records
+        return [r for r in records if all(_compare(r['fields'].get(f), op, v) for f, op, v in python_filters)]
+
+    def _select(self, where: Optional[Dict[str, Any]], order_by: Optional[str],
+                descending: bool, limit: Optional[int]) -> List[Dict]:
+        query, python_filters = self._query(where, order_by, descending)
+        if limit and not python_filters:
+            query = query.limit(limit)
+        with self.storage.engine.connect() as conn:
+            records = self._filter([self._record(row) for row in conn.execute(query)], python_filters)
+        return records[:limit] if limit else records
+
+    async def select(self, where=None, order_by=None, descending=False, limit=None) -> List[Dict]:
+        return await asyncio.to_thread(self._select, where, order_by, descending, limit)
+
+    def _page(self, where: Optional[Dict[str, Any]], order_by: Optional[str], descending: bool,
+              offset: int, size: int) -> tuple:
+        query, python_filters = self._query(where, order_by, descending)
+        with self.storage.engine.connect() as conn:
+            rows = conn.execute(query.offset(offset).limit(size)).all()
+        return self._filter([self._record(row) for row in rows], python_filters), len(rows)
+
+    async def stream(self, where=None, order_by=None, descending=False, batch_size=100) -> AsyncIterator[Dict]:
+        """Yield records one LIMIT/OFFSET page at a time, each read in a worker thread"""
+        offset = 0
+        while True:
+            records, fetched = await asyncio.to_thread(self._page, where, order_by, descending, offset, batch_size)
+            for record in records:
+                yield record
+            if fetched < batch_size:
+                return
+            offset += fetched
+
+    def _insert(self, records: List[Dict[str, Any]], airtable_ids: Optional[List[str]] = None,
+                created_times: Optional[List[str]] = None) -> List[Dict]:
+        now = datetime.utcnow().isoformat(timespec='milliseconds') + 'Z'
+        rows = []
+        for i, fields in enumerate(records):
+            row = self._row(fields)
+            row['id'] = f"loc{uuid.uuid4().hex[:14]}"
+            row['airtable_id'] = airtable_ids[i] if airtable_ids else None
+            row['created_time'] = created_times[i] if created_times else now
+            rows.append(row)
+        if rows:
+            with self.storage.engine.begin() as conn:
+                conn.execute(self.table.insert(), rows)
+        return [{'id': row['id'], 'createdTime': row['created_time'], 'fields': dict(fields)}
+                for row, fields in zip(rows, records)]
+
+    async def create(self, fields: Dict[str, Any]) -> Dict:
+        record = (await asyncio.to_thread(self._insert, [fields]))[0]
+        self._mirror_create(record)
+        return record
+
+    async def batch_create(self, records: List[Dict[str, Any]]) -> List[Dict]:
+        created = await asyncio.to_thread(self._insert, records)
+        for record in created:
+            self._mirror_create(record)
+        return created
+
+    def _update(self, record_id: str, fields: Dict[str, Any]) -> Optional[Dict]:
+        with self.storage.engine.begin() as conn:
+            row = conn.execute(select(self.table).where(self.table.c.id == record_id)).first()
+            if row is None:
+                return None
+            merged = dict(self._record(row)['fields'], **fields)
+            conn.execute(self.table.update().where(self.table.c.id == record_id).values(**self._row(merged)))
+            return {'id': record_id, 'createdTime': row.created_time, 'fields': merged, 'airtable_id': row.airtable_id}
+
+    async def update(self, record_id: str, fields: Dict[str, Any]) -> Dict:
+        record = await asyncio.to_thread(self._update, record_id, fields)
+        if record is None:
+            raise KeyError(f"No {self.kind} record {record_id}")
+        airtable_id = record.pop('airtable_id')
+        if airtable_id and self.mirror:
+            self._submit(self.mirror.update(airtable_id, fields))
+        return record
+
+    def _batch_update(self, records: List[Dict[str, Any]]) -> List[Dict]:
+        updated = []
+        for record in records:
+            result = self._update(record['id'], record['fields'])
+            if result is not None:
+                updated.append(result)
+        return updated
+
+    async def batch_update(self, records: List[Dict[str, Any]]) -> List[Dict]:
+        updated = await asyncio.to_thread(self._batch_update, records)
+        changes = {r['id']: r['fields'] for r in records}
+        mirrored = [{'id': r['airtable_id'], 'fields': changes[r['id']]} for r in updated if r['airtable_id']]
+        if mirrored and self.mirror:
+            self._submit(self.mirror.batch_update(mirrored))
+        for record in updated:
+            record.pop('airtable_id')
+        return updated
+
+    def _delete(self, record_id: str) -> Optional[str]:
+        with self.storage.engine.begin() as conn:
+            airtable_id = conn.execute(select(self.table.c.airtable_id).where(self.table.c.id == record_id)).scalar()
+            conn.execute(self.table.delete().where(self.table.c.id == record_id))
+        return airtable_id
+
+    async def delete(self, record_id: str) -> Dict:
+        airtable_id = await asyncio.to_thread(self._delete, record_id)
+        if airtable_id and self.mirror:
+            self._submit(self.mirror.delete(airtable_id))
+        return {'id': record_id, 'deleted': True}
+
+    def _batch_delete(self, record_ids: List[str]) -> List[str]:
+        with self.storage.engine.begin() as conn:
+            airtable_ids = [row.airtable_id for row in conn.execute(
+                select(self.table.c.airtable_id).where(self.table.c.id.in_(record_ids))) if row.airtable_id]
+            conn.execute(self.table.delete().where(self.table.c.id.in_(record_ids)))
+        return airtable_ids
+
+    async def batch_delete(self, record_ids: List[str]) -> None:
+        airtable_ids = await asyncio.to_thread(self._batch_delete, record_ids)
+        if airtable_ids and self.mirror:
+            self._submit(self.mirror.batch_delete(airtable_ids))
+
+    async def field_names(self) -> List[str]:
+        return list(self.schema)
+
+    def append(self, fields: Dict[str, Any], max_age: float = 5.0) -> None:
+        self._insert([fields])
+        if self.mirror:
+            self._mirror_log(max_age).enqueue(fields)
+
+    def pending_writes(self) -> Dict:
+        if not self.mirror:
+            return {'status': 'no_mirror'}
+        return self._mirror_log().stats()
+
+    def upsert_airtable(self, records: List[Dict]) -> int:
+        """Copy Airtable records in, keyed by their Airtable id (used by migration)"""
+        ids = [r['id'] for r in records]
+        with self.storage.engine.connect() as conn:
+            existing = {row.airtable_id for row in conn.execute(
+                select(self.table.c.airtable_id).where(self.table.c.airtable_id.in_(ids)))}
+        new = [r for r in records if r['id'] not in existing]
+        self._insert([r.get('fields', {}) for r in new], [r['id'] for r in new], [r.get('createdTime') for r in new])
+        return len(new)
+
+    @property
+    def mirror(self):
+        """The Airtable table this one is mirrored to, if mirroring is on"""
+        if self._mirror is None and self.storage.mirror_enabled:
+            from services.airtable_client import AirtableClient
+            self._mirror = AirtableClient().table(self.table_name)
+        return self._mirror
+
+    def _mirror_log(self, max_age: float = 5.0):
+        from services.write_behind import get_buffer
+        return get_buffer(self.table_name, f"mirror-{self.kind}", max_age)
+
+    def _mirror_create(self, record: Dict) -> None:
+        if self.mirror:
+            self._submit(self._create_remote(record))
+
+    async def _create_remote(self, record: Dict) -> None:
+        created = await self.mirror.create(record['fields'])
+        await asyncio.to_thread(self._set_airtable_id, record['id'], created['id'])
+
+    def _set_airtable_id(self, record_id: str, airtable_id: str) -> None:
+        with self.storage.engine.begin() as conn:
+            conn.execute(self.table.update().where(self.table.c.id == record_id).values(airtable_id=airtable_id))
+
+    def _submit(self, coro) -> None:
+        """Run a mirror write on the Airtable I/O loop without waiting for it"""
+        from services.airtable_client import io_loop
+        future = io_loop.submit(coro)
+        future.add_done_callback(lambda f: f.exception() and logger.error(
+            f"Error mirroring {self.kind} to Airtable: {f.exception()}"))
+
+
+def _compare(actual: Any, op: str, expected: Any) -> bool:
+    if actual is None:
+        return op == '!='
+    try:
+        return {'=': actual == expected, '!=': actual != expected, '>': actual > expected,
+                '>=': actual >= expected, '<': actual < expected, '<=': actual <= expected}[op]
+    except TypeError:
+        return False
+
+
+class SQLStorage:
+    """Application data in a SQL database (SQLite locally, Postgres in production).
+
+    Set STORAGE_BACKEND=sql and DATABASE_URL to use it. Airtable then
+    becomes an optional asynchronous mirror (AIRTABLE_MIRROR=true).
+    """
+
+    backend = 'sql'
+
+    def __init__(self, url: Optional[str] = None, mirror: Optional[bool] = None):
+        self.url = url or os.getenv('DATABASE_URL') or f"sqlite:///{data_dir('sms_assistant.db')}"
+        if self.url.startswith('postgres://'):
+            self.url = 'postgresql://' + self.url[len('postgres://'):]
+        if self.url.startswith('sqlite:///'):
+            os.makedirs(os.path.dirname(self.url[len('sqlite:///'):]) or '.', exist_ok=True)
+        self.engine = create_engine(self.url, pool_pre_ping=True)
+        if self.engine.dialect.name == 'sqlite':
+            @event.listens_for(self.engine, 'connect')
+            def _sqlite_pragmas(conn, _):
+                conn.execute('PRAGMA journal_mode=WAL')
+        self.metadata = MetaData()
+        if mirror is None:
+            mirror = os.getenv('AIRTABLE_MIRROR', 'false').lower() == 'true'
+        self.mirror_enabled = mirror and bool(os.getenv('AIRTABLE_API_KEY') and os.getenv('AIRTABLE_BASE_ID'))
+        self.available = True
+        self._tables: Dict[str, SQLTable] = {}
+        self._lock = threading.Lock()
+
+    def table(self, kind: str, table_name: str, indexed: Sequence[str] = (),
+              fields: Optional[Sequence[str]] = None) -> SQLTable:
+        with self._lock:
+            if kind not in self._tables:
+                self._tables[kind] = SQLTable(self, kind, table_name, indexed)
+                self.metadata.create_all(self.engine, tables=[self._tables[kind].table])
+                self._add_missing_columns(self._tables[kind].table)
+            return self._tables[kind]
+
+    def _add_missing_columns(self, table: Table) -> None:
+        """Add columns introduced since the table was created (values stay in 'extra' until rewritten)"""
+        existing = {column['name'] for column in inspect(self.engine).get_columns(table.name)}
+        missing = [column for column in table.columns if column.name not in existing]
+        if missing:
+            with self.engine.begin() as conn:
+                for column in missing:
+                    conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} "
+                                      f"{column.type.compile(dialect=self.engine.dialect)}"))
+            logger.info(f"Added columns {[c.name for c in missing]} to {table.name}")
+
+
+class AirtableStorage:
+    """Airtable as the system of record, read through the local replica"""
+
+    backend = 'airtable'
+
+    @property
+    def available(self) -> bool:
+        return bool(os.getenv('AIRTABLE_API_KEY') and os.getenv('AIRTABLE_BASE_ID'))
+
+    def table(self, kind: str, table_name: str, indexed: Sequence[str] = (),
+              fields: Optional[Sequence[str]] = None) -> StorageTable:
+        from services.airtable_client import AirtableClient
+        from services.replica import replica
+        if not self.available:
+            raise ValueError("missing API key or base ID")
+        return replica.table(AirtableClient().table(table_name), indexed, fields)
+
+
+_storage = None
+_storage_key = None
+
+
+def get_storage():
+    """The configured storage backend (STORAGE_BACKEND=airtable|sql)"""
+    global _storage, _storage_key
+    backend = os.getenv('STORAGE_BACKEND', 'airtable').lower()
+    key = (backend, os.getenv('DATABASE_URL'), os.getenv('SMS_DATA_DIR'))
+    if _storage is None or _storage_key != key:
+        _storage = SQLStorage() if backend == 'sql' else AirtableStorage()
+        _storage_key = key
+    return _storage
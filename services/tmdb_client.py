@@ -0,0 +1,253 @@
+import os
+import re
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+import aiohttp
+from services.airtable_client import io_loop
+from services.local_store import data_dir
+
+logger = logging.getLogger(__name__)
+
+# How long each kind of TMDB response is reused: lists change over the
+# day, search results and recommendations slowly, details almost never
+LIST_TTL = float(os.getenv('TMDB_LIST_TTL_MINUTES', '30')) * 60
+SEARCH_TTL = float(os.getenv('TMDB_SEARCH_TTL_DAYS', '2')) * 86400
+DETAIL_TTL = float(os.getenv('TMDB_DETAIL_TTL_DAYS', '7')) * 86400
+
+# Requests a single fan-out keeps in flight at once
+CONCURRENCY = int(os.getenv('TMDB_CONCURRENCY', '6'))
+
+# Most pages a candidate stream reads before giving up
+MAX_PAGES = int(os.getenv('TMDB_MAX_PAGES', '5'))
+
+ENDPOINT_TTLS = [
+    (re.compile(r'^(movie/(popular|top_rated|now_playing|upcoming)|discover/movie|trending/.*)$'), LIST_TTL),
+    (re.compile(r'^(search/.*|movie/\d+/(recommendations|similar))$'), SEARCH_TTL),
+    (re.compile(r'^(movie/\d+(/credits)?|genre/movie/list)$'), DETAIL_TTL)
+]
+
+
+def ttl_for(path: str) -> float:
+    for pattern, ttl in ENDPOINT_TTLS:
+        if pattern.match(path):
+            return ttl
+    return LIST_TTL
+
+
+class TMDBError(Exception):
+    """An error response from the TMDB API"""
+
+    def __init__(self, status: int, message: str):
+        self.status = status
+        super().__init__(f"{status} - {message}")
+
+
+class TMDBCache:
+    """Two-tier cache of TMDB response bodies.
+
+    A per-worker LRU answers repeated requests from memory, backed by a
+    SQLite file under SMS_DATA_DIR that all workers share and that
+    survives restarts, so a cold worker starts with warm responses.
+    Entries expire by the TTL of their endpoint.
+    """
+
+    def __init__(self, max_entries: int = 500):
+        self.max_entries = max_entries
+        self._memory: OrderedDict = OrderedDict()
+        self._local = threading.local()
+        self.counts = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0}
+
+    @property
+    def path(self) -> str:
+        return data_dir('tmdb_cache.sqlite3')
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.path != self.path:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS responses "
+                         "(key TEXT PRIMARY KEY, body TEXT, expires REAL)")
+            conn.commit()
+            self._local.conn = conn
+            self._local.path = self.path
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """The cached body for a request key, if still fresh"""
+        now = time.time()
+        entry = self._memory.get((self.path, key))
+        if entry and entry[0] > now:
+            self._memory.move_to_end((self.path, key))
+            self.counts['memory_hits'] += 1
+            return entry[1]
+
+        try:
+            row = self._connect().execute(
+                "SELECT body, expires FROM responses WHERE key = ? AND expires > ?", (key, now)).fetchone()
+        except sqlite3.Error as e:
+            logger.error(f"Error reading TMDB cache: {e}")
+            row = None
+        if row:
+            self.counts['disk_hits'] += 1
+            self._remember(key, row[0], row[1])
+            return row[0]
+        self.counts['misses'] += 1
+        return None
+
+    def put(self, key: str, body: str, ttl: float) -> None:
+        expires = time.time() + ttl
+        self._remember(key, body, expires)
+        try:
+            conn = self._connect()
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO responses (key, body, expires) VALUES (?, ?, ?)",
+                             (key, body, expires))
+        except sqlite3.Error as e:
+            logger.error(f"Error writing TMDB cache: {e}")
+
+    def _remember(self, key: str, body: str, expires: float) -> None:
+        self._memory[(self.path, key)] = (expires, body)
+        self._memory.move_to_end((self.path, key))
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def prune(self) -> int:
+        """Delete expired responses from disk"""
+        conn = self._connect()
+        with conn:
+            return conn.execute("DELETE FROM responses WHERE expires <= ?", (time.time(),)).rowcount
+
+    def stats(self) -> Dict:
+        lookups = sum(self.counts.values())
+        hits = self.counts['memory_hits'] + self.counts['disk_hits']
+        try:
+            entries, disk_bytes = self._connect().execute(
+                "SELECT COUNT(*), COALESCE(SUM(LENGTH(body)), 0) FROM responses").fetchone()
+        except sqlite3.Error:
+            entries, disk_bytes = 0, 0
+        return {
+            **self.counts,
+            'hit_ratio': round(hits / lookups, 3) if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'memory_bytes': sum(len(body) for _, body in self._memory.values()),
+            'disk_entries': entries,
+            'disk_bytes': disk_bytes
+        }
+
+
+tmdb_cache = TMDBCache(max_entries=int(os.getenv('TMDB_CACHE_ENTRIES', '500')))
+
+
+class TMDBClient:
+    """Cached reads from the TMDB v3 API over the worker's pooled session"""
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = "https://api.themoviedb.org/3",
+                 cache: Optional[TMDBCache] = None):
+        self.api_key = api_key or os.getenv('TMDB_API_KEY')
+        self.base_url = base_url.rstrip('/')
+        self.cache = cache or tmdb_cache
+
+    def _key(self, path: str, params: Dict[str, Any]) -> str:
+        return path + '?' + '&'.join(f"{k}={params[k]}" for k in sorted(params))
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> Dict:
+        """GET an endpoint (e.g. 'movie/popular'), from the cache while it is fresh"""
+        path = path.strip('/')
+        params = {'language': 'en-US', **(params or {})}
+        key = self._key(path, params)
+        body = self.cache.get(key)
+        if body is None:
+            body = await self._fetch(path, params)
+            self.cache.put(key, body, ttl_for(path))
+        return json.loads(body)
+
+    async def get_many(self, path: str, params_list: List[Dict[str, Any]],
+                       concurrency: Optional[int] = None) -> List[Optional[Dict]]:
+        """GET one endpoint for many parameter sets; see get_all()"""
+        return await self.get_all([(path, params) for params in params_list], concurrency)
+
+    async def get_all(self, requests: List[Tuple[str, Dict[str, Any]]],
+                      concurrency: Optional[int] = None) -> List[Optional[Dict]]:
+        """GET many (path, params) requests with bounded concurrency.
+
+        Identical requests are made once. Results come back in input order,
+        with None where a request failed.
+        """
+        keys = [self._key(path.strip('/'), {'language': 'en-US', **params}) for path, params in requests]
+        unique = dict(zip(keys, requests))
+        semaphore = asyncio.Semaphore(concurrency or CONCURRENCY)
+
+        async def fetch(path: str, params: Dict[str, Any]) -> Optional[Dict]:
+            async with semaphore:
+                try:
+                    return await self.get(path, params)
+                except (TMDBError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    logger.error(f"TMDB request failed for {path} {params}: {e}")
+                    return None
+
+        results = dict(zip(unique, await asyncio.gather(*[fetch(*request) for request in unique.values()])))
+        return [results[key] for key in keys]
+
+    async def stream(self, path: str, params: Optional[Dict[str, Any]] = None, max_pages: Optional[int] = None,
+                     prefetch_at: int = 5, on_page: Optional[Callable[[List[Dict]], None]] = None) -> AsyncIterator[Dict]:
+        """Yield the results of a paged endpoint one at a time, fetching pages only as they are reached.
+
+        Once the caller is within prefetch_at results of the end of a page,
+        the next page is requested in the background so it arrives while
+        the caller is still filtering. A caller that stops early never
+        causes more than that one extra request. Repeats across pages are
+        dropped. An error on the first page is raised; on later pages it
+        just ends the stream.
+        """
+        params = {k: v for k, v in (params or {}).items() if k != 'page'}
+        max_pages = max_pages or MAX_PAGES
+        seen = set()
+        page, total_pages = 1, max_pages
+        pending = asyncio.ensure_future(self.get(path, {**params, 'page': 1}))
+        try:
+            while pending is not None:
+                try:
+                    data = await pending
+                except (TMDBError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if page == 1:
+                        raise
+                    logger.error(f"TMDB request failed for {path} page {page}: {e}")
+                    return
+                pending = None
+                results = data.get('results', [])
+                total_pages = min(data.get('total_pages') or max_pages, max_pages)
+                if on_page:
+                    on_page(results)
+                more = bool(results) and page < total_pages
+                for i, movie in enumerate(results):
+                    if more and pending is None and len(results) - i <= prefetch_at:
+                        pending = asyncio.ensure_future(self.get(path, {**params, 'page': page + 1}))
+                    if movie.get('id') not in seen:
+                        seen.add(movie.get('id'))
+                        yield movie
+                if more and pending is None:
+                    pending = asyncio.ensure_future(self.get(path, {**params, 'page': page + 1}))
+                page += 1
+        finally:
+            if pending is not None and not pending.done():
+                pending.cancel()
+
+    async def _fetch(self, path: str, params: Dict[str, Any]) -> str:
+        """Make the request on the shared I/O loop so connections are pooled across requests"""
+        return await io_loop.run(self._request(path, params))
+
+    async def _request(self, path: str, params: Dict[str, Any]) -> str:
+        async with io_loop.session().get(f"{self.base_url}/{path}", params={**params, 'api_key': self.api_key}) as response:
+            body = await response.text()
+            if response.status != 200:
+                raise TMDBError(response.status, body)
+            return body
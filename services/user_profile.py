@@ -0,0 +1,163 @@
+import os
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+from services.airtable_client import AirtableClient, io_loop
+from services.airtable_query import Query
+from services.local_store import JsonRecordStore
+
+logger = logging.getLogger(__name__)
+
+RECENT_TURNS = 5
+
+# How often a genre histogram kept current by increments is rebuilt in full
+GENRE_REBUILD_INTERVAL = timedelta(hours=int(os.getenv('PREFERENCE_REBUILD_HOURS', '24')))
+
+
+def _empty_profile() -> Dict:
+    return {
+        'preferences': {},
+        'preferences_rebuilt_at': None,
+        'recent_turns': [],
+        'stations': {},
+        'locations': [],
+        'favourite_genres': [],
+        'genre_counts': None,
+        'genre_counts_built_at': None,
+        'next_shift': None,
+        'updated_at': None
+    }
+
+
+class UserProfileStore:
+    """Denormalised per-user profile holding everything context assembly needs.
+
+    Profiles live on local disk (one keyed read per message) and are kept
+    current by the write paths: stored conversations, transport lookups,
+    shift changes and movie ratings. Set AIRTABLE_PROFILES_TABLE to also
+    mirror each profile into Airtable as a JSON blob.
+    """
+
+    def __init__(self):
+        self.store = JsonRecordStore('profiles', _empty_profile)
+        self.movie_changes = JsonRecordStore('movie_changes')
+        self.mirror_table = os.getenv('AIRTABLE_PROFILES_TABLE')
+        self._mirror = None
+        self._mirror_ids: Dict[str, str] = {}
+
+    def get(self, user_id: str) -> Dict:
+        return self.store.get(user_id)
+
+    def update(self, user_id: str, changes: Dict[str, Any]) -> Dict:
+        """Merge changes into a user's profile and persist it"""
+        return self._modify(user_id, lambda profile: changes)
+
+    def _modify(self, user_id: str, change: Callable[[Dict], Optional[Dict]]) -> Dict:
+        """Merge the changes computed from the stored profile, under its lock"""
+        changed = False
+
+        def stamped(profile: Dict) -> Optional[Dict]:
+            nonlocal changed
+            changes = change(profile)
+            if changes is None:
+                return None
+            changed = True
+            return dict(changes, updated_at=datetime.now().isoformat())
+        profile = self.store.update(user_id, stamped)
+        if changed:
+            self._mirror_profile(user_id, profile)
+        return profile
+
+    def record_turn(self, user_id: str, message: str, response: str, preferences: Dict) -> Dict:
+        """Fold a stored conversation turn and refreshed preferences into the profile"""
+        def change(profile: Dict) -> Dict:
+            recent = [{'body': message, 'response': response[:200], 'at': datetime.now().isoformat()}]
+            recent.extend(profile.get('recent_turns', [])[:RECENT_TURNS - 1])
+            return {
+                'preferences': preferences,
+                'recent_turns': recent,
+                'locations': preferences.get('locations', [])[:5]
+            }
+        return self._modify(user_id, change)
+
+    def record_stations(self, user_id: str, stations: List[str]) -> Dict:
+        """Count the stations a user asks about so we know their usual ones"""
+        def change(profile: Dict) -> Dict:
+            counts = profile.get('stations', {})
+            for station in stations:
+                if station:
+                    counts[station] = counts.get(station, 0) + 1
+            return {'stations': counts}
+        return self._modify(user_id, change)
+
+    def record_genres(self, user_id: str, genre_ids: List[int], weight: int = 1) -> Dict:
+        """Add a rated or favourited movie's genres to the user's genre histogram.
+
+        Nothing is counted until the histogram has been built from the
+        user's movie tables, which then already includes this movie.
+        """
+        if not genre_ids:
+            return self.get(user_id)
+
+        def change(profile: Dict) -> Optional[Dict]:
+            if not self.genre_counts_current(profile):
+                return None
+            counts = profile['genre_counts']
+            for genre_id in genre_ids:
+                counts[str(genre_id)] = counts.get(str(genre_id), 0) + weight
+            return {'genre_counts': counts}
+        return self._modify(user_id, change)
+
+    def genre_counts_current(self, profile: Dict) -> bool:
+        """Whether the genre histogram can be used as is rather than rebuilt.
+
+        Increments only cover ratings and favourites made through us, so the
+        histogram is rebuilt every PREFERENCE_REBUILD_HOURS and after edits
+        to the movie tables (see drop_genre_counts).
+        """
+        built_at = profile.get('genre_counts_built_at')
+        if profile.get('genre_counts') is None or not built_at:
+            return False
+        if datetime.now() - datetime.fromisoformat(built_at) >= GENRE_REBUILD_INTERVAL:
+            return False
+        changed_at = self.movie_changes.get('movies').get('changed_at')
+        return not changed_at or built_at > changed_at
+
+    def drop_genre_counts(self) -> None:
+        """Mark every user's genre histogram for rebuilding on its next use"""
+        self.movie_changes.save('movies', {'changed_at': datetime.now().isoformat()})
+
+    def top_genres(self, profile: Dict, limit: int = 3) -> List[int]:
+        counts = profile.get('genre_counts') or {}
+        return [int(g) for g, _ in sorted(counts.items(), key=lambda x: x[1], reverse=True)[:limit]]
+
+    def usual_stations(self, profile: Dict, limit: int = 3) -> List[str]:
+        stations = profile.get('stations', {})
+        return [s for s, _ in sorted(stations.items(), key=lambda x: x[1], reverse=True)[:limit]]
+
+    def _mirror_profile(self, user_id: str, profile: Dict) -> None:
+        """Queue an upsert of the profile into the optional Airtable mirror table"""
+        if not self.mirror_table:
+            return
+        if self._mirror is None:
+            self._mirror = AirtableClient().table(self.mirror_table)
+        io_loop.submit(self._upsert_mirror(user_id, json.dumps(profile)))
+
+    async def _upsert_mirror(self, user_id: str, profile_json: str) -> None:
+        try:
+            fields = {'User': user_id, 'Profile': profile_json}
+            record_id = self._mirror_ids.get(user_id)
+            if not record_id:
+                existing = await Query(self._mirror).where('User', user_id).select('User').first()
+                record_id = existing['id'] if existing else None
+            if record_id:
+                await self._mirror.update(record_id, fields)
+            else:
+                record_id = (await self._mirror.create(fields))['id']
+            self._mirror_ids[user_id] = record_id
+        except Exception as e:
+            logger.error(f"Error mirroring user profile to Airtable: {e}")
+
+
+profile_store = UserProfileStore()
@@ -0,0 +1,84 @@
+import os
+import re
+import time
+import logging
+import unicodedata
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def normalise_title(title: str) -> str:
+    """Fold case, accents and punctuation so 'Amélie' matches 'amelie'"""
+    title = unicodedata.normalize('NFKD', str(title)).encode('ascii', 'ignore').decode()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', title.lower()).split())
+
+
+class WatchedIndex:
+    """Per-worker set of the movies in a watched table.
+
+    Holds normalised titles and, where records carry one, TMDB ids, so
+    filtering a list of TMDB candidates is a set lookup per movie instead
+    of a table query (and a TMDB call to find the title) per movie. Movies
+    this worker records are added as they are written, and held in saving
+    (by TMDB id) while the write is under way; the whole index is reloaded
+    after ttl seconds to pick up other workers' writes.
+    """
+
+    def __init__(self, ttl: float = 300):
+        self.ttl = ttl
+        self.titles = set()
+        self.ids = set()
+        self.saving = set()
+        self.loaded_at: Optional[float] = None
+
+    @property
+    def stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    async def load(self, table) -> None:
+        """Rebuild the index from one pass over the table"""
+        titles, ids = set(), set()
+        async for record in table.stream():
+            fields = record.get('fields', {})
+            title = fields.get('Title') or fields.get('Name')
+            if title:
+                titles.add(normalise_title(title))
+            if fields.get('TMDB_ID'):
+                ids.add(str(fields['TMDB_ID']))
+        self.titles, self.ids = titles, ids
+        self.loaded_at = time.monotonic()
+        logger.info(f"Loaded watched index for {table.table_name}: {len(titles)} titles")
+
+    def add(self, title: Optional[str] = None, tmdb_id: Any = None) -> None:
+        if title:
+            self.titles.add(normalise_title(title))
+        if tmdb_id:
+            self.ids.add(str(tmdb_id))
+
+    def invalidate(self) -> None:
+        self.loaded_at = None
+
+    def __contains__(self, movie: Dict[str, Any]) -> bool:
+        """Whether a TMDB movie (as returned in result lists) is in the table or being saved to it"""
+        if movie.get('id') is not None and (str(movie['id']) in self.ids or movie['id'] in self.saving):
+            return True
+        title = movie.get('title') or movie.get('name')
+        return bool(title) and normalise_title(title) in self.titles
+
+
+# One index per storage table, shared by every handler in the worker
+_indexes: Dict[Any, WatchedIndex] = {}
+
+
+def watched_index(table) -> WatchedIndex:
+    if table not in _indexes:
+        _indexes[table] = WatchedIndex(ttl=float(os.getenv('WATCHED_INDEX_TTL', '300')))
+    return _indexes[table]
+
+
+def invalidate_watched(table_name: Optional[str] = None) -> None:
+    """Reload this worker's indexes of a table (or of every table) on next use"""
+    for table, index in _indexes.items():
+        if table_name is None or table.table_name == table_name:
+            index.invalidate()
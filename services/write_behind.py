@@ -0,0 +1,274 @@
+import os
+import glob
+import json
+import time
+import atexit
+import logging
+import threading
+from collections import deque
+from typing import Callable, Dict, List, Optional
+from services.airtable_client import AirtableClient, BATCH_SIZE, io_loop
+from services.local_store import data_dir
+
+logger = logging.getLogger(__name__)
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+def _process_token(pid: int) -> Optional[str]:
+    """pid_starttime from /proc, so a reused pid can't pass for an old worker"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f"{pid}_{f.read().rsplit(')', 1)[1].split()[19]}"
+    except (OSError, IndexError):
+        return None
+
+
+def _owner_alive(owner: str) -> bool:
+    """Whether the worker that wrote a spool (pid, or pid_starttime) is still running"""
+    pid, _, started = owner.partition('_')
+    if not _pid_alive(int(pid)):
+        return False
+    return not started or _process_token(int(pid)) in (None, owner)
+
+
+class WriteBehindBuffer:
+    """Buffers Airtable creates for one table and flushes them in batches.
+
+    Rows are appended to a per-worker spool file before they are queued, so
+    a crash never loses them: on startup any spool left by a dead worker is
+    claimed and replayed. Spools are named by pid and process start time,
+    so a worker that reuses a dead worker's pid doesn't adopt its spool. A
+    background thread flushes up to 10 rows per request whenever a full
+    batch is waiting or the oldest row is older than max_age seconds. After
+    each flush the highest flushed sequence number is recorded, and the
+    spool is truncated once fully flushed. A claimed spool is deleted only
+    once its rows are flushed; if the claiming worker dies first, the claim
+    is replayed in turn from its recorded progress.
+    """
+
+    def __init__(self, table_name: str, name: str, max_age: float = 5.0,
+                 client: Optional[AirtableClient] = None,
+                 on_flush: Optional[Callable[[List[Dict]], None]] = None):
+        self.table = (client or AirtableClient()).table(table_name)
+        self.name = name
+        self.max_age = max_age
+        self.on_flush = on_flush
+        self.pid = os.getpid()
+        self.owner = _process_token(self.pid) or str(self.pid)
+        self._pending: deque = deque()
+        # Rows still to flush from each claimed spool
+        self._claims: Dict[str, int] = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stats = {'flushed': 0, 'batches': 0, 'failures': 0, 'last_flush_lag': 0.0, 'max_flush_lag': 0.0}
+        os.makedirs(self.spool_dir, exist_ok=True)
+        atexit.register(self.flush)
+        self.replay()
+
+    @property
+    def spool_dir(self) -> str:
+        return data_dir('spool')
+
+    def _spool_path(self, owner: str) -> str:
+        return os.path.join(self.spool_dir, f"{self.name}-{owner}.jsonl")
+
+    def _ack_path(self, owner: str) -> str:
+        return os.path.join(self.spool_dir, f"{self.name}-{owner}.ack")
+
+    def enqueue(self, fields: Dict) -> None:
+        """Spool a row to disk and queue it for the next batch"""
+        with self._lock:
+            self._seq += 1
+            entry = {'seq': self._seq, 'at': time.time(), 'fields': fields}
+            with open(self._spool_path(self.owner), 'a') as f:
+                f.write(json.dumps(entry) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.append(entry)
+            full = len(self._pending) >= BATCH_SIZE
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def replay(self) -> int:
+        """Re-queue rows from spools (or claims on them) left by workers that have exited"""
+        replayed = 0
+        prefix = f"{self.name}-"
+        paths = glob.glob(os.path.join(self.spool_dir, f"{prefix}*.jsonl"))
+        paths += glob.glob(os.path.join(self.spool_dir, f"{prefix}*.jsonl.*.replay"))
+        for path in paths:
+            spool = os.path.basename(path)
+            try:
+                if spool.endswith('.replay'):
+                    spool, claimer = spool[:-len('.replay')].rsplit('.', 1)
+                    if claimer == self.owner or _owner_alive(claimer):
+                        continue
+                owner = spool[len(prefix):-len('.jsonl')]
+                if owner == self.owner or _owner_alive(owner):
+                    continue
+            except ValueError:
+                continue
+
+            # Renaming claims the spool so only one worker replays it
+            claimed = os.path.join(self.spool_dir, f"{spool}.{self.owner}.replay")
+            try:
+                os.rename(path, claimed)
+            except OSError:
+                continue
+            acked = self._read_ack(self._ack_path(owner))
+            entries = []
+            with open(claimed) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # torn final write
+                    if entry['seq'] > acked:
+                        entries.append(entry)
+            if not entries:
+                self._remove_spool(claimed, owner)
+                continue
+
+            # Queued straight from the claim, which records flushes in the old ack file
+            with self._lock:
+                for entry in entries:
+                    self._seq += 1
+                    self._pending.append({'seq': self._seq, 'at': time.time(), 'fields': entry['fields'],
+                                          'claim': claimed, 'claim_owner': owner, 'claim_seq': entry['seq']})
+                self._claims[claimed] = len(entries)
+            replayed += len(entries)
+
+        if replayed:
+            logger.info(f"Replayed {replayed} spooled {self.name} rows")
+            self._ensure_thread()
+        return replayed
+
+    def _remove_spool(self, path: str, owner: str) -> None:
+        for done in (path, self._ack_path(owner)):
+            if os.path.exists(done):
+                os.remove(done)
+
+    def stats(self) -> Dict:
+        """Queue depth and flush lag, for health reporting"""
+        with self._lock:
+            oldest = self._pending[0]['at'] if self._pending else None
+            return dict(self._stats, pending=len(self._pending),
+                        oldest_pending_age=round(time.time() - oldest, 3) if oldest else 0.0)
+
+    def flush(self) -> int:
+        """Flush everything pending now, in batches of up to 10"""
+        flushed = 0
+        with self._send_lock:
+            while True:
+                batch = self._take_batch(force=True)
+                if not batch or not self._send(batch):
+                    return flushed
+                flushed += len(batch)
+
+    def _take_batch(self, force: bool = False) -> List[Dict]:
+        with self._lock:
+            if not self._pending:
+                return []
+            due = force or len(self._pending) >= BATCH_SIZE or time.time() - self._pending[0]['at'] >= self.max_age
+            return list(self._pending)[:BATCH_SIZE] if due else []
+
+    def _send(self, batch: List[Dict]) -> bool:
+        try:
+            created = io_loop.run_sync(self.table.batch_create([entry['fields'] for entry in batch]))
+        except Exception as e:
+            self._stats['failures'] += 1
+            logger.error(f"Error flushing {self.name} batch of {len(batch)}: {e}")
+            return False
+        if self.on_flush:
+            try:
+                self.on_flush(created)
+            except Exception as e:
+                logger.error(f"Error handling flushed {self.name} rows: {e}")
+
+        now = time.time()
+        with self._lock:
+            for _ in batch:
+                self._pending.popleft()
+            lag = now - batch[0]['at']
+            self._stats['flushed'] += len(batch)
+            self._stats['batches'] += 1
+            self._stats['last_flush_lag'] = round(lag, 3)
+            self._stats['max_flush_lag'] = round(max(self._stats['max_flush_lag'], lag), 3)
+            self._acknowledge(batch)
+        return True
+
+    def _acknowledge(self, batch: List[Dict]) -> None:
+        """Record flushed progress; truncate the spool once nothing is pending.
+
+        Replayed rows record their progress against the spool they came
+        from, which is deleted once all of its rows are flushed.
+        """
+        claims = {}
+        for entry in batch:
+            if entry.get('claim'):
+                claims[entry['claim']] = entry
+                self._claims[entry['claim']] -= 1
+        for claim, entry in claims.items():
+            if self._claims[claim]:
+                self._write_ack(self._ack_path(entry['claim_owner']), entry['claim_seq'])
+            else:
+                del self._claims[claim]
+                self._remove_spool(claim, entry['claim_owner'])
+        if not self._pending:
+            open(self._spool_path(self.owner), 'w').close()
+        self._write_ack(self._ack_path(self.owner), batch[-1]['seq'])
+
+    def _write_ack(self, path: str, seq: int) -> None:
+        with open(path, 'w') as f:
+            f.write(str(seq))
+
+    def _read_ack(self, path: str) -> int:
+        try:
+            with open(path) as f:
+                return int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            return 0
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-flusher", daemon=True)
+            self._thread.start()
+
+    def _run(self) -> None:
+        backoff = 1.0
+        while True:
+            self._wake.wait(timeout=min(self.max_age, backoff))
+            self._wake.clear()
+            with self._send_lock:
+                batch = self._take_batch()
+                while batch:
+                    if not self._send(batch):
+                        backoff = min(backoff * 2, 60.0)
+                        break
+                    backoff = 1.0
+                    batch = self._take_batch()
+
+
+_buffers: Dict[str, WriteBehindBuffer] = {}
+_buffers_lock = threading.Lock()
+
+
+def get_buffer(table_name: str, name: str, max_age: float = 5.0,
+               on_flush: Optional[Callable[[List[Dict]], None]] = None) -> WriteBehindBuffer:
+    """Get this worker's buffer for a table, replaying old spools on first use"""
+    with _buffers_lock:
+        if name not in _buffers:
+            _buffers[name] = WriteBehindBuffer(table_name, name, max_age, on_flush=on_flush)
+        return _buffers[name]
@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from typing import Iterator
+
+
+@contextmanager
+def patched_env(**values: str) -> Iterator[None]:
+    """Set environment variables for the duration, restoring the previous values"""
+    saved = {key: os.environ.get(key) for key in values}
+    os.environ.update(values)
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+
+
+@contextmanager
+def temp_data_dir(sql_storage: bool = False) -> Iterator[str]:
+    """Point SMS_DATA_DIR at a fresh temporary directory for the duration.
+
+    Used by tests so local stores, caches and spools never touch the real
+    data directory; the previous value is restored and the directory
+    removed afterwards. With sql_storage, get_storage() also uses a SQLite
+    database (movies.db) in that directory.
+    """
+    path = tempfile.mkdtemp()
+    env = {'SMS_DATA_DIR': path}
+    if sql_storage:
+        env.update(STORAGE_BACKEND='sql', DATABASE_URL=f"sqlite:///{path}/movies.db")
+    try:
+        with patched_env(**env):
+            yield path
+    finally:
+        shutil.rmtree(path, ignore_errors=True)
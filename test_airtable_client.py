@@ -0,0 +1,63 @@
+import asyncio
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient, AirtableError
+from services.rate_limiter import SharedRateLimiter
+from temp_env import temp_data_dir
+
+
+async def run_client_checks():
+    stub = AirtableStub(page_size=3)
+    url = await stub.start()
+    stub.add_records('Shifts', [
+        {'Date': f"2025-04-{day:02d}", 'Start Time': '09:00', 'Notes': "Ann's cover" if day == 2 else ''}
+        for day in range(1, 8)
+    ])
+    table = AirtableClient('patTEST', 'appTEST', url, SharedRateLimiter('test_rate', 1000)).table('Shifts')
+
+    try:
+        # Pagination follows offsets across pages of 3
+        records = await table.all()
+        print(f"Listed {len(records)} records over {len([r for r in stub.requests if r[0] == 'GET'])} pages")
+        assert len(records) == 7
+
+        # Field projection, formulas, sorting and limits
+        projected = await table.all(fields=['Date'], sort=['-Date'], max_records=2)
+        assert [r['fields'] for r in projected] == [{'Date': '2025-04-07'}, {'Date': '2025-04-06'}]
+        matched = await table.all(formula="{Date} = '2025-04-02'")
+        assert matched[0]['fields']['Notes'] == "Ann's cover"
+
+        # Create, get, update and delete single records
+        created = await table.create({'Date': '2025-04-10', 'Start Time': '10:00'})
+        assert (await table.get(created['id']))['fields']['Start Time'] == '10:00'
+        await table.update(created['id'], {'Start Time': '11:00'})
+        assert (await table.get(created['id']))['fields']['Start Time'] == '11:00'
+        await table.delete(created['id'])
+
+        # Batch writes are chunked to 10 records per request
+        batch = await table.batch_create([{'Date': f"2025-05-{day:02d}"} for day in range(1, 13)])
+        assert len(batch) == 12
+        await table.batch_delete([r['id'] for r in batch])
+        assert len(await table.all()) == 7
+
+        # Errors surface Airtable's type and message
+        try:
+            await table.get('recMissing')
+            assert False, "expected a 404"
+        except AirtableError as e:
+            print(f"Error surfaced as: {e}")
+            assert e.status == 404
+
+        # Concurrent requests share the pooled session
+        results = await asyncio.gather(*[table.first(formula=f"{{Date}} = '2025-04-0{d}'") for d in range(1, 6)])
+        assert [r['fields']['Date'] for r in results] == [f"2025-04-0{d}" for d in range(1, 6)]
+    finally:
+        await stub.stop()
+
+
+def test_airtable_client():
+    print("Testing async Airtable client against local stub...")
+    with temp_data_dir():
+        asyncio.run(run_client_checks())
+
+if __name__ == "__main__":
+    test_airtable_client()
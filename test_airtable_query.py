@@ -0,0 +1,53 @@
+import asyncio
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient
+from services.airtable_query import Query, escape
+from services.rate_limiter import SharedRateLimiter
+from services.replica import AirtableReplica
+from temp_env import temp_data_dir
+
+
+async def run_query_checks():
+    stub = AirtableStub()
+    url = await stub.start()
+    stub.add_records('Movie Favorites', [
+        {'Title': "Ocean's Eleven", 'TMDB_ID': '161', 'Genres': 'Crime', 'Notes': 'x' * 500},
+        {'Title': 'Heat', 'TMDB_ID': '949', 'Genres': 'Crime, Thriller', 'Notes': 'y' * 500},
+        {'Title': 'Arrival', 'TMDB_ID': '329865', 'Genres': 'Science Fiction', 'Notes': ''}
+    ])
+    client = AirtableClient('patTEST', 'appTEST', url, SharedRateLimiter('test_rate', 1000))
+    table = client.table('Movie Favorites')
+
+    try:
+        # Apostrophes are escaped instead of breaking the formula
+        assert escape("Ocean's Eleven") == "'Ocean\\'s Eleven'"
+        match = await Query(table).where('Title', "Ocean's Eleven").select('TMDB_ID').first()
+        assert match['fields'] == {'TMDB_ID': '161'}
+
+        # Sorting and limits are pushed to Airtable
+        query = Query(table).select('Title').order_by('-Title').limit(2)
+        records = await query.all()
+        print(f"Sent: {stub.requests[-1][2]}")
+        assert [r['fields']['Title'] for r in records] == ["Ocean's Eleven", 'Heat']
+        assert stub.requests[-1][2]['pageSize'] == '2'
+
+        # The replica downloads only declared fields that exist in the base
+        replica = AirtableReplica()
+        favorites = replica.table(table, indexed=['Title'], fields=['Title', 'Genres'])
+        record = (await favorites.select(where={'Title': 'heat'}))[0]
+        assert record['fields'] == {'Title': 'Heat', 'Genres': 'Crime, Thriller'}
+        watched = replica.table(client.table('Movie Favorites Copy'), fields=['Title', 'Missing'])
+        stub.add_records('Movie Favorites Copy', [{'Title': 'Heat'}])
+        assert len(await watched.select()) == 1
+        assert stub.requests[-1][2]['fields[]'] == 'Title'
+    finally:
+        await stub.stop()
+
+
+def test_airtable_query():
+    print("Testing Airtable query builder...")
+    with temp_data_dir():
+        asyncio.run(run_query_checks())
+
+if __name__ == "__main__":
+    test_airtable_query()
@@ -0,0 +1,189 @@
+import asyncio
+import socket
+from contextlib import asynccontextmanager
+from datetime import datetime
+from aiohttp import web
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient
+from services.airtable_webhooks import AirtableWebhooks
+from services.conversation_archive import archive_old_turns
+from services.conversation_journal import conversation_journal
+from services.handlers.movie_handler import MovieHandler
+from services.recommendation_queue import recommendation_queue
+from services.relevance_index import relevance_index
+from services.replica import replica
+from services.user_profile import profile_store
+from temp_env import patched_env, temp_data_dir
+
+USER = '+447700900001'
+
+
+@asynccontextmanager
+async def stubbed_airtable():
+    """An Airtable stand-in with the client configuration pointed at it"""
+    stub = AirtableStub()
+    url = await stub.start()
+    try:
+        with patched_env(AIRTABLE_API_URL=url, AIRTABLE_API_KEY='patTEST', AIRTABLE_BASE_ID='appTEST'):
+            yield stub
+    finally:
+        await stub.stop()
+
+
+async def start_receiver(pings):
+    """A local endpoint standing in for /airtable-webhook, collecting (body, signature)"""
+    async def receive(request):
+        pings.append((await request.read(), request.headers.get('X-Airtable-Content-MAC')))
+        return web.json_response({'status': 'accepted'})
+    app = web.Application()
+    app.router.add_post('/airtable-webhook', receive)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(('127.0.0.1', 0))
+    await web.SockSite(runner, sock).start()
+    return runner, f"http://127.0.0.1:{sock.getsockname()[1]}/airtable-webhook"
+
+
+async def registered_webhooks():
+    # Nothing listens for pings here; payloads are read by calling process()
+    webhooks = AirtableWebhooks(AirtableClient())
+    await webhooks.register('http://127.0.0.1:9/airtable-webhook')
+    return webhooks
+
+
+async def seeded_conversations():
+    """The Conversations replica, with USER's journal and relevance index built from it"""
+    conversations = replica.table(AirtableClient().table('Conversations'), indexed=['From'])
+    await conversations.sync(full=True)
+    with conversation_journal.seeder(USER) as write:
+        for record in await conversations.select(where={'From': USER}):
+            write(record)
+    relevance_index.backfill(USER, await conversations.select(where={'From': USER}))
+    assert conversation_journal.is_seeded(USER) and relevance_index.has_user(USER)
+    return conversations
+
+
+async def run_signature_checks():
+    async with stubbed_airtable() as stub:
+        stub.add_records('Conversations', [{'From': USER, 'Body': 'Hello', 'Response': 'OK'}])
+        pings = []
+        runner, notify_url = await start_receiver(pings)
+        try:
+            webhooks = AirtableWebhooks(AirtableClient())
+            state = await webhooks.register(notify_url)
+            assert state['cursor'] == 1 and stub.webhooks
+
+            # An edit made in the Airtable UI pings us with a valid signature
+            stub.edit_record('Conversations', stub.tables['Conversations'][0]['id'], {'Body': 'Edited'})
+            await stub.wait_for_pings()
+            assert len(pings) == 1
+            body, signature = pings[0]
+            assert webhooks.verify(body, signature)
+            assert not webhooks.verify(body + b' ', signature)
+            print("Webhook pings verified against the webhook's secret")
+        finally:
+            await runner.cleanup()
+
+
+async def run_payload_checks():
+    async with stubbed_airtable() as stub:
+        stub.add_records('Conversations', [{'From': USER, 'Body': f"Message {i}", 'Response': 'OK'} for i in range(4)])
+        webhooks = await registered_webhooks()
+        conversations = await seeded_conversations()
+
+        # An edit and a delete made in the Airtable UI
+        first, second = [r['id'] for r in stub.tables['Conversations'][:2]]
+        stub.edit_record('Conversations', first, {'Body': 'Edited in Airtable'})
+        stub.remove_record('Conversations', second)
+
+        # Processing applies both payloads and advances the cursor
+        result = await webhooks.process()
+        assert result == {'status': 'ok', 'applied': 2}
+        assert webhooks.state['cursor'] == 3
+        bodies = [r['fields']['Body'] for r in await conversations.select(where={'From': USER})]
+        assert 'Edited in Airtable' in bodies and 'Message 1' not in bodies and len(bodies) == 3
+        assert not conversation_journal.is_seeded(USER)
+        assert not relevance_index.has_user(USER)
+
+        # Nothing new: only the payloads endpoint is asked
+        assert (await webhooks.process())['applied'] == 0
+        print(f"Applied webhook payloads; cursor now {webhooks.state['cursor']}")
+
+
+async def run_movie_table_checks():
+    async with stubbed_airtable() as stub:
+        stub.add_records('Movies Watched', [{'Title': 'Heat', 'User Rating': 5, 'TMDB_ID': '949'}])
+        webhooks = await registered_webhooks()
+
+        handler = MovieHandler()
+        handler.user_id = USER
+        index = await handler._watched_index()
+        recommendation_queue.replace(USER, [{'id': 27205, 'title': 'Inception'}] * 6, 'For you')
+        profile_store.update(USER, {'genre_counts': {'80': 1}, 'genre_counts_built_at': datetime.now().isoformat()})
+
+        def caches_kept():
+            return (not index.stale and recommendation_queue.remaining(USER) == 6
+                    and profile_store.genre_counts_current(profile_store.get(USER)))
+
+        # The app's own writes come back as API changes and leave the caches alone
+        heat = stub.tables['Movies Watched'][0]['id']
+        stub.emit('Movies Watched', changed=[heat])
+        assert (await webhooks.process())['applied'] == 1
+        assert caches_kept()
+
+        # An edit made in Airtable resets everything built from the movie tables
+        stub.edit_record('Movies Watched', heat, {'User Rating': 2})
+        assert (await webhooks.process())['applied'] == 1
+        assert index.stale and recommendation_queue.remaining(USER) == 0 and recommendation_queue.due(USER)
+        assert not profile_store.genre_counts_current(profile_store.get(USER))
+        print("Movie table edits reset the watched index, queues and genre histograms")
+
+
+async def run_archive_checks():
+    async with stubbed_airtable() as stub:
+        records = stub.add_records('Conversations', [{'From': USER, 'Body': f"Message {i}"} for i in range(4)])
+        for i, record in enumerate(records[:2]):
+            record['createdTime'] = f"2020-01-0{i + 1}T10:00:00.000Z"
+        webhooks = await registered_webhooks()
+        conversations = await seeded_conversations()
+
+        # Archiving deletes old turns through the API; the webhook echo isn't a user edit,
+        # even if another worker handles it before the rows leave the shared replica
+        old = await conversations.select(where={'createdTime': ('<', '2021')})
+        assert await archive_old_turns(conversations, days=90) == 2
+        conversations.upsert(old)
+        assert (await webhooks.process())['applied'] == 1
+        assert len(stub.tables['Conversations']) == 2
+        assert conversation_journal.is_seeded(USER) and relevance_index.has_user(USER)
+        print("Archived turns deleted without resetting the user's history")
+
+
+def test_airtable_webhook_signatures():
+    print("Testing Airtable webhook ping signatures...")
+    with temp_data_dir():
+        asyncio.run(run_signature_checks())
+
+
+def test_airtable_webhooks():
+    print("Testing Airtable webhook notifications...")
+    with temp_data_dir():
+        asyncio.run(run_payload_checks())
+
+
+def test_airtable_webhooks_movie_tables():
+    print("Testing Airtable webhook notifications for the movie tables...")
+    with temp_data_dir():
+        asyncio.run(run_movie_table_checks())
+
+
+def test_airtable_webhooks_archive():
+    print("Testing Airtable webhook notifications for archived turns...")
+    with temp_data_dir():
+        asyncio.run(run_archive_checks())
+
+if __name__ == "__main__":
+    test_airtable_webhook_signatures()
+    test_airtable_webhooks()
+    test_airtable_webhooks_movie_tables()
+    test_airtable_webhooks_archive()
@@ -0,0 +1,92 @@
+import asyncio
+from aiohttp import web
+from services.handlers.movie_handler import MovieHandler
+from services.tmdb_client import TMDBCache, TMDBClient, TMDBError
+from temp_env import temp_data_dir
+from tmdb_stub import start_tmdb
+
+# Four pages of 20 recommendations; movie ids are 1-80 in page order
+TOTAL_PAGES = 4
+
+
+def page_of(page):
+    return [{'id': i, 'title': f"Film {i}", 'genre_ids': [18]} for i in range((page - 1) * 20 + 1, page * 20 + 1)]
+
+
+def tmdb_routes(calls):
+    """A TMDB stand-in serving paged recommendation and similar lists (movies 2 and 3 fail)"""
+    async def recommendations(request):
+        page = int(request.query['page'])
+        calls.append(page)
+        await asyncio.sleep(0.02)
+        return web.json_response({'page': page, 'total_pages': TOTAL_PAGES, 'results': page_of(page)})
+    async def broken(request):
+        page = int(request.query['page'])
+        calls.append(page)
+        if page > 1:
+            return web.json_response({'status_message': 'boom'}, status=500)
+        return web.json_response({'page': 1, 'total_pages': TOTAL_PAGES, 'results': page_of(1)})
+    async def missing(request):
+        return web.json_response({'status_message': 'not found'}, status=404)
+    return {
+        'movie/2/recommendations': broken,
+        'movie/3/recommendations': missing,
+        'movie/{id}/recommendations': recommendations,
+        'movie/{id}/similar': recommendations
+    }
+
+
+async def run_streaming_checks():
+    calls = []
+    runner, url = await start_tmdb(tmdb_routes(calls))
+    try:
+        tmdb = TMDBClient('test', url, cache=TMDBCache())
+
+        # Stopping early reads one page; the next is requested while the end of this one is filtered
+        source = tmdb.stream('movie/1/recommendations')
+        seen = []
+        async for movie in source:
+            seen.append(movie['id'])
+            if len(seen) == 20:
+                await asyncio.sleep(0.1)
+                assert calls == [1, 2]
+            if len(seen) == 25:
+                break
+        await source.aclose()
+        assert calls == [1, 2] and seen == list(range(1, 26))
+
+        # The stream ends at total_pages, and only the first page's errors are raised
+        calls.clear()
+        assert len([m async for m in tmdb.stream('movie/4/recommendations')]) == 80
+        assert calls == [1, 2, 3, 4]
+        assert len([m async for m in tmdb.stream('movie/2/recommendations')]) == 20
+        try:
+            [m async for m in tmdb.stream('movie/3/recommendations')]
+            assert False, "expected a TMDB error"
+        except TMDBError as e:
+            assert e.status == 404
+
+        # A user who has seen most of page one still gets five, from the fewest pages
+        handler = MovieHandler()
+        handler.tmdb = TMDBClient('test', url, cache=TMDBCache())
+        watched = [i for i in range(1, 21) if i not in (4, 9)] + [21, 22, 24]
+        await handler.watched_table.batch_create([{'Title': f"Film {i}", 'TMDB_ID': str(i)} for i in watched])
+        calls.clear()
+        movies = await handler._first_unwatched_from('movie/5/recommendations')
+        assert [m['id'] for m in movies] == [4, 9, 23, 25, 26]
+        assert calls == [1, 2]
+
+        similar = await handler._get_similar_movies(1)
+        assert similar['success'] and [m['id'] for m in similar['movies']] == [4, 9, 23, 25, 26]
+    finally:
+        await runner.cleanup()
+    print("Streamed candidates page by page with prefetch")
+
+
+def test_candidate_streaming():
+    print("Testing lazy candidate streaming...")
+    with temp_data_dir(sql_storage=True):
+        asyncio.run(run_streaming_checks())
+
+if __name__ == "__main__":
+    test_candidate_streaming()
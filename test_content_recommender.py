@@ -0,0 +1,115 @@
+import asyncio
+import time
+from services.handlers.movie_handler import MovieHandler
+from services.movie_catalog import movie_catalog
+from services.recommender import ContentRecommender, cosine, mmr, movie_features, taste_vector
+from services.tmdb_client import TMDBCache, TMDBClient
+from temp_env import temp_data_dir
+
+
+def details(movie_id, title, genres, year, director, popularity=10.0):
+    """A TMDB details response with credits appended"""
+    return {'id': movie_id, 'title': title, 'release_date': f"{year}-06-01", 'popularity': popularity,
+            'genres': [{'id': g} for g in genres], 'credits': {'crew': [{'job': 'Director', 'name': director}]}}
+
+
+CATALOG = [
+    details(1, 'Inception', [28, 878], 2010, 'Christopher Nolan', 80),
+    details(2, 'Interstellar', [12, 18, 878], 2014, 'Christopher Nolan', 90),
+    details(3, 'Tenet', [28, 878], 2020, 'Christopher Nolan', 60),
+    details(4, 'The Prestige', [18, 9648, 878], 2006, 'Christopher Nolan', 50),
+    details(5, 'Arrival', [18, 878], 2016, 'Denis Villeneuve', 70),
+    details(6, 'Ex Machina', [18, 878], 2014, 'Alex Garland', 40),
+    details(7, 'Notting Hill', [35, 10749], 1999, 'Roger Michell', 45),
+    details(8, 'Love Actually', [35, 10749], 2003, 'Richard Curtis', 55),
+    details(9, 'Edge of Tomorrow', [28, 878], 2014, 'Doug Liman', 65)
+]
+
+
+def check_vectors():
+    # Features are unit vectors; neighbouring decades still overlap
+    nolan = movie_features([28, 878], 2010, 'Christopher Nolan')
+    assert abs(cosine(nolan, nolan) - 1.0) < 1e-9
+    assert cosine(movie_features([], 1999), movie_features([], 2001)) > 0
+    assert cosine(nolan, movie_features([35, 10749], 1985)) == 0
+
+    # Dislikes pull the taste away from what was disliked
+    taste = taste_vector([(nolan, 2), (movie_features([35, 10749], 1999, 'Roger Michell'), -2)])
+    assert taste['g:878'] > 0 and taste['g:35'] < 0
+
+    # MMR trades a little relevance for variety
+    same = movie_features([878], 2010, 'A')
+    items = [(0.9, same, 'a1'), (0.89, same, 'a2'), (0.6, movie_features([35], 1990, 'B'), 'b')]
+    assert mmr(items, 2, diversity=1.0) == ['a1', 'a2']
+    assert mmr(items, 2, diversity=0.5) == ['a1', 'b']
+
+
+async def run_recommender_checks():
+    movie_catalog.add(CATALOG)
+    assert movie_catalog.get(2)['director'] == 'Christopher Nolan'
+
+    handler = MovieHandler()
+    handler.user_id = '+447700900005'
+    # Nothing listens here: recommendations must not need the network
+    handler.tmdb = TMDBClient('test', 'http://127.0.0.1:9/3', cache=TMDBCache())
+    for title, movie_id, genres, year, director, rating in [
+            ('Inception', 1, '28, 878', '2010', 'Christopher Nolan', 5),
+            ('Notting Hill', 7, '35, 10749', '1999', 'Roger Michell', 1)]:
+        await handler.watched_table.create({'Title': title, 'User Rating': rating, 'TMDB_ID': str(movie_id),
+                                            'Genre IDs': genres, 'Year': year, 'Director': director})
+
+    movies, category = await handler._compute_recommendations(3)
+    ids = [m['id'] for m in movies]
+    assert category == "Recommended For You From Your Ratings"
+    assert 1 not in ids and 7 not in ids and 8 not in ids
+    assert ids[0] in (2, 3, 4) and len(ids) == 3
+
+    # Diversity keeps the picks from all being Nolan films
+    relevant = ContentRecommender(diversity=1.0).recommend(await handler._taste_vector(), 4)
+    varied = ContentRecommender(diversity=0.5).recommend(await handler._taste_vector(), 4)
+    assert sum(m['director'] == 'Christopher Nolan' for m in varied) < \
+        sum(m['director'] == 'Christopher Nolan' for m in relevant)
+
+    # The catalog's vectors are built once and only rebuilt when its movies change
+    recommender = ContentRecommender()
+    taste = await handler._taste_vector()
+    features = recommender.features()
+    recommender.recommend(taste, 3)[0]['title'] = 'Changed'
+    assert recommender.features() is features and movie_catalog.get(features.movies[0]['id'])['title'] != 'Changed'
+    movie_catalog.add([dict(CATALOG[8], popularity=99)])
+    assert recommender.features() is features
+    movie_catalog.add([details(10, 'The Dark Knight', [28, 80], 2008, 'Christopher Nolan', 85)])
+    assert 10 in {m['id'] for m in recommender.features().movies}
+
+    # A few new movies in known genres wait for the rebuild interval instead of bumping the version
+    features = recommender.features()
+    version = movie_catalog.version()
+    movie_catalog.add([details(11, 'Dunkirk', [18, 28], 2017, 'Christopher Nolan', 75)])
+    movie_catalog.add([dict(CATALOG[4], release_date='2017-01-01')])
+    assert movie_catalog.version() == version and movie_catalog.pending() == 2
+    assert recommender.features() is features
+    features.built_at -= 3600
+    assert 11 in {m['id'] for m in recommender.features().movies}
+
+    # Scoring a larger catalog stays well under a second, and far less once its vectors are built
+    movie_catalog.add([details(100 + i, f"Film {i}", [[28, 878], [18], [35, 10749], [27, 53]][i % 4],
+                               1960 + i % 60, f"Director {i % 300}", i % 97) for i in range(2000)])
+    started = time.perf_counter()
+    assert len(recommender.recommend(taste, 5)) == 5
+    elapsed = time.perf_counter() - started
+    started = time.perf_counter()
+    assert len(recommender.recommend(taste, 5)) == 5
+    cached = time.perf_counter() - started
+    print(f"Scored 2000 catalog movies in {elapsed * 1000:.1f}ms, {cached * 1000:.1f}ms with cached vectors")
+    assert elapsed < 1.0 and cached < elapsed
+    print("Recommended movies from the user's taste without TMDB")
+
+
+def test_content_recommender():
+    print("Testing the local content-based recommender...")
+    check_vectors()
+    with temp_data_dir(sql_storage=True):
+        asyncio.run(run_recommender_checks())
+
+if __name__ == "__main__":
+    test_content_recommender()
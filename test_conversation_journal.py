@@ -0,0 +1,47 @@
+import asyncio
+from services.conversation_journal import ConversationJournal
+from temp_env import temp_data_dir
+
+
+def _turn(i, user='+447700900001', day=1):
+    return {'createdTime': f"2026-03-{day:02d}T09:00:{i:02d}.000Z",
+            'fields': {'From': user, 'Body': f"Message {i}", 'Response': 'OK', 'Intent': 'chat'}}
+
+
+def test_conversation_journal():
+    print("Testing the conversation journal...")
+    with temp_data_dir():
+        journal = ConversationJournal('test', segment_bytes=400)
+
+        # Appends roll over into new segments; reads map the segments
+        for i in range(10, 20):
+            journal.append('+447700900001', _turn(i, day=10))
+            journal.append('+447700900002', _turn(i, '+447700900002', day=10))
+            assert journal.tail('+447700900001', 1)[0]['fields']['Body'] == f"Message {i}"
+        assert journal.stats()['segments'] > 1
+        assert [r['fields']['Body'] for r in journal.tail('+447700900001', 3)] == ['Message 19', 'Message 18', 'Message 17']
+        assert len(list(journal.scan('+447700900002'))) == 10
+        assert not journal.is_seeded('+447700900001')
+
+        # Seeding imports older stored turns ahead of the journaled ones and
+        # skips stored copies of turns the journal already has
+        with journal.seeder('+447700900001') as write:
+            for i in range(5):
+                write(_turn(i, day=1))
+            write(_turn(10, day=10))
+        assert journal.is_seeded('+447700900001')
+        bodies = [r['fields']['Body'] for r in journal.scan('+447700900001')]
+        assert bodies == [f"Message {i}" for i in list(range(5)) + list(range(10, 20))]
+
+        # A failed import leaves the user unseeded
+        try:
+            with journal.seeder('+447700900002') as write:
+                write(_turn(1, '+447700900002'))
+                raise RuntimeError("storage went away")
+        except RuntimeError:
+            pass
+        assert not journal.is_seeded('+447700900002')
+        assert len(list(journal.scan('+447700900002'))) == 10
+
+if __name__ == "__main__":
+    test_conversation_journal()
@@ -0,0 +1,59 @@
+import asyncio
+import time
+from aiohttp import web
+from services.handlers.movie_handler import MovieHandler
+from services.tmdb_client import TMDBCache, TMDBClient
+from temp_env import temp_data_dir
+from tmdb_stub import start_tmdb
+
+
+def tmdb_routes(stats):
+    """A slow TMDB stand-in that records how many searches run at once"""
+    async def search(request):
+        stats['calls'].append(request.query['query'])
+        stats['in_flight'] += 1
+        stats['peak'] = max(stats['peak'], stats['in_flight'])
+        await asyncio.sleep(0.05)
+        stats['in_flight'] -= 1
+        genre = 878 if 'space' in request.query['query'].lower() else 35
+        return web.json_response({'results': [{'id': 1, 'genre_ids': [genre, 99999]}]})
+    return {
+        'search/movie': search
+    }
+
+
+async def run_fanout_checks():
+    stats = {'calls': [], 'in_flight': 0, 'peak': 0}
+    runner, url = await start_tmdb(tmdb_routes(stats))
+    try:
+        handler = MovieHandler()
+        handler.tmdb = TMDBClient('test', url, cache=TMDBCache())
+        titles = [f"Space Film {i}" for i in range(15)] + [f"Comedy {i}" for i in range(15)]
+        # Repeats differ only in case and punctuation, so they share a search
+        titles += ['space film 0', 'SPACE FILM 1!', 'Comedy 2']
+        await handler.watched_table.batch_create([{'Title': t, 'User Rating': 5} for t in titles])
+
+        started = time.monotonic()
+        genres = await handler._get_favorite_genres()
+        elapsed = time.monotonic() - started
+        assert genres == [878, 35]
+        assert len(stats['calls']) == 30
+        assert 1 < stats['peak'] <= 6
+        # 30 searches of 50ms each take 1.5s one after another
+        assert elapsed < 1.0, elapsed
+
+        counts = {}
+        await handler._count_title_genres(titles, counts)
+        assert counts == {878: 17, 35: 16} and len(stats['calls']) == 30
+        print(f"Looked up {len(stats['calls'])} titles in {elapsed:.2f}s, peak concurrency {stats['peak']}")
+    finally:
+        await runner.cleanup()
+
+
+def test_genre_fanout():
+    print("Testing concurrent genre lookups...")
+    with temp_data_dir(sql_storage=True):
+        asyncio.run(run_fanout_checks())
+
+if __name__ == "__main__":
+    test_genre_fanout()
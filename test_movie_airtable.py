@@ -38,9 +38,9 @@ async def test_movie_handler():
         try:
             # Check if we can list records from the tables
             print("Testing connection to Airtable tables...")
-            favorites = handler.favorites_table.all(max_records=1)
+            favorites = await handler.favorites_table.select(limit=1)
             print(f"- Successfully connected to {handler.airtable_favorites_table} table")
-            watched = handler.watched_table.all(max_records=1)
+            watched = await handler.watched_table.select(limit=1)
             print(f"- Successfully connected to {handler.airtable_watched_table} table")
             print("Airtable connection test successful!")
         except Exception as e:
@@ -0,0 +1,103 @@
+import asyncio
+import gzip
+import json
+import os
+from aiohttp import web
+from services.handlers.movie_handler import MovieHandler
+from services.movie_catalog import movie_catalog, similarity
+from services.tmdb_client import TMDBCache, TMDBClient
+from temp_env import temp_data_dir
+from tmdb_stub import start_tmdb
+
+EXPORT = [
+    {'id': 27205, 'original_title': 'Inception', 'popularity': 80.1, 'adult': False, 'video': False},
+    {'id': 157336, 'original_title': 'Interstellar', 'popularity': 95.3, 'adult': False, 'video': False},
+    {'id': 155, 'original_title': 'The Dark Knight', 'popularity': 90.0, 'adult': False, 'video': False},
+    {'id': 194, 'original_title': "Le Fabuleux Destin d'Amélie Poulain", 'popularity': 30.2, 'adult': False, 'video': False},
+    {'id': 1, 'original_title': 'Some Adult Film', 'popularity': 99.0, 'adult': True, 'video': False},
+    {'id': 2, 'original_title': 'Obscure Short', 'popularity': 0.1, 'adult': False, 'video': False}
+]
+
+DETAILS = {
+    27205: {'id': 27205, 'title': 'Inception', 'release_date': '2010-07-15', 'popularity': 80.1,
+            'genres': [{'id': 28, 'name': 'Action'}, {'id': 878, 'name': 'Science Fiction'}]},
+    157336: {'id': 157336, 'title': 'Interstellar', 'release_date': '2014-11-05', 'popularity': 95.3,
+             'genres': [{'id': 12, 'name': 'Adventure'}, {'id': 18, 'name': 'Drama'}, {'id': 878, 'name': 'Science Fiction'}]},
+    155: {'id': 155, 'title': 'The Dark Knight', 'release_date': '2008-07-16', 'popularity': 90.0,
+          'genres': [{'id': 18, 'name': 'Drama'}, {'id': 28, 'name': 'Action'}, {'id': 80, 'name': 'Crime'}]}
+}
+
+
+def tmdb_routes(calls):
+    """A TMDB stand-in for details, credits and search"""
+    async def details(request):
+        calls.append('details')
+        return web.json_response(DETAILS[int(request.match_info['id'])])
+    async def credits(request):
+        return web.json_response({'crew': [{'job': 'Director', 'name': 'Christopher Nolan'}]})
+    async def search(request):
+        calls.append('search')
+        return web.json_response({'results': [{'id': 10681, 'title': 'WALL·E', 'genre_ids': [16, 35, 878],
+                                               'release_date': '2008-06-22', 'popularity': 60.0}]})
+    return {
+        'movie/{id}': details,
+        'movie/{id}/credits': credits,
+        'search/movie': search
+    }
+
+
+async def run_catalog_checks():
+
+    # The daily export loads as gzipped JSON lines, without adult or unpopular entries
+    export = os.path.join(os.environ['SMS_DATA_DIR'], 'movie_ids.json.gz')
+    with gzip.open(export, 'wt') as f:
+        f.write('\n'.join(json.dumps(entry) for entry in EXPORT) + '\n')
+    assert movie_catalog.import_export_file(export, min_popularity=1.0) == 4
+    assert movie_catalog.stats()['movies'] == 4
+
+    # Misspelt, partial and accented titles resolve locally
+    assert similarity('Incepton', 'Inception') > 0.45
+    assert movie_catalog.best_match('Incepton')['id'] == 27205
+    assert movie_catalog.best_match('dark knight')['id'] == 155
+    assert movie_catalog.best_match('amelie poulain')['id'] == 194
+    assert movie_catalog.best_match('Paddington 2') is None
+    assert not movie_catalog.best_match('Interstellar')['enriched']
+
+    calls = []
+    runner, url = await start_tmdb(tmdb_routes(calls))
+    try:
+        tmdb = TMDBClient('test', url, cache=TMDBCache())
+        # Details fill in genres and years for the most popular export entries
+        assert await movie_catalog.enrich(tmdb, limit=2) == 2
+        assert movie_catalog.get(157336)['genre_ids'] == [12, 18, 878]
+        assert movie_catalog.stats()['enriched'] == 2
+        assert [m['id'] for m in movie_catalog.by_genre([878])] == [157336]
+        assert [m['id'] for m in movie_catalog.by_genre([18], exclude=[157336])] == [155]
+
+        # The handler resolves titles without searching TMDB, enriching a bare entry on the way
+        handler = MovieHandler()
+        handler.user_id = '+447700900002'
+        handler.tmdb = tmdb
+        calls.clear()
+        result = await handler._rate_movie({'movie_title': 'Inceptoin', 'rating': 5})
+        assert result['success'] and "'Inception'" in result['message']
+        assert calls == ['details']
+        stored = (await handler.watched_table.select(where={'Title': 'Inception'}))[0]['fields']
+        assert stored['TMDB_ID'] == '27205' and stored['Genre IDs'] == '28, 878'
+
+        # A miss goes to TMDB search, and the result is remembered for next time
+        result = await handler._rate_movie({'movie_title': 'Wall-E', 'rating': 4})
+        assert result['success'] and calls.count('search') == 1
+        assert movie_catalog.best_match('WALL·E')['id'] == 10681
+    finally:
+        await runner.cleanup()
+    print("Resolved movie titles from the local catalog")
+
+
+def test_movie_catalog():
+    print("Testing the local movie catalog...")
+    with temp_data_dir(sql_storage=True):
+        asyncio.run(run_catalog_checks())
+
+if __name__ == "__main__":
+    test_movie_catalog()
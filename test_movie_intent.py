@@ -0,0 +1,46 @@
+from benchmark_movie_intent import benchmark, load_corpus, mismatches
+from services.handlers.movie_handler import MovieHandler
+from services.movie_intent import GENRE_SYNONYMS, GenreMatcher, movie_intent_parser
+
+
+def test_genre_matcher():
+    print("Testing the genre matcher...")
+    genres = GenreMatcher(GENRE_SYNONYMS)
+    # Whole words only, in any spelling of the synonym
+    assert genres.find('any award winning movies') is None
+    assert genres.find('star wars marathon') is None
+    assert genres.find('something thrilling') == 'thriller'
+    for message in ('sci-fi', 'Sci Fi', 'scifi', 'science fiction'):
+        assert genres.find(f"good {message} films") == 'science fiction'
+    assert genres.find('a rom-com or two') == 'romance'
+    assert genres.find('horror films') == 'horror'
+    assert genres.find_all('funny or scary, maybe a comedy') == ['comedy', 'horror']
+    # Every genre the handler knows can be asked for by name
+    handler_genres = set(MovieHandler().genre_mapping)
+    assert set(GENRE_SYNONYMS) == handler_genres
+    assert all(genres.find(name) == name for name in handler_genres)
+
+
+def test_movie_intent_corpus():
+    print("Testing the movie intent parser against the labelled corpus...")
+    examples = load_corpus()
+    wrong = mismatches(examples)
+    assert not wrong, wrong
+    assert movie_intent_parser.parse('hello')['action'] == 'popular'
+    # Text after the rating doesn't lose its scale
+    assert movie_intent_parser.parse('rate inception 8/10 please') == {
+        'action': 'rate', 'genre': None, 'query': None, 'release_year': None, 'movie_title': 'inception', 'rating': 4.0}
+    # Genre words inside a title or naming the company aren't genre requests
+    assert movie_intent_parser.parse('recommend movies like scary movie') == {
+        'action': 'recommend', 'genre': None, 'query': 'scary movie', 'release_year': None}
+    assert movie_intent_parser.parse('find movie called the funny people')['genre'] is None
+    assert movie_intent_parser.parse('what movie should i watch with the kids')['action'] == 'recommend'
+    assert movie_intent_parser.parse('a scary movie to watch with my kids')['genre'] == 'horror'
+
+    stats = benchmark([e['message'] for e in examples], repeat=20)
+    print(f"Parsed {stats['parses']} messages at {stats['microseconds_per_message']}us each")
+    assert stats['microseconds_per_message'] < 1000
+
+if __name__ == "__main__":
+    test_genre_matcher()
+    test_movie_intent_corpus()
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import sqlite3
+from aiohttp import web
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient
+from services.handlers.movie_handler import MovieHandler
+from services.movie_metadata import METADATA_FIELDS, backfill_movie_metadata, genre_ids, writable
+from services.tmdb_client import TMDBCache, TMDBClient
+from services.user_profile import profile_store
+from temp_env import patched_env, temp_data_dir
+from tmdb_stub import start_tmdb
+
+MOVIES = {
+    'inception': {'id': 27205, 'title': 'Inception', 'genre_ids': [28, 878], 'release_date': '2010-07-15'},
+    'arrival': {'id': 329865, 'title': 'Arrival', 'genre_ids': [18, 878], 'release_date': '2016-11-10'},
+    'heat': {'id': 949, 'title': 'Heat', 'genre_ids': [80, 28], 'release_date': '1995-12-15'}
+}
+
+
+def tmdb_routes(calls):
+    """A TMDB stand-in for search and credits"""
+    async def search(request):
+        calls.append('search')
+        movie = MOVIES.get(request.query['query'].lower())
+        return web.json_response({'results': [movie] if movie else []})
+    async def credits(request):
+        calls.append('credits')
+        return web.json_response({'crew': [{'job': 'Director', 'name': f"Director {request.match_info['id']}"}]})
+    return {
+        'search/movie': search,
+        'movie/{id}/credits': credits
+    }
+
+
+async def run_metadata_checks():
+    # A database created before the metadata columns existed
+    conn = sqlite3.connect(f"{os.environ['SMS_DATA_DIR']}/movies.db")
+    conn.execute("CREATE TABLE movies_watched (id VARCHAR(32) PRIMARY KEY, airtable_id VARCHAR(32) UNIQUE, "
+                 "created_time VARCHAR(32), title VARCHAR(255), date_watched VARCHAR(255), "
+                 "date_recommended VARCHAR(255), user_rating FLOAT, extra TEXT)")
+    conn.execute("INSERT INTO movies_watched VALUES ('loc1', NULL, '2025-01-01T00:00:00.000Z', 'Heat', '2025-01-01', NULL, 5, NULL)")
+    conn.commit()
+    conn.close()
+
+    calls = []
+    runner, url = await start_tmdb(tmdb_routes(calls))
+    user = '+447700900001'
+    try:
+        handler = MovieHandler()
+        handler.user_id = user
+        handler.tmdb = TMDBClient('test', url, cache=TMDBCache())
+        await handler.watched_table.create({'Title': 'Arrival', 'Date Watched': '2025-02-01', 'User Rating': 4})
+
+        # Old rows are enriched in batches; a second run has nothing to do
+        result = await backfill_movie_metadata(handler.watched_table, handler.tmdb, batch_size=1)
+        assert result == {'checked': 2, 'updated': 2, 'unmatched': 0}
+        heat = (await handler.watched_table.select(where={'Title': 'Heat'}))[0]['fields']
+        assert heat['TMDB_ID'] == '949' and heat['Genre IDs'] == '80, 28'
+        assert heat['Year'] == '1995' and heat['Director'] == 'Director 949'
+        assert (await backfill_movie_metadata(handler.watched_table, handler.tmdb))['updated'] == 0
+
+        # Preferences are then built without any TMDB searches and kept in the profile
+        searches = calls.count('search')
+        assert await handler._get_favorite_genres() == [80, 28, 18]
+        assert calls.count('search') == searches
+        assert profile_store.get(user)['genre_counts'] == {'80': 1, '28': 1, '18': 1, '878': 1}
+
+        # A new rating stores its metadata and updates the histogram as it arrives
+        result = await handler._rate_movie({'movie_title': 'Inception', 'rating': 5})
+        assert result['success']
+        inception = (await handler.watched_table.select(where={'Title': 'Inception'}))[0]['fields']
+        assert inception['TMDB_ID'] == '27205' and inception['Genre IDs'] == '28, 878'
+        searches = calls.count('search')
+        assert await handler._get_favorite_genres() == [28, 878, 80]
+        assert profile_store.get(user)['genre_counts']['878'] == 2
+        assert calls.count('search') == searches
+
+        # The histogram is rebuilt from the tables when it falls due...
+        rebuilt = {'80': 1, '28': 2, '18': 1, '878': 2}
+        profile_store.update(user, {'genre_counts': {'99': 10}, 'genre_counts_built_at': '2020-01-01T00:00:00'})
+        assert await handler._get_favorite_genres() == [28, 878, 80]
+        assert profile_store.get(user)['genre_counts'] == rebuilt
+
+        # ...and after the movie tables are edited elsewhere
+        profile_store.update(user, {'genre_counts': {'99': 10}})
+        assert await handler._get_favorite_genres() == [99]
+        profile_store.drop_genre_counts()
+        assert not profile_store.genre_counts_current(profile_store.get(user))
+        await handler._rate_movie({'movie_title': 'Heat', 'rating': 5})
+        assert profile_store.get(user)['genre_counts'] == {'99': 10}
+        assert await handler._get_favorite_genres() == [28, 80, 878]
+        assert profile_store.get(user)['genre_counts'] == {'80': 2, '28': 3, '18': 1, '878': 2}
+    finally:
+        await runner.cleanup()
+
+    # Airtable updates go out in batches of 10
+    stub = AirtableStub()
+    stub_url = await stub.start()
+    try:
+        stub.add_records('Movies Watched', [{'Title': f"Film {i}"} for i in range(12)])
+        table = AirtableClient('patTEST', 'appTEST', stub_url).table('Movies Watched')
+        updated = await table.batch_update([{'id': r['id'], 'fields': {'Year': '2000'}} for r in stub.tables['Movies Watched']])
+        assert len(updated) == 12 and [r[0] for r in stub.requests].count('PATCH') == 2
+    finally:
+        await stub.stop()
+    print("Stored movie metadata and built genre preferences locally")
+
+
+async def run_probed_schema_checks():
+    # A token without the schema scope, and metadata columns still empty on every row
+    stub = AirtableStub()
+    stub_url = await stub.start()
+    stub.metadata_enabled = False
+    stub.schemas['Movies Watched'] = ['Title', 'Date Watched', 'User Rating'] + METADATA_FIELDS
+    stub.add_records('Movies Watched', [{'Title': 'Heat', 'User Rating': 5}, {'Title': 'Arrival', 'User Rating': 4}])
+    calls = []
+    runner, url = await start_tmdb(tmdb_routes(calls))
+    try:
+        with patched_env(AIRTABLE_API_URL=stub_url, AIRTABLE_API_KEY='patTEST', AIRTABLE_BASE_ID='appTEST'):
+            handler = MovieHandler()
+            handler.tmdb = TMDBClient('test', url, cache=TMDBCache())
+
+            # Fields the probe couldn't see are confirmed directly; ones the base lacks are not
+            available = await handler.watched_table.field_names()
+            assert set(METADATA_FIELDS) <= set(available) and 'Name' not in available
+            assert await writable(handler.watched_table, {'Title': 'Up', 'TMDB_ID': '14'}) == {'Title': 'Up', 'TMDB_ID': '14'}
+
+            assert (await backfill_movie_metadata(handler.watched_table, handler.tmdb))['updated'] == 2
+            heat = next(r['fields'] for r in stub.tables['Movies Watched'] if r['fields']['Title'] == 'Heat')
+            assert heat['TMDB_ID'] == '949' and heat['Genre IDs'] == '80, 28'
+            # ...and the replica now projects the filled-in columns
+            assert genre_ids((await handler.watched_table.select(where={'Title': 'Heat'}))[0]['fields']) == [80, 28]
+    finally:
+        await runner.cleanup()
+        await stub.stop()
+    print("Found empty metadata columns without the schema scope")
+
+
+def test_movie_metadata():
+    print("Testing stored movie metadata...")
+    with temp_data_dir(sql_storage=True):
+        asyncio.run(run_metadata_checks())
+
+
+def test_metadata_without_schema_scope():
+    print("Testing movie metadata with a probed schema...")
+    with temp_data_dir():
+        asyncio.run(run_probed_schema_checks())
+
+if __name__ == "__main__":
+    test_movie_metadata()
+    test_metadata_without_schema_scope()
@@ -33,7 +33,7 @@ async def test_movie_handler():
             }
             
             try:
-                record = handler.watched_table.create(new_movie)
+                record = await handler.watched_table.create(new_movie)
                 print(f"Successfully added movie with fields: {new_movie}")
                 print(f"Record ID: {record['id']}")
             except Exception as e:
@@ -47,7 +47,7 @@ async def test_movie_handler():
                         'Rating': 4.0
                     }
                     
-                    record = handler.watched_table.create(alt_movie)
+                    record = await handler.watched_table.create(alt_movie)
                     print(f"Successfully added movie with alternative fields: {alt_movie}")
                     print(f"Record ID: {record['id']}")
         except Exception as e:
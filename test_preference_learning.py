@@ -0,0 +1,51 @@
+import asyncio
+from services.preference_learning import PreferenceLearning
+from temp_env import temp_data_dir
+
+
+class FakeAirtable:
+    """Stands in for AirtableService with a fixed conversation history"""
+    def __init__(self, history):
+        self.airtable = True
+        self.history = history
+
+    async def stream_user_conversations(self, user_id, include_archive=False):
+        for record in self.history:
+            yield record
+
+
+def test_incremental_preferences():
+    print("Testing incremental preference aggregates...")
+    with temp_data_dir():
+
+        history = [
+            {'createdTime': '2025-03-20T08:15:00.000Z', 'fields': {'Body': "What's the weather in Manchester?", 'Intent': 'weather'}},
+            {'createdTime': '2025-03-21T08:20:00.000Z', 'fields': {'Body': 'Trains from Urmston to Manchester', 'Intent': 'transport'}},
+            {'createdTime': '2025-03-22T19:00:00.000Z', 'fields': {'Body': 'Recommend a movie', 'Intent': 'movies'}}
+        ]
+        learner = PreferenceLearning(airtable=FakeAirtable(history))
+
+        # Build the aggregate one turn at a time
+        learner.record_turn('+447700900000', "What's the weather in Manchester?", 'weather')
+        learner.record_turn('+447700900000', 'Trains from Urmston to Manchester', 'transport')
+        learner.record_turn('+447700900000', 'Recommend a movie', 'movies')
+
+        preferences = learner.get_preferences('+447700900000')
+        print(f"Incremental preferences: {preferences}")
+        assert dict(preferences['services']['most_used']) == {'weather': 1, 'transport': 1, 'movies': 1}
+        assert preferences['locations'][0] == 'manchester'
+        assert 'urmston' in preferences['locations']
+
+        # A full rebuild should agree with the incremental counts
+        rebuilt = asyncio.run(learner.rebuild_preferences('+447700900000'))
+        print(f"Rebuilt aggregate: {rebuilt}")
+        assert rebuilt['turns'] == 3
+        assert rebuilt['rebuilt_at'] is not None
+        assert learner.get_preferences('+447700900000')['services'] == preferences['services']
+
+        # A fresh instance reads the persisted aggregate
+        reloaded = PreferenceLearning(airtable=FakeAirtable([])).get_preferences('+447700900000')
+        assert reloaded['locations'] == preferences['locations']
+
+if __name__ == "__main__":
+    test_incremental_preferences()
@@ -0,0 +1,49 @@
+import asyncio
+import time
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient
+from services.rate_limiter import SharedRateLimiter
+from temp_env import temp_data_dir
+
+
+async def run_rate_limiter_checks():
+    stub = AirtableStub()
+    url = await stub.start()
+    stub.add_records('Shifts', [{'Date': '2025-04-01', 'Start Time': '09:00'}])
+    limiter = SharedRateLimiter('test_rate', 20)
+    table = AirtableClient('patTEST', 'appTEST', url, limiter).table('Shifts')
+
+    try:
+        # Calls on one base are spaced to the configured rate
+        started = time.perf_counter()
+        for _ in range(5):
+            await limiter.acquire('appOTHER')
+        elapsed = time.perf_counter() - started
+        print(f"5 slots at 20/s took {elapsed:.3f}s")
+        assert elapsed >= 0.19
+
+        # Identical concurrent reads are coalesced into one fetch
+        stub.requests.clear()
+        results = await asyncio.gather(*[table.all(formula="{Date} = '2025-04-01'") for _ in range(8)])
+        assert all(len(r) == 1 for r in results)
+        assert len([r for r in stub.requests if r[0] == 'GET']) == 1
+
+        # A 429 holds requests for the server's Retry-After hint, then retries
+        stub.requests.clear()
+        stub.throttle(1, retry_after=0.3)
+        started = time.perf_counter()
+        assert len(await table.all()) == 1
+        elapsed = time.perf_counter() - started
+        print(f"Retried after 429 in {elapsed:.3f}s: {[r[0] for r in stub.requests]}")
+        assert [r[0] for r in stub.requests] == ['429', 'GET'] and elapsed >= 0.3
+    finally:
+        await stub.stop()
+
+
+def test_rate_limiter():
+    print("Testing shared Airtable rate limiter...")
+    with temp_data_dir():
+        asyncio.run(run_rate_limiter_checks())
+
+if __name__ == "__main__":
+    test_rate_limiter()
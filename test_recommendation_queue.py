@@ -0,0 +1,98 @@
+import asyncio
+from aiohttp import web
+from services.handlers.movie_handler import MovieHandler
+from services.recommendation_queue import recommendation_queue
+from services.tmdb_client import TMDBCache, TMDBClient
+from services.user_profile import profile_store
+from temp_env import temp_data_dir
+from tmdb_stub import start_tmdb
+
+# Two pages of science fiction, most popular first
+SCI_FI = [{'id': i, 'title': f"Space Film {i}", 'genre_ids': [878], 'release_date': '2020-01-01',
+           'popularity': 100 - i} for i in range(1, 41)]
+
+
+def tmdb_routes(calls):
+    """A TMDB stand-in for discover, popular and credits"""
+    async def discover(request):
+        calls.append('discover')
+        page = int(request.query['page'])
+        return web.json_response({'results': SCI_FI[(page - 1) * 20:page * 20]})
+    async def popular(request):
+        calls.append('popular')
+        return web.json_response({'results': SCI_FI[:20]})
+    async def credits(request):
+        return web.json_response({'crew': []})
+    return {
+        'discover/movie': discover,
+        'movie/popular': popular,
+        'movie/{id}/credits': credits
+    }
+
+
+async def run_queue_checks():
+    calls = []
+    runner, url = await start_tmdb(tmdb_routes(calls))
+    user = '+447700900003'
+    try:
+        handler = MovieHandler()
+        handler.user_id = user
+        handler.tmdb = TMDBClient('test', url, cache=TMDBCache())
+        await handler.watched_table.create({'Title': 'Arrival', 'User Rating': 5, 'TMDB_ID': '329865',
+                                            'Genre IDs': '18, 878'})
+
+        # The first request is computed live and leaves a list building in the background
+        first = await handler._get_personalized_recommendations()
+        assert first['count'] == 5 and 'Science Fiction' in first['category']
+        await asyncio.wrap_future(recommendation_queue._building[user])
+        assert 25 <= recommendation_queue.remaining(user) <= 30
+        assert not recommendation_queue.due(user)
+
+        # Later requests pop from the list without calling TMDB, never repeating a movie
+        calls.clear()
+        second = await handler._get_personalized_recommendations()
+        assert calls == [] and second['count'] == 5
+        assert second['category'] == first['category']
+        shown = {m['id'] for m in first['movies']}
+        assert not shown & {m['id'] for m in second['movies']}
+
+        # A rating marks the list out of date and rebuilds it without the rated movie
+        next_up = recommendation_queue.pop(user, 1)[0][0]
+        recommendation_queue.replace(user, [next_up] + SCI_FI[30:], 'Recommended Science Fiction Movies For You')
+        await handler.watched_table.create({'Title': next_up['title'], 'User Rating': 2, 'TMDB_ID': str(next_up['id'])})
+        (await handler._watched_index()).add(next_up['title'], next_up['id'])
+        future = handler._refresh_candidates(changed=True)
+        assert future is not None
+        # The build is for the user who rated, even if the handler serves someone else meanwhile
+        handler.user_id = '+447700900004'
+        await asyncio.wrap_future(future)
+        handler.user_id = user
+        assert profile_store.get('+447700900004').get('genre_counts') is None
+        assert not recommendation_queue.due(user)
+        third = await handler._get_personalized_recommendations()
+        assert next_up['id'] not in {m['id'] for m in third['movies']}
+
+        # An empty list falls through to a live computation
+        recommendation_queue.replace(user, [], 'Recommended Science Fiction Movies For You')
+        fourth = await handler._get_personalized_recommendations()
+        assert fourth['count'] > 0 and fourth['category'].startswith('Recommended')
+        await asyncio.wrap_future(recommendation_queue._building[user])
+        assert recommendation_queue.remaining(user) > 0
+        assert recommendation_queue.stats()['users'] == 1
+
+        # Users without a list don't get one just for rating a movie
+        handler.user_id = '+447700900004'
+        assert handler._refresh_candidates(changed=True) is None
+        assert not recommendation_queue.has_list('+447700900004')
+    finally:
+        await runner.cleanup()
+    print("Served recommendations from precomputed candidate lists")
+
+
+def test_recommendation_queue():
+    print("Testing precomputed recommendation lists...")
+    with temp_data_dir(sql_storage=True):
+        asyncio.run(run_queue_checks())
+
+if __name__ == "__main__":
+    test_recommendation_queue()
@@ -0,0 +1,81 @@
+import asyncio
+from contextlib import asynccontextmanager
+from airtable_stub import AirtableStub
+from services import watched_index, write_behind
+from services.handlers.movie_handler import WATCHED_FIELDS, MovieHandler
+from services.tmdb_client import TMDBCache, TMDBClient
+from temp_env import patched_env, temp_data_dir
+
+MOVIES = [{'id': i, 'title': f"Film {i}", 'genre_ids': [878], 'release_date': '2019-05-01',
+           'director': f"Director {i}"} for i in range(1, 10)]
+
+
+@asynccontextmanager
+async def stubbed_watched_table():
+    """A movie handler saving to a stub Airtable whose watched table already holds Film 5"""
+    stub = AirtableStub()
+    url = await stub.start()
+    stub.schemas['Movies Watched'] = [f for f in WATCHED_FIELDS if f not in ('Name', 'Date', 'Rating')]
+    stub.add_records('Movies Watched', [{'Title': 'Film 5', 'Date Watched': '2025-01-01', 'User Rating': 4}])
+    try:
+        with patched_env(AIRTABLE_API_URL=url, AIRTABLE_API_KEY='patTEST', AIRTABLE_BASE_ID='appTEST'):
+            handler = MovieHandler()
+            # Nothing listens here; directors for these movies are already known
+            handler.tmdb = TMDBClient('test', 'http://127.0.0.1:9/3', cache=TMDBCache())
+            try:
+                yield stub, handler
+            finally:
+                # Buffers and indexes are per worker; leave none behind for the next stub
+                await asyncio.to_thread(handler.watched_table._write_log().flush)
+                write_behind._buffers.clear()
+                watched_index._indexes.clear()
+    finally:
+        await stub.stop()
+
+
+def posts(stub):
+    return [body for method, path, body in stub.requests if method == 'POST']
+
+
+async def run_dedup_checks():
+    async with stubbed_watched_table() as (stub, handler):
+        # Two rounds of recommendations are deduplicated against the watched index and queued
+        first = await handler._save_recommendations(MOVIES[:5])
+        second = await handler._save_recommendations(MOVIES[4:] + MOVIES[:1])
+        await asyncio.wrap_future(first)
+        await asyncio.wrap_future(second)
+        assert not posts(stub)
+        assert await handler._save_recommendations(MOVIES[:2]) is None
+        assert handler.watched_table.pending_writes()['pending'] == 8
+    print("Deduplicated recommendations without writing to Airtable")
+
+
+async def run_batch_checks():
+    async with stubbed_watched_table() as (stub, handler):
+        await asyncio.wrap_future(await handler._save_recommendations(MOVIES))
+
+        # The queued rows reach Airtable together in one batch create, with their metadata
+        buffer = handler.watched_table._write_log()
+        await asyncio.to_thread(buffer.flush)
+        assert [len(body['records']) for body in posts(stub)] == [8]
+        rows = {r['fields']['Title']: r['fields'] for r in stub.tables['Movies Watched']}
+        assert len(rows) == 9 and 'Date Recommended' not in rows['Film 5']
+        assert rows['Film 9']['TMDB_ID'] == '9' and rows['Film 9']['Director'] == 'Director 9'
+        assert rows['Film 1']['Genre IDs'] == '878' and rows['Film 1']['Year'] == '2019'
+    print("Saved recommendations in one batched, deferred write")
+
+
+def test_recommendation_dedup():
+    print("Testing recommendation saving deduplication...")
+    with temp_data_dir():
+        asyncio.run(run_dedup_checks())
+
+
+def test_recommendation_saving():
+    print("Testing batched recommendation saving...")
+    with temp_data_dir():
+        asyncio.run(run_batch_checks())
+
+if __name__ == "__main__":
+    test_recommendation_dedup()
+    test_recommendation_saving()
@@ -0,0 +1,84 @@
+import json
+import time
+from services.relevance_index import RelevanceIndex
+from temp_env import temp_data_dir
+
+
+def make_record(i, body, response, intent=''):
+    return {
+        'id': f"rec{i}",
+        'createdTime': f"2025-03-{i % 28 + 1:02d}T10:00:00.000Z",
+        'fields': {'Body': body, 'Response': response, 'Intent': intent}
+    }
+
+
+def test_relevance_index():
+    print("Testing BM25 relevance index...")
+    with temp_data_dir():
+        index = RelevanceIndex()
+        user = '+447700900000'
+
+        history = [
+            make_record(1, "What's the weather in Manchester?", "It's 12°C and cloudy in Manchester.", 'weather'),
+            make_record(2, "Can you suggest something to watch tonight?", "I'd suggest the film Arrival, a thoughtful sci-fi movie.", 'movies'),
+            make_record(3, "When is my next shift?", "Your next shift is Monday 09:00 - 17:00.", 'shifts'),
+            make_record(4, "Trains from Urmston to Manchester", "Next train leaves Urmston at 08:12.", 'transport')
+        ]
+        index.backfill(user, history)
+        index.add(user, make_record(5, "Thanks!", "You're welcome.", 'conversation'))
+
+        results = index.search(user, "what was that film you suggested last month")
+        print(f"Top result: {results[0]['fields']['Response']}")
+        assert results[0]['id'] == 'rec2'
+        assert index.recent(user, 1)[0]['id'] == 'rec5'
+
+        # A fresh index picks the same turns back up from disk
+        assert RelevanceIndex().search(user, "next shift")[0]['id'] == 'rec3'
+
+        # Searching a few hundred turns should stay well under a millisecond
+        for i in range(6, 500):
+            index.add(user, make_record(i, f"message number {i} about trains and weather", f"reply {i}"))
+        start = time.perf_counter()
+        for _ in range(100):
+            index.search(user, "what was that film you suggested")
+        elapsed_ms = (time.perf_counter() - start) * 1000 / 100
+        print(f"Average search time over 500 turns: {elapsed_ms:.3f}ms")
+        assert elapsed_ms < 1.0
+
+
+def test_relevance_index_rewritten_elsewhere():
+    print("Testing relevance index reloads after another worker rewrites it...")
+    with temp_data_dir():
+        index, other = RelevanceIndex(), RelevanceIndex()
+        user = '+447700900000'
+        index.backfill(user, [make_record(1, "Trains to Leeds", "The 08:12 to Leeds."),
+                              make_record(2, "Weather in York", "Sunny in York.")])
+        assert index.search(user, "leeds")[0]['id'] == 'rec1'
+
+        # Rewritten in place to the same size: only the mtime tells
+        path = index._index_path(user)
+        with open(path) as f:
+            content = f.read()
+        time.sleep(0.01)
+        with open(path, 'w') as f:
+            f.write(content.replace('Leeds', 'Derby').replace('rec1', 'rec9'))
+        assert index.search(user, "leeds") == []
+        assert index.search(user, "derby")[0]['id'] == 'rec9'
+
+        # Rewritten in place to a longer file: the old offset lands mid-line
+        with open(path, 'w') as f:
+            for record in [make_record(3, "Shift on Monday", "Monday 09:00 to 17:00 at the depot."),
+                           make_record(4, "Shift on Tuesday", "Tuesday 10:00."),
+                           make_record(5, "Film tonight", "Arrival.")]:
+                f.write(json.dumps(other._compact(record)) + '\n')
+        assert [r['id'] for r in index.recent(user, 5)] == ['rec5', 'rec4', 'rec3']
+
+        # Replaced by a backfill, then dropped, by the other worker
+        other.backfill(user, [make_record(6, "Bus to Bolton", "The 36 bus.")])
+        assert [r['id'] for r in index.recent(user, 5)] == ['rec6']
+        other.drop(user)
+        assert index.recent(user, 5) == [] and index.search(user, "bolton") == []
+
+if __name__ == "__main__":
+    test_relevance_index()
+    test_relevance_index_rewritten_elsewhere()
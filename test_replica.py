@@ -0,0 +1,54 @@
+import asyncio
+import time
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient
+from services.replica import AirtableReplica
+from temp_env import temp_data_dir
+
+
+async def run_replica_checks():
+    stub = AirtableStub(page_size=5)
+    url = await stub.start()
+    stub.add_records('Movies Watched', [
+        {'Title': f"Movie {i}", 'User Rating': i % 6} for i in range(12)
+    ])
+    table = AirtableClient('patTEST', 'appTEST', url).table('Movies Watched')
+    watched = AirtableReplica().table(table, indexed=['Title'])
+
+    try:
+        # The first read waits for a full sync, later reads stay local
+        assert len(await watched.select()) == 12
+        gets = len(stub.requests)
+        started = time.perf_counter()
+        matches = await watched.select(where={'Title': 'movie 7'})
+        elapsed = time.perf_counter() - started
+        print(f"Indexed lookup took {elapsed * 1000:.3f}ms")
+        assert [r['fields']['Title'] for r in matches] == ['Movie 7']
+        assert len(await watched.select(where={'User Rating': ('>=', 4)})) == 4
+        assert len(stub.requests) == gets
+
+        # Our own writes are visible straight away
+        created = await watched.create({'Title': "Schindler's List", 'User Rating': 5})
+        assert (await watched.select(where={'Title': "schindler's list"}))[0]['id'] == created['id']
+        await watched.delete(created['id'])
+        assert not await watched.select(where={'Title': "Schindler's List"})
+
+        # An incremental sync only fetches records modified since the cursor
+        stub.modified = {record_id: '2000-01-01T00:00:00.000Z' for record_id in stub.modified}
+        record = stub.tables['Movies Watched'][0]
+        stub.tables['Movies Watched'][0] = dict(record, fields={'Title': 'Movie 0', 'User Rating': 5})
+        stub.modified[record['id']] = '2999-01-01T00:00:00.000Z'
+        assert await watched.sync() == 1
+        assert 'LAST_MODIFIED_TIME()' in stub.requests[-1][2]['filterByFormula']
+        assert (await watched.select(where={'Title': 'Movie 0'}))[0]['fields']['User Rating'] == 5
+    finally:
+        await stub.stop()
+
+
+def test_replica():
+    print("Testing local Airtable replica...")
+    with temp_data_dir():
+        asyncio.run(run_replica_checks())
+
+if __name__ == "__main__":
+    test_replica()
@@ -0,0 +1,46 @@
+import asyncio
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient
+from services.rate_limiter import SharedRateLimiter
+from services.schema_registry import SchemaRegistry
+from temp_env import temp_data_dir
+
+
+async def run_schema_checks():
+    stub = AirtableStub()
+    url = await stub.start()
+    stub.add_records('Movies Watched', [{'Name': 'Heat', 'Rating': 5}, {'Name': 'Up', 'Date': '2025-04-01'}])
+    stub.schemas['Shifts'] = ['Date', 'Start Time', 'End Time', 'Notes']
+    client = AirtableClient('patTEST', 'appTEST', url, SharedRateLimiter('test_rate', 1000))
+    watched, shifts = client.table('Movies Watched'), client.table('Shifts')
+
+    try:
+        # One metadata call loads every table, later lookups are cached
+        registry = SchemaRegistry(ttl=60)
+        assert await registry.pick(watched, 'User Rating', 'Rating') == 'Rating'
+        assert await registry.pick(watched, 'Title', 'Name') == 'Name'
+        assert 'Notes' in await registry.field_names(shifts)
+        assert [r[0] for r in stub.requests] == ['META']
+
+        # Another worker shares the cached schema from disk
+        assert await SchemaRegistry(ttl=60).has_field(shifts, 'Start Time')
+        assert len(stub.requests) == 1
+
+        # Without the metadata scope, a single probe of a few records is used
+        stub.metadata_enabled = False
+        stub.requests.clear()
+        registry = SchemaRegistry(ttl=0)
+        assert await registry.field_names(watched) == ['Name', 'Rating', 'Date']
+        print(f"Probe requests: {[r[0] for r in stub.requests]}")
+        assert [r[0] for r in stub.requests] == ['META', 'GET']
+    finally:
+        await stub.stop()
+
+
+def test_schema_registry():
+    print("Testing cached Airtable schema registry...")
+    with temp_data_dir():
+        asyncio.run(run_schema_checks())
+
+if __name__ == "__main__":
+    test_schema_registry()
@@ -0,0 +1,44 @@
+import asyncio
+import datetime
+from services.handlers import shift_handler
+from services.handlers.shift_handler import ShiftHandler
+from temp_env import temp_data_dir
+
+
+def day(offset):
+    return datetime.date.today() + datetime.timedelta(days=offset)
+
+
+async def run_shift_date_checks():
+    handler = ShiftHandler()
+    table = handler.airtable_client
+    await table.batch_create([
+        {'Date': day(-3).isoformat(), 'Start Time': '09:00', 'End Time': '17:00'},
+        {'Date': day(5).isoformat(), 'Start Time': '09:00', 'End Time': '17:00'}
+    ])
+
+    # Only ISO dates: the first scan checks them, later ones query in storage
+    assert (await handler._handle_next_shift())['shift']['date_obj'] == day(5)
+    assert handler.airtable_table_name in shift_handler._iso_checked
+    assert (await handler._handle_next_shift())['shift']['date_obj'] == day(5)
+
+    # A DD/MM/YYYY row typed into the table sorts wrongly as text
+    await table.create({'Date': day(2).strftime('%d/%m/%Y'), 'Start Time': '10:00', 'End Time': '14:00'})
+    shift_handler._iso_checked.clear()
+    result = await handler._handle_next_shift()
+    assert result['shift']['date_obj'] == day(2) and result['shift']['start_time'] == '10:00'
+    assert handler.airtable_table_name not in shift_handler._iso_checked
+
+    listed = await handler._handle_list_shifts({'date': None})
+    assert [s['date_obj'] for s in listed['shifts']] == [day(-3), day(2), day(5)]
+    print("Next shift found across ISO and DD/MM/YYYY dates")
+
+
+def test_shift_dates():
+    print("Testing shift date ordering...")
+    with temp_data_dir(sql_storage=True):
+        shift_handler._iso_checked.clear()
+        asyncio.run(run_shift_date_checks())
+
+if __name__ == "__main__":
+    test_shift_dates()
@@ -0,0 +1,57 @@
+import asyncio
+import os
+from airtable_stub import AirtableStub
+from migrate_storage import migrate
+from services.airtable_client import AirtableClient
+from services.rate_limiter import SharedRateLimiter
+from services.storage import SQLStorage
+from temp_env import temp_data_dir
+
+
+async def run_storage_checks():
+    storage = SQLStorage(f"sqlite:///{os.environ['SMS_DATA_DIR']}/test.db", mirror=False)
+    shifts = storage.table('shifts', 'Shifts', indexed=['Date'])
+
+    # Records come back in the Airtable shape, including unmapped fields
+    created = await shifts.create({'Date': '2025-04-02', 'Start Time': '09:00', 'Location': 'Depot'})
+    await shifts.batch_create([{'Date': f"2025-04-0{d}", 'Start Time': '10:00'} for d in (1, 3)])
+    assert [r['fields']['Date'] for r in await shifts.select(order_by='Date')] == ['2025-04-01', '2025-04-02', '2025-04-03']
+    found = await shifts.select(where={'Date': '2025-04-02'})
+    assert found[0]['fields'] == {'Date': '2025-04-02', 'Start Time': '09:00', 'Location': 'Depot'}
+    assert len(await shifts.select(where={'Location': 'Depot'})) == 1
+
+    await shifts.update(created['id'], {'Notes': "Ann's cover"})
+    assert (await shifts.select(where={'Date': '2025-04-02'}))[0]['fields']['Notes'] == "Ann's cover"
+    await shifts.delete(created['id'])
+    assert len(await shifts.select()) == 2
+    assert 'Start Time' in await shifts.field_names()
+
+    # Indexed lookups are case-insensitive, like the replica
+    watched = storage.table('movies_watched', 'Movies Watched', indexed=['Title'])
+    await watched.create({'Title': 'Inception', 'User Rating': 5})
+    assert len(await watched.select(where={'Title': 'inception'})) == 1
+    assert len(await watched.select(where={'User Rating': ('>=', 4)})) == 1
+
+    # The migration CLI copies Airtable tables over and can be re-run
+    stub = AirtableStub()
+    url = await stub.start()
+    try:
+        stub.add_records('Conversations', [{'From': '+44', 'Body': f"hi {i}", 'Intent': 'general'} for i in range(3)])
+        client = AirtableClient('patTEST', 'appTEST', url, SharedRateLimiter('test_rate', 1000))
+        url_db = f"sqlite:///{os.environ['SMS_DATA_DIR']}/migrated.db"
+        assert await migrate(url_db, ['conversations'], client) == {'conversations': 3}
+        assert await migrate(url_db, ['conversations'], client) == {'conversations': 0}
+        history = await SQLStorage(url_db, mirror=False).table('conversations', 'Conversations', ['From']).select(where={'From': '+44'})
+        print(f"Migrated: {[r['fields']['Body'] for r in history]}")
+        assert len(history) == 3
+    finally:
+        await stub.stop()
+
+
+def test_storage():
+    print("Testing SQL storage backend...")
+    with temp_data_dir():
+        asyncio.run(run_storage_checks())
+
+if __name__ == "__main__":
+    test_storage()
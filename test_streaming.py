@@ -0,0 +1,63 @@
+import asyncio
+import datetime
+import os
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient
+from services.replica import AirtableReplica
+from services.storage import SQLStorage
+from temp_env import temp_data_dir
+
+
+async def run_streaming_checks():
+    stub = AirtableStub(page_size=5)
+    url = await stub.start()
+    stub.add_records('Conversations', [
+        {'From': '+447700900001' if i % 2 else '+447700900002', 'Body': f"Message {i}"} for i in range(23)
+    ])
+    table = AirtableClient('patTEST', 'appTEST', url).table('Conversations')
+
+    try:
+        # Pages are fetched lazily, so stopping early skips the rest
+        async for record in table.iterate():
+            break
+        assert len(stub.requests) == 1
+        pages = [page async for page in table.pages()]
+        assert [len(page) for page in pages] == [5, 5, 5, 5, 3]
+        assert len([r async for r in table.iterate(max_records=7)]) == 7
+
+        # The replica syncs page by page and streams from a read snapshot
+        stub.tables['Conversations'][0]['createdTime'] = '2025-01-01T00:00:00.000Z'
+        conversations = AirtableReplica().table(table, indexed=['From'])
+        assert await conversations.sync(full=True) == 23
+        streamed = [r async for r in conversations.stream(where={'From': '+447700900001'}, batch_size=4)]
+        assert [r['fields']['Body'] for r in streamed] == [f"Message {i}" for i in range(1, 23, 2)]
+        async for record in conversations.stream(batch_size=4):
+            await conversations.create({'From': '+447700900003', 'Body': 'Written mid-scan'})
+            break
+
+        # A full sync still drops records deleted in Airtable
+        removed = stub.tables['Conversations'].pop(0)
+        await conversations.sync(full=True)
+        assert not await conversations.select(where={'From': removed['fields']['From'], 'Body': 'Message 0'})
+        assert len(await conversations.select(where={'From': '+447700900003'})) == 1
+    finally:
+        await stub.stop()
+
+    # The SQL backend streams in LIMIT/OFFSET pages
+    shifts = SQLStorage(f"sqlite:///{os.environ['SMS_DATA_DIR']}/stream.db", mirror=False).table('shifts', 'Shifts', ['Date'])
+    today = datetime.date.today()
+    await shifts.batch_create([
+        {'Date': (today + datetime.timedelta(days=d)).isoformat(), 'Start Time': '09:00'} for d in (5, -2, 1, 3, 8, 2, -1)
+    ])
+    dates = [r['fields']['Date'] async for r in shifts.stream(where={'Date': ('>=', today.isoformat())}, order_by='Date', batch_size=2)]
+    assert dates == sorted(dates) and len(dates) == 5
+    print(f"Streamed {len(dates)} upcoming shifts in batches of 2")
+
+
+def test_streaming():
+    print("Testing streamed table reads...")
+    with temp_data_dir():
+        asyncio.run(run_streaming_checks())
+
+if __name__ == "__main__":
+    test_streaming()
@@ -0,0 +1,69 @@
+import asyncio
+from aiohttp import web
+from services.tmdb_client import DETAIL_TTL, LIST_TTL, TMDBCache, TMDBClient, TMDBError, ttl_for
+from temp_env import temp_data_dir
+from tmdb_stub import start_tmdb
+
+
+def tmdb_routes(calls):
+    """A local stand-in for the TMDB API that counts requests"""
+    async def handle(request):
+        path = request.match_info['path']
+        calls.append(path)
+        if path == 'movie/0':
+            return web.json_response({'status_message': 'Not found'}, status=404)
+        return web.json_response({'path': path, 'results': [{'id': 1, 'title': 'Inception'}]})
+    return {'{path:.*}': handle}
+
+
+async def run_tmdb_cache_checks():
+    calls = []
+    runner, url = await start_tmdb(tmdb_routes(calls))
+    try:
+        assert ttl_for('movie/popular') == LIST_TTL and ttl_for('discover/movie') == LIST_TTL
+        assert ttl_for('movie/27205') == DETAIL_TTL and ttl_for('movie/27205/credits') == DETAIL_TTL
+
+        client = TMDBClient('test', url, cache=TMDBCache(max_entries=2))
+        for _ in range(3):
+            data = await client.get('search/movie', {'query': 'inception', 'page': 1})
+        assert data['results'][0]['title'] == 'Inception' and calls == ['search/movie']
+        await client.get('search/movie', {'query': 'arrival', 'page': 1})
+        assert len(calls) == 2
+
+        # Errors are raised and not cached
+        for _ in range(2):
+            try:
+                await client.get('movie/0')
+                assert False, "expected a TMDB error"
+            except TMDBError as e:
+                assert e.status == 404
+        assert calls.count('movie/0') == 2
+
+        # The disk tier outlives the worker's memory (e.g. after a restart)
+        restarted = TMDBClient('test', url, cache=TMDBCache())
+        await restarted.get('search/movie', {'query': 'inception', 'page': 1})
+        assert len(calls) == 4 and restarted.cache.counts['disk_hits'] == 1
+        await restarted.get('search/movie', {'query': 'inception', 'page': 1})
+        assert restarted.cache.counts['memory_hits'] == 1
+
+        # Expired entries are fetched again
+        restarted.cache.put('movie/popular?language=en-US&page=1', '{"results": []}', ttl=-1)
+        await restarted.get('movie/popular', {'page': 1})
+        assert calls[-1] == 'movie/popular'
+        assert restarted.cache.prune() == 0
+
+        stats = client.cache.stats()
+        assert stats['memory_entries'] == 2 and stats['disk_entries'] == 3 and stats['disk_bytes'] > 0
+        assert stats['hit_ratio'] == round(2 / 6, 3)
+        print(f"TMDB cache stats: {stats}")
+    finally:
+        await runner.cleanup()
+
+
+def test_tmdb_cache():
+    print("Testing TMDB response cache...")
+    with temp_data_dir():
+        asyncio.run(run_tmdb_cache_checks())
+
+if __name__ == "__main__":
+    test_tmdb_cache()
@@ -0,0 +1,74 @@
+import asyncio
+import os
+import threading
+from services.airtable_service import AirtableService
+from services.context_retrieval import ContextRetrieval
+from services.user_profile import profile_store
+from temp_env import temp_data_dir
+
+
+def test_user_profile_context():
+    print("Testing denormalised user profile context...")
+    with temp_data_dir():
+        os.environ.pop('AIRTABLE_API_KEY', None)
+        user = '+447700900001'
+
+        # First contact creates an empty index, then writes keep the profile current
+        context_service = ContextRetrieval()
+        asyncio.run(context_service.get_context(user, 'general', 'hello'))
+
+        airtable = AirtableService()
+        asyncio.run(airtable.store_conversation(user, "What's the weather in Leeds?", "It's sunny in Leeds.", 'weather'))
+        asyncio.run(airtable.store_conversation(user, "Suggest a film for tonight", "How about the movie Paddington 2?", 'movies'))
+        profile_store.record_stations(user, ['urmston', 'manchester'])
+        profile_store.record_stations(user, ['urmston', 'leeds'])
+
+        context = asyncio.run(context_service.get_context(user, 'movies', 'which film did you suggest?'))
+        print(f"Context: {context}")
+        assert context['recent_context'][0]['body'] == "Suggest a film for tonight"
+        assert context['relevant_context'][0]['fields']['Response'] == "How about the movie Paddington 2?"
+        assert context['user_profile']['usual_stations'][0] == 'urmston'
+        assert context['user_profile']['locations'] == ['leeds']
+        assert dict(context['user_preferences']['services']['most_used']) == {'weather': 1, 'movies': 1}
+
+
+
+def test_user_profile_concurrent_writes():
+    print("Testing concurrent user profile writes...")
+    with temp_data_dir():
+        user = '+447700900002'
+
+        # Read-modify-writes from many threads (or workers) don't lose updates
+        def count_visits():
+            for _ in range(25):
+                profile_store.record_stations(user, ['urmston'])
+        threads = [threading.Thread(target=count_visits) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert profile_store.get(user)['stations'] == {'urmston': 200}
+
+        # Callers get their own copy of a profile
+        profile_store.get(user)['stations']['leeds'] = 1
+        assert profile_store.get(user)['stations'] == {'urmston': 200}
+
+def test_recent_conversations():
+    print("Testing recent conversation lookups...")
+    with temp_data_dir(sql_storage=True):
+        user = '+447700900003'
+        airtable = AirtableService()
+        for body, intent in [("Weather in Leeds?", 'weather'), ("Suggest a film", 'movies'),
+                             ("Weather in York?", 'weather'), ("Next train to Bolton", 'transport')]:
+            asyncio.run(airtable.store_conversation(user, body, 'OK', intent))
+
+        recent = asyncio.run(airtable.get_recent_conversations(user, 2))
+        assert [r['fields']['Body'] for r in recent] == ["Next train to Bolton", "Weather in York?"]
+        weather = asyncio.run(airtable.get_conversations_by_intent(user, 'weather'))
+        assert [r['fields']['Body'] for r in weather] == ["Weather in York?", "Weather in Leeds?"]
+        assert asyncio.run(airtable.get_conversations_by_intent(user, 'shifts')) == []
+
+if __name__ == "__main__":
+    test_user_profile_context()
+    test_user_profile_concurrent_writes()
+    test_recent_conversations()
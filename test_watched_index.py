@@ -0,0 +1,76 @@
+import asyncio
+from aiohttp import web
+from services.handlers.movie_handler import MovieHandler
+from services.tmdb_client import TMDBCache, TMDBClient
+from services.watched_index import normalise_title
+from temp_env import temp_data_dir
+from tmdb_stub import start_tmdb
+
+CANDIDATES = [
+    {'id': 194, 'title': 'Amelie'},
+    {'id': 634649, 'title': 'Spider-Man: No Way Home'},
+    {'id': 329865, 'title': 'Arrival (2016)'},
+    {'id': 27205, 'title': 'Inception'},
+    {'id': 157336, 'title': 'Interstellar'}
+]
+
+
+def tmdb_routes():
+    """A TMDB stand-in serving the candidates as a one-page recommendation list"""
+    async def recommendations(request):
+        return web.json_response({'page': 1, 'total_pages': 1, 'results': CANDIDATES})
+    async def credits(request):
+        return web.json_response({'crew': []})
+    return {
+        'movie/{id}/recommendations': recommendations,
+        'movie/{id}/credits': credits
+    }
+
+
+async def run_watched_index_checks():
+    runner, url = await start_tmdb(tmdb_routes())
+    try:
+        handler = MovieHandler()
+        handler.tmdb = TMDBClient('test', url, cache=TMDBCache())
+        await handler.watched_table.batch_create([
+            {'Title': 'Amélie', 'Date Watched': '2025-01-01', 'User Rating': 5},
+            {'Title': 'Spider-Man: No Way Home', 'Date Recommended': '2025-01-02'},
+            {'Title': 'Arrival', 'TMDB_ID': '329865', 'Date Watched': '2025-01-03'}
+        ])
+        assert normalise_title('Spider-Man:  No Way Home') == 'spider man no way home'
+
+        # Titles and ids from the candidate list are matched without any lookups
+        unwatched = await handler._first_unwatched_from('movie/1/recommendations')
+        assert [m['title'] for m in unwatched] == ['Inception', 'Interstellar']
+        unwatched = await handler._first_unwatched_from('movie/1/recommendations', limit=1)
+        assert [m['title'] for m in unwatched] == ['Inception']
+
+        # Saving a recommendation updates the index, so it isn't saved or offered twice
+        await asyncio.wrap_future(await handler._save_recommendations([CANDIDATES[3], CANDIDATES[3]]))
+        assert await handler._save_recommendations([CANDIDATES[3]]) is None
+        assert len(await handler.watched_table.select(where={'Title': 'Inception'})) == 1
+        assert {'id': 27205, 'title': 'Inception'} in await handler._watched_index()
+        unwatched = await handler._first_unwatched_from('movie/1/recommendations')
+        assert [m['title'] for m in unwatched] == ['Interstellar']
+
+        # A movie only joins the index once its row is written
+        index = await handler._watched_index()
+        def fail(fields, max_age=5.0):
+            raise OSError('disk full')
+        handler.watched_table.append = fail
+        future = await handler._save_recommendations([CANDIDATES[4]])
+        await asyncio.wait([asyncio.wrap_future(future)])
+        assert isinstance(future.exception(), OSError)
+        assert CANDIDATES[4] not in index and not index.saving
+        print("Watched index filtered candidates without per-movie lookups")
+    finally:
+        await runner.cleanup()
+
+
+def test_watched_index():
+    print("Testing watched movie index...")
+    with temp_data_dir(sql_storage=True):
+        asyncio.run(run_watched_index_checks())
+
+if __name__ == "__main__":
+    test_watched_index()
@@ -0,0 +1,98 @@
+import asyncio
+import json
+import os
+from airtable_stub import AirtableStub
+from services.airtable_client import AirtableClient
+from services.write_behind import WriteBehindBuffer
+from temp_env import temp_data_dir
+
+
+async def run_write_behind_checks():
+    stub = AirtableStub()
+    url = await stub.start()
+    client = AirtableClient('patTEST', 'appTEST', url)
+
+    try:
+        # A spool left by a dead worker is replayed past its last flushed row
+        spool_dir = os.path.join(os.environ['SMS_DATA_DIR'], 'spool')
+        os.makedirs(spool_dir)
+        with open(os.path.join(spool_dir, 'conversations-999999.jsonl'), 'w') as f:
+            for seq in (1, 2, 3):
+                f.write(json.dumps({'seq': seq, 'at': 0, 'fields': {'Body': f"old {seq}"}}) + '\n')
+        with open(os.path.join(spool_dir, 'conversations-999999.ack'), 'w') as f:
+            f.write('1')
+
+        buffer = WriteBehindBuffer('Conversations', 'conversations', max_age=0.3, client=client)
+        assert buffer.stats()['pending'] == 2
+
+        for i in range(10):
+            buffer.enqueue({'Body': f"new {i}"})
+        await asyncio.sleep(1.0)
+
+        posts = [r for r in stub.requests if r[0] == 'POST']
+        print(f"Flushed {len(stub.tables['Conversations'])} rows in {len(posts)} batches: {buffer.stats()}")
+        assert [len(body['records']) for _, _, body in posts] == [10, 2]
+        bodies = {r['fields']['Body'] for r in stub.tables['Conversations']}
+        assert {'old 2', 'old 3', 'new 9'} <= bodies and 'old 1' not in bodies
+
+        stats = buffer.stats()
+        assert stats['pending'] == 0 and stats['flushed'] == 12 and stats['batches'] == 2
+        assert stats['max_flush_lag'] > 0
+        assert os.path.getsize(buffer._spool_path(buffer.owner)) == 0
+    finally:
+        await stub.stop()
+
+
+def write_spool(path, seqs, label):
+    with open(path, 'w') as f:
+        for seq in seqs:
+            f.write(json.dumps({'seq': seq, 'at': 0, 'fields': {'Body': f"{label} {seq}"}}) + '\n')
+
+
+async def run_claim_checks():
+    stub = AirtableStub()
+    url = await stub.start()
+    client = AirtableClient('patTEST', 'appTEST', url)
+
+    try:
+        spool_dir = os.path.join(os.environ['SMS_DATA_DIR'], 'spool')
+        os.makedirs(spool_dir)
+        # A claim whose replaying worker died part way through its rows
+        claim = os.path.join(spool_dir, 'conversations-999998.jsonl.999997_5.replay')
+        write_spool(claim, (1, 2, 3), 'claimed')
+        with open(os.path.join(spool_dir, 'conversations-999998.ack'), 'w') as f:
+            f.write('2')
+        # A spool from an earlier worker that had this worker's pid
+        reused = os.path.join(spool_dir, f"conversations-{os.getpid()}_1.jsonl")
+        write_spool(reused, (1, 2), 'reused')
+
+        buffer = WriteBehindBuffer('Conversations', 'conversations', max_age=0.3, client=client)
+        assert buffer.owner != f"{os.getpid()}_1"
+        assert buffer.stats()['pending'] == 3
+
+        # Claims are kept until their rows are in Airtable
+        claims = [name for name in os.listdir(spool_dir) if name.endswith('.replay')]
+        assert len(claims) == 2 and all(name.endswith(f".{buffer.owner}.replay") for name in claims)
+        await asyncio.sleep(1.0)
+        bodies = sorted(r['fields']['Body'] for r in stub.tables['Conversations'])
+        assert bodies == ['claimed 3', 'reused 1', 'reused 2']
+        assert not [name for name in os.listdir(spool_dir) if name.endswith(('.replay', '.ack')) and buffer.owner not in name]
+        print(f"Replayed stale claims: {bodies}")
+    finally:
+        await stub.stop()
+
+
+def test_write_behind_claims():
+    print("Testing write-behind replay of stale claims...")
+    with temp_data_dir():
+        asyncio.run(run_claim_checks())
+
+
+def test_write_behind_buffer():
+    print("Testing write-behind conversation logging...")
+    with temp_data_dir():
+        asyncio.run(run_write_behind_checks())
+
+if __name__ == "__main__":
+    test_write_behind_buffer()
+    test_write_behind_claims()
@@ -0,0 +1,24 @@
+import socket
+from typing import Awaitable, Callable, Dict, Tuple
+from aiohttp import web
+
+Handler = Callable[[web.Request], Awaitable[web.StreamResponse]]
+
+
+async def start_tmdb(routes: Dict[str, Handler]) -> Tuple[web.AppRunner, str]:
+    """Serve a local stand-in for the TMDB API on a free port.
+
+    routes maps paths under /3/ (aiohttp patterns such as
+    'movie/{id}/credits', matched in order) to GET handlers. Returns the
+    runner, to clean up when done, and the base url to give TMDBClient.
+    """
+    app = web.Application()
+    for path, handler in routes.items():
+        app.router.add_get(f"/3/{path}", handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('127.0.0.1', 0))
+    await web.SockSite(runner, sock).start()
+    return runner, f"http://127.0.0.1:{sock.getsockname()[1]}/3"